@@ -0,0 +1,216 @@
+"""
+Поддержка агрегатов: рейтинга компаний и количества комментариев статей.
+
+Company.rating, Company.review_count, Company.rating_sum и Article.comment_count
+обновляются атомарными дельтами прямо в SQL, без перечитывания связанных записей.
+updated_at компаний и статей сдвигается и при изменении того, что показывают
+их карточки: одобренных отзывов и комментариев, имени и аватара пользователей.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.orm.util import identity_key
+from backend.models import db, Company, Review, Article, Comment
+
+
+def review_contribution(status, rating):
+    """Вклад отзыва в агрегаты компании: (количество, сумма оценок)"""
+    if status != 'approved' or rating is None:
+        return 0, 0
+    return 1, int(rating)
+
+
+def apply_rating_delta(company_id, count_delta, sum_delta):
+    """Атомарно сдвигает агрегаты рейтинга компании на заданные дельты"""
+    if not count_delta and not sum_delta:
+        return
+
+    new_count = func.coalesce(Company.review_count, 0) + count_delta
+    new_sum = func.coalesce(Company.rating_sum, 0) + sum_delta
+
+    db.session.execute(
+        update(Company)
+        .where(Company.id == company_id)
+        .values(
+            review_count=new_count,
+            rating_sum=new_sum,
+            rating=case((new_count > 0, new_sum * 1.0 / new_count), else_=0.0)
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    # Загруженный в сессию объект компании должен перечитать агрегаты
+    company = db.session.identity_map.get(identity_key(Company, company_id))
+    if company is not None:
+        db.session.expire(company, ['rating', 'review_count', 'rating_sum'])
+
+
+def touch(model, object_id):
+    """Сдвигает updated_at записи (версия для ETag и кэшей)"""
+    db.session.execute(
+        update(model)
+        .where(model.id == object_id)
+        .values(updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+    obj = db.session.identity_map.get(identity_key(model, object_id))
+    if obj is not None:
+        db.session.expire(obj, ['updated_at'])
+
+
+def review_changed(company_id, old_status=None, old_rating=None, new_status=None, new_rating=None):
+    """Применяет изменение агрегатов при смене статуса/оценки отзыва.
+
+    Для нового отзыва old_* не передаются, для удаленного - new_*.
+    """
+    old_count, old_sum = review_contribution(old_status, old_rating)
+    new_count, new_sum = review_contribution(new_status, new_rating)
+    if (old_count, old_sum) != (new_count, new_sum):
+        apply_rating_delta(company_id, new_count - old_count, new_sum - old_sum)
+    elif 'approved' in (old_status, new_status):
+        # Агрегаты те же, но одобренный отзыв на странице компании изменился
+        touch(Company, company_id)
+
+
+def apply_comment_delta(article_id, delta):
+    """Атомарно сдвигает счетчик комментариев статьи"""
+    if not delta:
+        return
+
+    db.session.execute(
+        update(Article)
+        .where(Article.id == article_id)
+        .values(comment_count=func.coalesce(Article.comment_count, 0) + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+    # Загруженный в сессию объект статьи должен перечитать счетчик
+    article = db.session.identity_map.get(identity_key(Article, article_id))
+    if article is not None:
+        db.session.expire(article, ['comment_count'])
+
+
+def comment_changed(article_id, old_status=None, new_status=None):
+    """Применяет изменение счетчика при создании, изменении, модерации или удалении комментария"""
+    delta = (new_status == 'approved') - (old_status == 'approved')
+    if delta:
+        apply_comment_delta(article_id, delta)
+    elif 'approved' in (old_status, new_status):
+        # Счетчик тот же, но одобренный комментарий на странице статьи изменился
+        touch(Article, article_id)
+
+
+def user_changed(user_id):
+    """Сдвигает updated_at компаний и статей, в карточках которых есть имя и аватар пользователя.
+
+    Это компании владельца и с его одобренными отзывами, статьи автора и с
+    его одобренными комментариями - их ETag должен смениться.
+    """
+    now = datetime.utcnow()
+    reviewed = select(Review.company_id).where(Review.user_id == user_id, Review.status == 'approved')
+    commented = select(Comment.article_id).where(Comment.user_id == user_id, Comment.status == 'approved')
+    for model, owner, related in ((Company, Company.owner_id, reviewed), (Article, Article.author_id, commented)):
+        db.session.execute(
+            update(model)
+            .where(or_(owner == user_id, model.id.in_(related)))
+            .values(updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, (Company, Article)):
+            db.session.expire(obj, ['updated_at'])
+
+
+def reconcile_company_ratings(batch_size=500):
+    """Пересчитывает агрегаты всех компаний пачками по batch_size.
+
+    Каждая пачка - один UPDATE с коррелированными подзапросами в отдельной
+    короткой транзакции, поэтому таблица company целиком не блокируется.
+    Возвращает число исправленных компаний.
+    """
+    review_count = db.session.query(func.count(Review.id)).filter(
+        Review.company_id == Company.id,
+        Review.status == 'approved'
+    ).scalar_subquery()
+    rating_sum = db.session.query(func.coalesce(func.sum(Review.rating), 0)).filter(
+        Review.company_id == Company.id,
+        Review.status == 'approved'
+    ).scalar_subquery()
+    rating = case((review_count > 0, rating_sum * 1.0 / review_count), else_=0.0)
+
+    fixed = 0
+    last_id = 0
+
+    while True:
+        company_ids = [row[0] for row in db.session.query(Company.id)
+                       .filter(Company.id > last_id)
+                       .order_by(Company.id)
+                       .limit(batch_size)
+                       .all()]
+        if not company_ids:
+            break
+
+        result = db.session.execute(
+            update(Company)
+            .where(
+                Company.id.in_(company_ids),
+                or_(
+                    Company.review_count.is_(None),
+                    Company.rating_sum.is_(None),
+                    Company.rating.is_(None),
+                    Company.review_count != review_count,
+                    Company.rating_sum != rating_sum,
+                    Company.rating != rating
+                )
+            )
+            .values(review_count=review_count, rating_sum=rating_sum, rating=rating)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        fixed += result.rowcount or 0
+        last_id = company_ids[-1]
+
+    return fixed
+
+
+def reconcile_comment_counts(batch_size=500):
+    """Пересчитывает Article.comment_count пачками по batch_size.
+
+    Возвращает число исправленных статей.
+    """
+    comment_count = db.session.query(func.count(Comment.id)).filter(
+        Comment.article_id == Article.id,
+        Comment.status == 'approved'
+    ).scalar_subquery()
+
+    fixed = 0
+    last_id = 0
+
+    while True:
+        article_ids = [row[0] for row in db.session.query(Article.id)
+                       .filter(Article.id > last_id)
+                       .order_by(Article.id)
+                       .limit(batch_size)
+                       .all()]
+        if not article_ids:
+            break
+
+        result = db.session.execute(
+            update(Article)
+            .where(
+                Article.id.in_(article_ids),
+                or_(Article.comment_count.is_(None), Article.comment_count != comment_count)
+            )
+            .values(comment_count=comment_count)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        fixed += result.rowcount or 0
+        last_id = article_ids[-1]
+
+    return fixed
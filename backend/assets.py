@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Сборка и раздача статических файлов фронтенда.
+
+Сборка (python backend/assets.py) копирует frontend/js/*.js и
+frontend/css/*.css в frontend/dist с хэшем содержимого в имени
+(api.js -> api.3f2a1b9c0d.js), рядом кладет сжатые копии .gz и .br,
+переписывает ссылки в HTML-страницах на хэшированные имена и сохраняет
+соответствие имен в frontend/dist/manifest.json.
+
+При раздаче хэшированные файлы отдаются с Cache-Control immutable на год:
+браузер больше не обращается за ними к серверу, пока не изменится
+содержимое (а с ним и имя). Сжатая копия выбирается по Accept-Encoding.
+HTML-страницы отдаются с no-cache, чтобы новые имена подхватывались
+сразу. Без сборки все работает как раньше - из исходных файлов.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # brotli нужен только для сборки
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FRONTEND_DIR = os.path.join(BASE_DIR, 'frontend')
+DIST_DIR = os.path.join(FRONTEND_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+ASSET_DIRS = {'js': '.js', 'css': '.css'}
+MIMETYPES = {'.js': 'application/javascript', '.css': 'text/css'}
+HASH_LENGTH = 10
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+# Ссылки вида src="js/api.js" или href="/css/style.css"
+ASSET_REFERENCE = re.compile(r'((?:src|href)=["\'])(/?)((?:js|css)/[^"\'?#]+)(["\'])')
+
+
+# --- Сборка ---
+
+def _fingerprint(path):
+    with open(path, 'rb') as f:
+        content = f.read()
+    return content, hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+
+
+def _write(path, content):
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def build():
+    """Собирает frontend/dist, возвращает манифест"""
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+
+    manifest = {}
+    for subdir, extension in ASSET_DIRS.items():
+        source_dir = os.path.join(FRONTEND_DIR, subdir)
+        target_dir = os.path.join(DIST_DIR, subdir)
+        os.makedirs(target_dir, exist_ok=True)
+
+        for filename in sorted(os.listdir(source_dir)):
+            if not filename.endswith(extension):
+                continue
+            content, digest = _fingerprint(os.path.join(source_dir, filename))
+            hashed = f'{filename[:-len(extension)]}.{digest}{extension}'
+
+            target = os.path.join(target_dir, hashed)
+            _write(target, content)
+            _write(target + '.gz', gzip.compress(content, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write(target + '.br', brotli.compress(content, quality=11))
+
+            manifest[f'{subdir}/{filename}'] = f'{subdir}/{hashed}'
+            print(f"✅ {subdir}/{filename} -> {subdir}/{hashed}")
+
+    if brotli is None:
+        print("⚠️ Модуль brotli не установлен - файлы .br не созданы")
+
+    def rewrite(match):
+        prefix, slash, path, suffix = match.groups()
+        return f'{prefix}{slash}{manifest.get(path, path)}{suffix}'
+
+    for filename in sorted(os.listdir(FRONTEND_DIR)):
+        if not filename.endswith('.html'):
+            continue
+        with open(os.path.join(FRONTEND_DIR, filename), encoding='utf-8') as f:
+            html = f.read()
+        with open(os.path.join(DIST_DIR, filename), 'w', encoding='utf-8') as f:
+            f.write(ASSET_REFERENCE.sub(rewrite, html))
+        print(f"✅ {filename}")
+
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return manifest
+
+
+# --- Раздача ---
+
+class AssetManifest:
+    """Манифест сборки; перечитывается, если файл изменился"""
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self._mtime = None
+        self._hashed = set()
+
+    def _reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            self._mtime = None
+            self._hashed = set()
+            return
+        if mtime != self._mtime:
+            with open(self.path, encoding='utf-8') as f:
+                self._hashed = set(json.load(f).values())
+            self._mtime = mtime
+
+    def is_hashed(self, path):
+        self._reload()
+        return path in self._hashed
+
+    @property
+    def built(self):
+        self._reload()
+        return self._mtime is not None
+
+
+manifest = AssetManifest()
+
+
+def _accepts(encoding):
+    return request.accept_encodings.quality(encoding) > 0
+
+
+def send_asset(subdir, filename):
+    """Отдает JS/CSS: хэшированный файл из сборки или исходный"""
+    path = f'{subdir}/{filename}'
+    if not manifest.is_hashed(path):
+        response = send_from_directory(os.path.join(FRONTEND_DIR, subdir), filename)
+        response.headers['Cache-Control'] = REVALIDATE
+        return response
+
+    mimetype = MIMETYPES.get(os.path.splitext(filename)[1])
+    for encoding, extension in (('br', '.br'), ('gzip', '.gz')):
+        if _accepts(encoding) and os.path.exists(os.path.join(DIST_DIR, path + extension)):
+            response = send_from_directory(DIST_DIR, path + extension, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(DIST_DIR, path, mimetype=mimetype)
+
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+
+def send_page(filename):
+    """Отдает HTML-страницу (из сборки, если она есть) или другой файл фронтенда"""
+    directory = FRONTEND_DIR
+    if filename.endswith('.html') and manifest.built and os.path.exists(os.path.join(DIST_DIR, filename)):
+        directory = DIST_DIR
+    response = send_from_directory(directory, filename)
+    response.headers['Cache-Control'] = REVALIDATE
+    return response
+
+
+if __name__ == "__main__":
+    print("🚀 Собираем статические файлы...")
+    try:
+        result = build()
+        print(f"🎉 Собрано файлов: {len(result)}, манифест: {MANIFEST_PATH}")
+        sys.exit(0)
+    except Exception as e:
+        print(f"💥 Ошибка сборки: {e}")
+        sys.exit(1)
@@ -0,0 +1,85 @@
+"""
+Уведомления об изменениях моделей после успешного коммита.
+
+Подписчики (индексы, кэши) получают список изменений транзакции только
+после COMMIT; при откате изменения отбрасываются. Значения колонок
+снимаются во время flush, поэтому подписчикам не нужно обращаться к базе.
+"""
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from backend.log import get_logger
+
+logger = get_logger(__name__)
+
+_subscribers = []
+
+
+class Change:
+    """Изменение одной записи: action - insert, update или delete"""
+
+    def __init__(self, action, model, values, previous):
+        self.action = action
+        self.model = model
+        self.values = values
+        self.previous = previous
+
+    @property
+    def id(self):
+        return self.values.get('id')
+
+    def changed(self, *keys):
+        """Менялась ли хотя бы одна из колонок (для insert/delete - всегда да)"""
+        if self.action != 'update':
+            return True
+        return any(key in self.previous for key in keys)
+
+    def __repr__(self):
+        return f'<Change {self.action} {self.model.__name__} {self.id}>'
+
+
+def subscribe(callback):
+    """Подписывает callback(changes) на закоммиченные изменения"""
+    _subscribers.append(callback)
+    return callback
+
+
+def _snapshot(obj):
+    state = inspect(obj)
+    values = {}
+    previous = {}
+    for attr in state.mapper.column_attrs:
+        key = attr.key
+        values[key] = state.dict.get(key)
+        history = state.attrs[key].history
+        if history.deleted:
+            previous[key] = history.deleted[0]
+    return values, previous
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect(session, flush_context):
+    pending = session.info.setdefault('pending_changes', [])
+    for action, objects in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            if action == 'update' and not session.is_modified(obj, include_collections=False):
+                continue
+            values, previous = _snapshot(obj)
+            pending.append(Change(action, type(obj), values, previous))
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch(session):
+    changes = session.info.pop('pending_changes', None)
+    if not changes:
+        return
+    for callback in _subscribers:
+        try:
+            callback(changes)
+        except Exception as e:
+            logger.exception('Ошибка обработчика изменений', extra={'callback': callback.__name__})
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop('pending_changes', None)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Сравнение моделей конкурентности gunicorn: sync, gthread и gevent.
+
+Для каждой модели запускается один воркер с gunicorn.conf.py, и
+BENCH_CONCURRENCY (16) клиентов BENCH_SECONDS (5) секунд запрашивают
+каталог, карточку компании и список статей. Кэш ответов выключен, а к каждой
+SQL-команде добавляется задержка BENCH_DB_LATENCY_MS (5 мс) - так локальная
+SQLite ведет себя как PostgreSQL по сети. Печатается пропускная способность
+на воркер и задержки; проверяется, что:
+- под нагрузкой нет ошибок ни в одной модели;
+- gthread и gevent обрабатывают больше запросов на воркер, чем sync;
+- пока воркер хэширует пароль при входе, он отвечает на другие запросы.
+
+Запуск: python backend/check_concurrency.py
+gevent проверяется, если он установлен. С CHECK_DATABASE_URL нагрузка идет
+на PostgreSQL (задержка по умолчанию 0 - она настоящая).
+"""
+
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+database_url = os.environ.get('CHECK_DATABASE_URL')
+latency_ms = os.environ.get('BENCH_DB_LATENCY_MS', '0' if database_url else '5')
+if not database_url:
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'concurrency.db')
+os.environ['DATABASE_URL'] = database_url
+
+from flask_migrate import upgrade
+from werkzeug.security import generate_password_hash
+from backend.app import app
+from backend.models import db, User, Company, Review, Article
+
+SECONDS = float(os.environ.get('BENCH_SECONDS', 5))
+CONCURRENCY = int(os.environ.get('BENCH_CONCURRENCY', 16))
+MODES = ['sync', 'gthread', 'gevent']
+PASSWORD = 'concurrency123'
+
+# Приложение для бенчмарка: задержка перед каждой SQL-командой. Под gevent
+# time.sleep пропатчен и отдает управление, как ожидание ответа PostgreSQL
+BENCH_APP = '''
+import os
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from backend.app import app
+
+LATENCY = float(os.environ['BENCH_DB_LATENCY_MS']) / 1000
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def network_latency(*args):
+    if LATENCY:
+        time.sleep(LATENCY)
+'''
+
+
+def check(failed, name, condition):
+    print(f"{'✅' if condition else '❌'} {name}")
+    if not condition:
+        failed.append(name)
+
+
+def seed():
+    with app.app_context():
+        upgrade()
+        owner = User(email='concurrency@test.com', password=generate_password_hash(PASSWORD), name='Владелец')
+        db.session.add(owner)
+        db.session.flush()
+        companies = [Company(name=f'Компания {i}', category='Натяжные потолки', city='Москва',
+                             status='approved', owner_id=owner.id) for i in range(40)]
+        db.session.add_all(companies)
+        db.session.flush()
+        db.session.add_all([Review(company_id=company.id, user_id=owner.id, rating=5, text='Отлично',
+                                   status='approved') for company in companies for _ in range(5)])
+        db.session.add_all([Article(title=f'Статья {i}', content='Текст ' * 50, author_id=owner.id,
+                                    status='approved') for i in range(40)])
+        db.session.commit()
+        company_ids = [company.id for company in companies]
+        db.session.remove()
+        db.engine.dispose()
+    return company_ids
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def request(port, path, data=None):
+    """(статус, секунды)"""
+    body = json.dumps(data).encode('utf-8') if data is not None else None
+    http_request = urllib.request.Request(f'http://127.0.0.1:{port}{path}', data=body,
+                                          headers={'Content-Type': 'application/json'})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(http_request, timeout=30) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = None
+    return status, time.perf_counter() - started
+
+
+def start(mode, port, app_dir):
+    env = {
+        **os.environ,
+        'PYTHONPATH': os.pathsep.join([app_dir, BASE_DIR]),
+        'GUNICORN_WORKER_CLASS': mode,
+        'WEB_CONCURRENCY': '1',
+        'BENCH_DB_LATENCY_MS': latency_ms,
+        'RESPONSE_CACHE_TTL': '0',
+        'LOG_LEVEL': 'WARNING'
+    }
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(BASE_DIR, 'gunicorn.conf.py'),
+         '-b', f'127.0.0.1:{port}', 'bench_app:app'],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if request(port, '/api/health/live')[0] == 200:
+            return process
+        time.sleep(0.2)
+    process.terminate()
+    return None
+
+
+def load(port, paths):
+    """Нагрузка из CONCURRENCY клиентов: (запросов, ошибок, задержки)"""
+    latencies = []
+    errors = []
+    stop = time.monotonic() + SECONDS
+    lock = threading.Lock()
+
+    def client(offset):
+        i = offset
+        while time.monotonic() < stop:
+            status, seconds = request(port, paths[i % len(paths)])
+            i += 1
+            with lock:
+                latencies.append(seconds)
+                if status != 200:
+                    errors.append(status)
+
+    clients = [threading.Thread(target=client, args=(i,)) for i in range(CONCURRENCY)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return len(latencies), errors, latencies
+
+
+def probe_during_login(port):
+    """Задержка пробы живости, пока идут входы с хэшированием пароля.
+
+    Входов меньше, чем потоков gthread (4): иначе проба просто ждет
+    свободный поток, как и в sync.
+    """
+    logins = [threading.Thread(target=request, args=(port, '/api/auth/login'),
+                               kwargs={'data': {'email': 'concurrency@test.com', 'password': PASSWORD}})
+              for _ in range(2)]
+    for thread in logins:
+        thread.start()
+    time.sleep(0.05)
+    probes = [request(port, '/api/health/live')[1] for _ in range(5)]
+    for thread in logins:
+        thread.join()
+    return max(probes)
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+if __name__ == "__main__":
+    print("🚀 Сравниваем модели конкурентности gunicorn...")
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        MODES.remove('gevent')
+        print("⚠️ gevent не установлен - проверяются только sync и gthread")
+
+    company_ids = seed()
+    paths = ['/api/catalog/', '/api/forum/articles'] + [f'/api/catalog/{company_id}' for company_id in company_ids]
+    app_dir = tempfile.mkdtemp()
+    with open(os.path.join(app_dir, 'bench_app.py'), 'w', encoding='utf-8') as f:
+        f.write(BENCH_APP)
+
+    failed = []
+    results = {}
+    print(f"      1 воркер, {CONCURRENCY} клиентов, {SECONDS:.0f} с, задержка SQL {latency_ms} мс")
+    for mode in MODES:
+        port = free_port()
+        process = start(mode, port, app_dir)
+        if process is None:
+            check(failed, f'{mode}: gunicorn запустился', False)
+            continue
+        try:
+            load(port, paths[:2])
+            total, errors, latencies = load(port, paths)
+            probe = probe_during_login(port)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+        results[mode] = total / SECONDS
+        print(f"      {mode:8} {total / SECONDS:8.1f} запросов/с  p50 {statistics.median(latencies) * 1000:7.1f} мс  "
+              f"p95 {percentile(latencies, 0.95) * 1000:7.1f} мс  проба при входе {probe * 1000:7.1f} мс")
+        check(failed, f'{mode}: {total} запросов без ошибок', not errors)
+        if errors:
+            print(f"      статусы ошибок: {sorted(set(errors), key=str)}")
+        if mode != 'sync':
+            check(failed, f'{mode}: хэширование пароля не останавливает другие запросы', probe < 0.25)
+
+    for mode in MODES[1:]:
+        if mode in results and 'sync' in results:
+            check(failed, f"{mode} быстрее sync в {results[mode] / results['sync']:.1f} раза",
+                  results[mode] > results['sync'] * 1.5)
+
+    if failed:
+        print(f"💥 Не прошли проверки: {', '.join(failed)}")
+        sys.exit(1)
+    else:
+        print("🎉 Приложение безопасно работает в потоках и гринлетах!")
+        sys.exit(0)
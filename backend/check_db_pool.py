@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Нагрузочная проверка пула соединений с базой.
+
+1. Много потоков-воркеров одновременно берут соединения: ни одной ошибки,
+   занятых соединений никогда не больше емкости пула, ожидание попадает в
+   гистограмму, после нагрузки все соединения возвращены.
+2. Когда пул исчерпан, новый запрос ждет DB_POOL_TIMEOUT и получает
+   таймаут, который попадает в счетчик.
+3. Только PostgreSQL: сервер обрывает соединения пула (pg_terminate_backend),
+   и pre-ping незаметно их заменяет; долгий запрос прерывается
+   statement_timeout.
+
+Запуск: python backend/check_db_pool.py
+По умолчанию используется временная SQLite база; для PostgreSQL задайте
+CHECK_DATABASE_URL (например, локальный postgresql+psycopg://localhost/app).
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+database_url = os.environ.get('CHECK_DATABASE_URL')
+if not database_url:
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'pool.db')
+os.environ['DATABASE_URL'] = database_url
+os.environ.setdefault('DB_POOL_SIZE', '4')
+os.environ.setdefault('DB_MAX_OVERFLOW', '2')
+os.environ.setdefault('DB_POOL_TIMEOUT', '2')
+os.environ.setdefault('DB_STATEMENT_TIMEOUT_MS', '1000')
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from backend.app import app
+from backend.models import db
+from backend.database import pool_stats, POOL_TIMEOUT, STATEMENT_TIMEOUT_MS
+
+WORKERS = 32
+ITERATIONS = 20
+HOLD_SECONDS = 0.01
+
+
+def check(failed, name, condition):
+    print(f"{'✅' if condition else '❌'} {name}")
+    if not condition:
+        failed.append(name)
+
+
+def is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def hold_connection():
+    """Один "запрос": соединение занято на время SQL и обработки"""
+    with app.app_context():
+        if is_postgres():
+            db.session.execute(text(f'SELECT pg_sleep({HOLD_SECONDS})'))
+        else:
+            db.session.execute(text('SELECT 1'))
+            time.sleep(HOLD_SECONDS)
+        db.session.remove()
+
+
+def check_concurrency():
+    failed = []
+    errors = []
+    peak = [0]
+    done = threading.Event()
+
+    def worker():
+        for _ in range(ITERATIONS):
+            try:
+                hold_connection()
+            except Exception as e:
+                errors.append(e)
+
+    def sampler():
+        while not done.is_set():
+            peak[0] = max(peak[0], pool_stats.snapshot()['checked_out'])
+            time.sleep(0.001)
+
+    before = pool_stats.snapshot()
+    threads = [threading.Thread(target=worker) for _ in range(WORKERS)]
+    watcher = threading.Thread(target=sampler)
+    watcher.start()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    watcher.join()
+    after = pool_stats.snapshot()
+
+    checkouts = after['events']['checkout'] - before['events']['checkout']
+    waits = sum(after['wait'][:-1]) - sum(before['wait'][:-1])
+    wait_seconds = after['wait'][-1] - before['wait'][-1]
+    print(f"      {WORKERS * ITERATIONS} запросов за {elapsed:.2f} с, пик занятых соединений {peak[0]} "
+          f"из {after['capacity']}, среднее ожидание {wait_seconds / max(waits, 1) * 1000:.1f} мс, "
+          f"открыто соединений {after['events']['connect'] - before['events']['connect']}")
+
+    check(failed, f'{WORKERS} воркеров без ошибок', not errors)
+    if errors:
+        print(f"      {errors[0]!r}")
+    check(failed, 'занятых соединений не больше емкости пула', 0 < peak[0] <= after['capacity'])
+    check(failed, 'каждая выдача учтена', checkouts == WORKERS * ITERATIONS == waits)
+    check(failed, 'воркеры ждали свободное соединение', wait_seconds > 0)
+    check(failed, 'после нагрузки все соединения возвращены', after['checked_out'] == 0)
+    return failed
+
+
+def check_timeout():
+    failed = []
+    capacity = pool_stats.snapshot()['capacity']
+    held = [db.engine.connect() for _ in range(capacity)]
+    before = pool_stats.snapshot()['events']['timeout']
+    started = time.perf_counter()
+    try:
+        db.engine.connect().close()
+        timed_out = False
+    except PoolTimeoutError:
+        timed_out = True
+    waited = time.perf_counter() - started
+    for connection in held:
+        connection.close()
+
+    check(failed, f'исчерпанный пул отвечает таймаутом через {waited:.1f} с',
+          timed_out and waited >= POOL_TIMEOUT * 0.9)
+    check(failed, 'таймаут попал в счетчик', pool_stats.snapshot()['events']['timeout'] == before + 1)
+    return failed
+
+
+def check_postgres():
+    if not is_postgres():
+        print("⚠️ CHECK_DATABASE_URL не задан - обрыв соединений и statement_timeout не проверялись")
+        return []
+
+    failed = []
+    # Наполняем пул и обрываем его соединения со стороны сервера
+    connections = [db.engine.connect() for _ in range(3)]
+    pids = [connection.execute(text('SELECT pg_backend_pid()')).scalar() for connection in connections]
+    for connection in connections:
+        connection.close()
+    with db.engine.connect() as admin:
+        admin.execute(text('SELECT pg_terminate_backend(pid) FROM unnest(:pids) AS pid'), {'pids': pids})
+        admin.commit()
+
+    before = pool_stats.snapshot()['events']['invalidate']
+    errors = []
+    for _ in range(5):
+        try:
+            with db.engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except DBAPIError as e:
+            errors.append(e)
+    check(failed, 'оборванные соединения заменены без ошибок', not errors)
+    check(failed, 'pre-ping учел сброшенные соединения', pool_stats.snapshot()['events']['invalidate'] > before)
+
+    try:
+        with db.engine.connect() as connection:
+            connection.execute(text(f'SELECT pg_sleep({STATEMENT_TIMEOUT_MS / 1000 * 2})'))
+        cancelled = False
+    except DBAPIError as e:
+        cancelled = 'statement timeout' in str(e)
+    check(failed, f'statement_timeout {STATEMENT_TIMEOUT_MS} мс прерывает долгий запрос', cancelled)
+    return failed
+
+
+if __name__ == "__main__":
+    print("🚀 Проверяем пул соединений...")
+    with app.app_context():
+        failed = check_concurrency() + check_timeout() + check_postgres()
+
+    if failed:
+        print(f"💥 Не прошли проверки: {', '.join(failed)}")
+        sys.exit(1)
+    else:
+        print("🎉 Пул соединений выдерживает нагрузку!")
+        sys.exit(0)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Проверка проб живости и готовности.
+
+1. /api/health/live и /api/health/ready не выполняют SQL: сколько бы проб
+   ни пришло, соединения из пула берет только фоновая проверка.
+2. Готовность: фоновая проверка стартует с первым запросом любого вида,
+   первая проба готовности дожидается ее и отвечает 200, версия миграций
+   совпадает с последней ревизией.
+3. Когда пул занят полностью, проба отвечает сразу, а фоновая проверка
+   не встает в очередь за соединением.
+4. 503 с причиной, если упал фоновый поток, миграции не применены или база
+   недоступна.
+
+Запуск: python backend/check_health.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'health.db')
+# Фоновая проверка выполняется один раз при первом запросе, дальше - вручную
+os.environ['HEALTH_INTERVAL_SECONDS'] = '3600'
+
+from flask_migrate import upgrade
+from backend.app import app, create_app
+from backend.database import pool_stats
+from backend.health import monitor
+from backend.view_counter import counter as view_counter
+
+# Схему создают миграции, как при деплое
+with app.app_context():
+    upgrade()
+
+PROBES = 200
+
+
+def check(failed, name, condition):
+    print(f"{'✅' if condition else '❌'} {name}")
+    if not condition:
+        failed.append(name)
+
+
+def checkouts():
+    return pool_stats.snapshot()['events']['checkout']
+
+
+def check_probes():
+    failed = []
+    client = app.test_client()
+
+    client.get('/api/health/live')
+    check(failed, 'первый запрос запустил фоновую проверку', monitor._thread is not None and monitor._thread.is_alive())
+
+    # Первая проба свежего воркера дожидается первой проверки вместо 503 starting
+    response = client.get('/api/health/ready')
+    check(failed, f"первая проба готовности - 200 ({response.json['status']})",
+          response.status_code == 200 and response.json['status'] == 'ready')
+
+    before = checkouts()
+    live = [client.get('/api/health/live') for _ in range(PROBES)]
+    check(failed, f'{PROBES} проб живости без обращений к базе',
+          all(response.status_code == 200 for response in live) and checkouts() == before)
+    ready = [client.get('/api/health/ready') for _ in range(PROBES)]
+    check(failed, f'{PROBES} проб готовности без обращений к базе', checkouts() == before)
+    body = ready[-1].json
+    check(failed, f"после проверки 200 ready ({body['status']})", ready[-1].status_code == 200 and body['status'] == 'ready')
+    check(failed, f"миграции применены ({', '.join(body['migrations']['current'])})", body['migrations']['up_to_date'])
+    check(failed, 'старый адрес /api/health отвечает так же', client.get('/api/health').json['status'] == 'ready')
+    return failed
+
+
+def check_saturated_pool():
+    failed = []
+    client = app.test_client()
+    with app.app_context():
+        from backend.models import db
+        held = [db.engine.connect() for _ in range(monitor.report()['pool']['capacity'])]
+
+    try:
+        before = checkouts()
+        started = time.perf_counter()
+        response = client.get('/api/health/ready')
+        elapsed = time.perf_counter() - started
+        check(failed, f"при занятом пуле проба отвечает за {elapsed * 1000:.1f} мс ({response.json['status']})",
+              response.status_code == 200 and response.json['status'] == 'degraded' and elapsed < 0.5)
+
+        refresh = threading.Thread(target=monitor.refresh)
+        refresh.start()
+        refresh.join(timeout=1)
+        check(failed, 'фоновая проверка не ждет соединение',
+              not refresh.is_alive() and checkouts() == before and monitor.report()['database'].get('skipped'))
+    finally:
+        for connection in held:
+            connection.close()
+    monitor.refresh()
+    return failed
+
+
+def check_failures():
+    failed = []
+    client = app.test_client()
+    capacity = monitor.report()['pool']['capacity']
+
+    # Упавший фоновый поток
+    dead = threading.Thread(target=lambda: None)
+    dead.start()
+    dead.join()
+    saved = view_counter._thread, view_counter._pid
+    view_counter._thread, view_counter._pid = dead, os.getpid()
+    response = client.get('/api/health/ready')
+    view_counter._thread, view_counter._pid = saved
+    check(failed, 'упавший поток просмотров - 503',
+          response.status_code == 503 and 'view_counter' in response.json.get('problems', []))
+
+    # База без миграций
+    empty_app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'empty.db')})
+    monitor.refresh()
+    response = empty_app.test_client().get('/api/health/ready')
+    check(failed, 'миграции не применены - 503',
+          response.status_code == 503 and response.json.get('problems') == ['migrations'])
+
+    # Недоступная база
+    down_app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:////nonexistent/dir/down.db'})
+    monitor.refresh()
+    response = down_app.test_client().get('/api/health/ready')
+    check(failed, f"база недоступна - 503 ({response.json['database'].get('error')})",
+          response.status_code == 503 and 'database' in response.json.get('problems', []))
+    check(failed, f"емкость пула не растет с числом приложений ({response.json['pool']['capacity']})",
+          response.json['pool']['capacity'] == capacity)
+    return failed
+
+
+if __name__ == "__main__":
+    print("🚀 Проверяем пробы живости и готовности...")
+    failed = check_probes() + check_saturated_pool() + check_failures()
+
+    if failed:
+        print(f"💥 Не прошли проверки: {', '.join(failed)}")
+        sys.exit(1)
+    else:
+        print("🎉 Пробы не нагружают базу и честно сообщают о готовности!")
+        sys.exit(0)
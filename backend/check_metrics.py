@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Проверка метрик /api/metrics.
+
+1. Через тестовый клиент Flask: счетчики ответов по эндпоинту и статусу,
+   гистограммы времени и SQL-команд (ответы из кэша - без SQL).
+2. Доступ: без METRICS_TOKEN - только прямые запросы с этой машины,
+   с токеном - только с Authorization: Bearer <токен>.
+3. gunicorn с несколькими воркерами: после серии запросов сумма на любом
+   воркере равна числу запросов, и счетчики не теряются, когда воркер
+   завершается и мастер запускает новый.
+
+Запуск: python backend/check_metrics.py
+"""
+
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'metrics.db')
+os.environ['METRICS_DIR'] = tempfile.mkdtemp()
+
+from flask_migrate import upgrade
+from backend.app import app
+from backend.models import db, User, Company
+from backend.metrics import metrics
+
+# Схему создают миграции, как при деплое
+with app.app_context():
+    upgrade()
+
+WORKERS = 3
+REQUESTS = 60
+
+
+def check(failed, name, condition):
+    print(f"{'✅' if condition else '❌'} {name}")
+    if not condition:
+        failed.append(name)
+
+
+def sample(text, name, **labels):
+    """Значение метрики с заданными метками (0, если ее нет)"""
+    pattern = re.escape(name) + r'\{([^}]*)\} (\S+)$'
+    for line in text.splitlines():
+        match = re.match(pattern, line)
+        if match and all(f'{key}="{value}"' in match.group(1) for key, value in labels.items()):
+            return float(match.group(2))
+    return 0.0
+
+
+def check_flask():
+    failed = []
+    with app.app_context():
+        owner = User(email='metrics@test.com', password='x', name='Владелец')
+        db.session.add(owner)
+        db.session.flush()
+        db.session.add_all([Company(name=f'Компания {i}', category='Натяжные потолки', city='Москва',
+                                    status='approved', owner_id=owner.id) for i in range(5)])
+        db.session.commit()
+
+    client = app.test_client()
+    for _ in range(3):
+        client.get('/api/catalog/?page=1&per_page=5')
+    client.post('/api/metrics')
+    text = client.get('/api/metrics').get_data(as_text=True)
+
+    list_labels = {'endpoint': 'catalog.get_companies', 'method': 'GET'}
+    check(failed, 'счетчик ответов 200', sample(text, 'app_http_requests_total', status='200', **list_labels) == 3)
+    check(failed, 'счетчик ответов 405', sample(text, 'app_http_requests_total', status='405',
+                                                endpoint='unmatched', method='POST') == 1)
+    check(failed, 'гистограмма времени', sample(text, 'app_http_request_duration_seconds_bucket',
+                                               le='+Inf', **list_labels) == 3)
+    statements = sample(text, 'app_sql_statements_total', **list_labels)
+    check(failed, f'SQL-команды посчитаны ({statements:.0f} на 3 запроса)', statements >= 1)
+    # Второй и третий ответ - из кэша ответов, без обращения к базе
+    check(failed, 'ответы из кэша без SQL', sample(text, 'app_http_request_sql_statements_bucket',
+                                                  le='0', **list_labels) == 2)
+    check(failed, 'время SQL посчитано', sample(text, 'app_sql_duration_seconds_total', **list_labels) > 0)
+    check(failed, 'запрос метрик в обработке', 'app_http_requests_in_flight 1' in text)
+    return failed
+
+
+def check_access():
+    failed = []
+    client = app.test_client()
+    remote = {'REMOTE_ADDR': '203.0.113.7'}
+    check(failed, 'без токена: запрос с другой машины отклонен',
+          client.get('/api/metrics', environ_base=remote).status_code == 403)
+    check(failed, 'без токена: запрос через прокси отклонен',
+          client.get('/api/metrics', headers={'X-Forwarded-For': '203.0.113.7'}).status_code == 403)
+    check(failed, 'без токена: прямой запрос с этой машины разрешен', client.get('/api/metrics').status_code == 200)
+
+    metrics.token = 'metrics-secret'
+    try:
+        check(failed, 'с токеном: запрос без него отклонен даже с этой машины',
+              client.get('/api/metrics').status_code == 401)
+        response = client.get('/api/metrics', environ_base=remote,
+                              headers={'Authorization': 'Bearer metrics-secret'})
+        check(failed, 'с токеном: запрос с ним разрешен откуда угодно', response.status_code == 200)
+    finally:
+        metrics.token = ''
+    return failed
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def fetch(port, path):
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=10) as response:
+        return response.read().decode('utf-8')
+
+
+def wait_for(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            fetch(port, '/api/metrics')
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def total_requests(port):
+    text = fetch(port, '/api/metrics')
+    return sample(text, 'app_http_requests_total', endpoint='catalog.get_companies', status='200')
+
+
+def check_gunicorn():
+    failed = []
+    port = free_port()
+    metrics_dir = tempfile.mkdtemp()
+    env = {**os.environ, 'PYTHONPATH': BASE_DIR, 'METRICS_DIR': metrics_dir, 'METRICS_FLUSH_SECONDS': '0.2'}
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(WORKERS), '-b', f'127.0.0.1:{port}', 'backend.app:app'],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_for(port):
+            check(failed, 'gunicorn запустился', False)
+            return failed
+
+        for _ in range(REQUESTS):
+            fetch(port, '/api/catalog/')
+        time.sleep(1)
+
+        # Запрос метрик попадает на случайный воркер - сумма должна быть одинаковой
+        totals = {total_requests(port) for _ in range(WORKERS * 3)}
+        check(failed, f'сумма по {WORKERS} воркерам на любом из них ({sorted(totals)})', totals == {REQUESTS})
+
+        pids = {int(name.split('-', 1)[0]) for name in os.listdir(metrics_dir) if re.match(r'\d+-', name)}
+        check(failed, 'каждый воркер пишет свой файл', len(pids) >= 2)
+        os.kill(min(pids), signal.SIGTERM)
+        time.sleep(2)
+        for _ in range(WORKERS * 2):
+            fetch(port, '/api/catalog/')
+        time.sleep(1)
+        totals = {total_requests(port) for _ in range(WORKERS * 3)}
+        check(failed, f'счетчики завершенного воркера сохранены ({sorted(totals)})',
+              totals == {REQUESTS + WORKERS * 2})
+        check(failed, 'файл завершенного воркера перенесен в архив',
+              'archive.json' in os.listdir(metrics_dir)
+              and not any(name.startswith(f'{min(pids)}-') for name in os.listdir(metrics_dir)))
+    finally:
+        process.terminate()
+        process.wait(timeout=15)
+    return failed
+
+
+if __name__ == "__main__":
+    print("🚀 Проверяем метрики...")
+    failed = check_flask() + check_access() + check_gunicorn()
+
+    if failed:
+        print(f"💥 Не прошли проверки: {', '.join(failed)}")
+        sys.exit(1)
+    else:
+        print("🎉 Метрики считаются и складываются по воркерам!")
+        sys.exit(0)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Проверка количества SQL-запросов в списочных эндпоинтах
+Заполняет временную базу и убеждается, что число запросов на страницу
+не растет вместе с per_page и что ни одна команда не повторяется построчно
+(нет N+1 при загрузке авторов, счетчиков и т.п.; см. backend/sql_profiler.py).
+
+Запуск: python backend/check_query_counts.py
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'counts.db')
+
+from flask_migrate import upgrade
+from backend.app import app
+from backend.models import db, User, Company, Review, Article, Comment
+from backend.response_cache import cache as response_cache
+from backend.sql_profiler import profiler as sql_profiler
+
+# Схему создают миграции, как при деплое
+with app.app_context():
+    upgrade()
+
+ARTICLES = 120
+COMMENTS_PER_ARTICLE = 3
+COMPANIES = 10
+REVIEWS_PER_COMPANY = 60
+PAGE_SIZES = [5, 20, 50]
+
+
+def seed():
+    """Заполняет базу тестовыми данными"""
+    now = datetime.utcnow()
+
+    db.session.execute(User.__table__.insert(), [
+        {'email': f'count{i}@test.com', 'password': 'x', 'name': f'Пользователь {i}'} for i in range(60)
+    ])
+    user_ids = [row[0] for row in db.session.query(User.id).all()]
+
+    db.session.execute(Article.__table__.insert(), [{
+        'title': f'Статья {i}',
+        'content': 'Текст статьи',
+        'tags': '["потолки"]',
+        'status': 'approved',
+        # Каждая пятая статья анонимная
+        'author_id': user_ids[i % len(user_ids)] if i % 5 else None,
+        'anonymous_author': None if i % 5 else 'Гость',
+        'views': 0,
+        'comment_count': COMMENTS_PER_ARTICLE,
+        'created_at': now - timedelta(minutes=i),
+        'updated_at': now - timedelta(minutes=i)
+    } for i in range(ARTICLES)])
+    article_ids = [row[0] for row in db.session.query(Article.id).all()]
+
+    db.session.execute(Comment.__table__.insert(), [{
+        'article_id': article_id,
+        'user_id': user_ids[(article_id + j) % len(user_ids)],
+        'text': 'Комментарий',
+        'status': 'approved',
+        'created_at': now - timedelta(minutes=article_id * 10 + j)
+    } for article_id in article_ids for j in range(COMMENTS_PER_ARTICLE)])
+
+    db.session.execute(Company.__table__.insert(), [{
+        'name': f'Компания {i}',
+        'category': 'Натяжные потолки',
+        'city': 'Москва',
+        'status': 'approved',
+        'owner_id': user_ids[i],
+        'created_at': now,
+        'updated_at': now
+    } for i in range(COMPANIES)])
+    company_ids = [row[0] for row in db.session.query(Company.id).all()]
+
+    db.session.execute(Review.__table__.insert(), [{
+        'company_id': company_id,
+        # Каждый третий отзыв анонимный
+        'user_id': user_ids[(company_id + j) % len(user_ids)] if j % 3 else None,
+        'anonymous_name': None if j % 3 else 'Гость',
+        'rating': 5,
+        'text': 'Отличный монтаж',
+        'status': 'approved',
+        'created_at': now - timedelta(minutes=company_id * 100 + j)
+    } for company_id in company_ids for j in range(REVIEWS_PER_COMPANY)])
+
+    db.session.commit()
+
+
+def endpoints():
+    """Списочные эндпоинты: название -> шаблон URL с {per_page}"""
+    return {
+        'forum.get_articles': '/api/forum/articles?per_page={per_page}',
+        'forum.get_articles (cursor)': '/api/forum/articles?cursor=&per_page={per_page}',
+        'forum.get_articles (author_id)': '/api/forum/articles?author_id=2&per_page={per_page}',
+        'reviews.get_company_reviews': '/api/reviews/company/1?per_page={per_page}',
+        'search.global_search (articles)': '/api/search/?q=Статья&type=articles&per_page={per_page}',
+        'search.global_search (reviews)': '/api/search/?q=монтаж&type=reviews&per_page={per_page}',
+    }
+
+
+def profile_queries(client, url):
+    """Выполняет GET и возвращает профиль его SQL-запросов"""
+    # Считаем запросы самого эндпоинта, а не кэша ответов
+    response_cache.clear()
+    with sql_profiler.capture() as profile:
+        response = client.get(url)
+
+    if response.status_code != 200:
+        raise RuntimeError(f"{url} вернул {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return profile
+
+
+def check_query_counts():
+    with app.app_context():
+        seed()
+
+        failed = []
+        client = app.test_client()
+        for name, template in endpoints().items():
+            # Первый запрос прогревает кэши (наличие поискового индекса и т.п.)
+            profile_queries(client, template.format(per_page=PAGE_SIZES[0]))
+            profiles = [profile_queries(client, template.format(per_page=per_page)) for per_page in PAGE_SIZES]
+            counts = [profile.count for profile in profiles]
+            constant = len(set(counts)) == 1
+            details = ', '.join(f'per_page={size}: {count}' for size, count in zip(PAGE_SIZES, counts))
+            try:
+                # На самой большой странице одна и та же команда не должна повторяться построчно
+                profiles[-1].assert_no_repeats()
+            except AssertionError as e:
+                constant = False
+                details += f'\n{e}'
+            print(f"{'✅' if constant else '❌'} {name} ({details})")
+            if not constant:
+                failed.append(name)
+
+        return failed
+
+
+if __name__ == "__main__":
+    print("🚀 Проверяем количество запросов...")
+    failed = check_query_counts()
+
+    if failed:
+        print(f"💥 Число запросов растет с размером страницы: {', '.join(failed)}")
+        sys.exit(1)
+    else:
+        print("🎉 Число запросов не зависит от размера страницы!")
+        sys.exit(0)
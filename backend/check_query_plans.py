@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Проверка планов выполнения горячих запросов
+Заполняет базу тестовыми данными и через EXPLAIN убеждается, что ни один
+запрос каталога, отзывов, форума и модерации не уходит в полный перебор таблицы.
+
+Запуск: python backend/check_query_plans.py
+По умолчанию используется временная SQLite база; для PostgreSQL задайте
+CHECK_DATABASE_URL (данные будут добавлены в указанную базу).
+"""
+
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+database_url = os.environ.get('CHECK_DATABASE_URL')
+if not database_url:
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'plans.db')
+os.environ['DATABASE_URL'] = database_url
+
+from sqlalchemy import text
+from flask_migrate import upgrade
+from backend.app import app
+from backend.models import db, User, Company, Review, Article, Comment, Tag
+from backend import tags as tag_index
+
+# Схему создают миграции, как при деплое
+with app.app_context():
+    upgrade()
+
+COMPANIES = 2000
+REVIEWS_PER_COMPANY = 5
+ARTICLES = 2000
+COMMENTS_PER_ARTICLE = 3
+
+
+def seed():
+    """Заполняет базу тестовыми данными"""
+    statuses = ['approved', 'approved', 'approved', 'pending', 'rejected']
+    categories = ['Натяжные потолки', 'Гипсокартон', 'Освещение', 'Монтаж', 'Ремонт']
+    cities = ['Москва', 'Санкт-Петербург', 'Казань', 'Новосибирск', 'Екатеринбург', 'Самара']
+    now = datetime.utcnow()
+
+    users = [{'email': f'plan{i}@test.com', 'password': 'x', 'name': f'Пользователь {i}'} for i in range(200)]
+    db.session.execute(User.__table__.insert(), users)
+    user_ids = [row[0] for row in db.session.query(User.id).all()]
+
+    db.session.execute(Company.__table__.insert(), [{
+        'name': f'Компания {i}',
+        'category': categories[i % len(categories)],
+        'city': cities[i % len(cities)],
+        'status': statuses[i % len(statuses)],
+        'rating': (i % 50) / 10,
+        'review_count': 0,
+        'rating_sum': 0,
+        'owner_id': user_ids[i % len(user_ids)],
+        'created_at': now - timedelta(minutes=i),
+        'updated_at': now - timedelta(minutes=i)
+    } for i in range(COMPANIES)])
+    company_ids = [row[0] for row in db.session.query(Company.id).all()]
+
+    db.session.execute(Review.__table__.insert(), [{
+        'company_id': company_id,
+        'user_id': user_ids[(company_id + j) % len(user_ids)],
+        'rating': 1 + (company_id + j) % 5,
+        'text': 'Отзыв',
+        'status': statuses[(company_id + j) % len(statuses)],
+        'created_at': now - timedelta(minutes=company_id * 10 + j)
+    } for company_id in company_ids for j in range(REVIEWS_PER_COMPANY)])
+
+    db.session.execute(Article.__table__.insert(), [{
+        'title': f'Статья {i}',
+        'content': 'Текст статьи',
+        'tags': json.dumps([categories[i % len(categories)]]),
+        'status': statuses[i % len(statuses)],
+        'author_id': user_ids[i % len(user_ids)],
+        'views': 0,
+        'created_at': now - timedelta(minutes=i),
+        'updated_at': now - timedelta(minutes=i)
+    } for i in range(ARTICLES)])
+    article_ids = [row[0] for row in db.session.query(Article.id).all()]
+
+    db.session.execute(Comment.__table__.insert(), [{
+        'article_id': article_id,
+        'user_id': user_ids[(article_id + j) % len(user_ids)],
+        'text': 'Комментарий',
+        'status': statuses[(article_id + j) % len(statuses)],
+        'created_at': now - timedelta(minutes=article_id * 10 + j)
+    } for article_id in article_ids for j in range(COMMENTS_PER_ARTICLE)])
+
+    db.session.commit()
+    tag_index.rebuild_tag_index()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def hot_queries():
+    """Запросы роутов catalog, reviews, forum и moderation и синхронизации подсказок"""
+    return {
+        'catalog.get_companies': Company.query.filter_by(status='approved')
+            .order_by(Company.rating.desc()),
+        'catalog.get_companies (category, city)': Company.query.filter_by(status='approved')
+            .filter(Company.category == 'Освещение', Company.city == 'Казань')
+            .order_by(Company.rating.desc()),
+        'catalog.get_companies (owner_id)': Company.query.filter_by(owner_id=7)
+            .order_by(Company.rating.desc()),
+        'reviews.get_company_reviews': Review.query.filter_by(company_id=42, status='approved')
+            .order_by(Review.created_at.desc()),
+        'reviews.get_user_reviews': Review.query.filter_by(user_id=7)
+            .order_by(Review.created_at.desc()),
+        'forum.get_articles': Article.query.filter_by(status='approved')
+            .order_by(Article.created_at.desc()),
+        'forum.get_articles (author_id)': Article.query.filter_by(status='approved', author_id=7)
+            .order_by(Article.created_at.desc()),
+        'forum.get_articles (tag)': Article.query.filter_by(status='approved')
+            .filter(Article.id.in_(tag_index.articles_with_tag('Освещение')))
+            .order_by(Article.created_at.desc()),
+        'forum.get_tags': Tag.query.filter(Tag.article_count > 0)
+            .order_by(Tag.article_count.desc(), Tag.name),
+        'forum.get_article (comments)': Comment.query.filter_by(article_id=42, status='approved')
+            .order_by(Comment.created_at.asc()),
+        'moderation.get_pending_companies': Company.query.filter_by(status='pending')
+            .order_by(Company.created_at.desc()),
+        'moderation.get_pending_reviews': Review.query.filter_by(status='pending')
+            .order_by(Review.created_at.desc()),
+        'moderation.get_pending_articles': Article.query.filter_by(status='pending')
+            .order_by(Article.created_at.desc()),
+        'moderation.get_pending_comments': Comment.query.filter_by(status='pending')
+            .order_by(Comment.created_at.desc()),
+        'suggestions sync (company)': Company.query
+            .filter(Company.updated_at >= datetime.utcnow() - timedelta(seconds=30)),
+        'suggestions sync (article)': Article.query
+            .filter(Article.updated_at >= datetime.utcnow() - timedelta(seconds=30)),
+    }
+
+
+def explain(query):
+    """Возвращает план запроса и признак полного перебора таблицы"""
+    dialect = db.engine.dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+
+    if dialect.name == 'postgresql':
+        lines = [row[0] for row in db.session.execute(text('EXPLAIN ' + sql))]
+        return lines, any('Seq Scan' in line for line in lines)
+
+    lines = [row[-1] for row in db.session.execute(text('EXPLAIN QUERY PLAN ' + sql))]
+    return lines, any(line.startswith('SCAN ') and ' USING ' not in line for line in lines)
+
+
+def check_query_plans():
+    with app.app_context():
+        seed()
+
+        if db.engine.dialect.name == 'postgresql':
+            # На небольшом наборе данных планировщик может предпочесть
+            # перебор таблицы; проверяем, что индекс вообще применим
+            db.session.execute(text('SET enable_seqscan = off'))
+
+        failed = []
+        for name, query in hot_queries().items():
+            lines, seq_scan = explain(query)
+            print(f"{'❌' if seq_scan else '✅'} {name}")
+            for line in lines:
+                print(f"      {line}")
+            if seq_scan:
+                failed.append(name)
+
+        return failed
+
+
+if __name__ == "__main__":
+    print("🚀 Проверяем планы запросов...")
+    failed = check_query_plans()
+
+    if failed:
+        print(f"💥 Полный перебор таблицы в запросах: {', '.join(failed)}")
+        sys.exit(1)
+    else:
+        print("🎉 Все запросы используют индексы!")
+        sys.exit(0)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Проверка чтения с реплики.
+
+Реплика - копия файла SQLite, снятая до записи в основную базу, поэтому
+она "отстает" ровно на эту запись:
+1. GET читает с реплики и видит старые данные.
+2. Запись (PUT) идет в основную базу; клиент получает cookie и следующие
+   GET читает из основной базы - видит свое изменение (read-your-writes).
+   Ответ с устаревшими данными реплики не попадает в кэш ответов.
+3. Реплика отстает больше DB_REPLICA_MAX_LAG_SECONDS или недоступна -
+   чтение идет в основную базу.
+
+Запуск: python backend/check_read_replica.py
+Для двух PostgreSQL (основная и потоковая реплика) задайте CHECK_DATABASE_URL
+и CHECK_REPLICA_URL - тогда проверяются маршрутизация и измерение отставания.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+directory = tempfile.mkdtemp()
+primary_url = os.environ.get('CHECK_DATABASE_URL') or 'sqlite:///' + os.path.join(directory, 'primary.db')
+replica_directory = os.path.join(directory, 'replica')
+os.makedirs(replica_directory)
+replica_url = os.environ.get('CHECK_REPLICA_URL') or 'sqlite:///' + os.path.join(replica_directory, 'replica.db')
+os.environ['DATABASE_URL'] = primary_url
+os.environ['DB_REPLICA_URL'] = replica_url
+# Отставание проверяется вручную
+os.environ['DB_REPLICA_CHECK_SECONDS'] = '3600'
+
+from flask_jwt_extended import create_access_token
+from flask_migrate import upgrade
+from backend.app import app
+from backend.models import db, User, Company
+from backend.read_replica import router, PIN_COOKIE
+from backend.response_cache import cache as response_cache
+
+SQLITE = primary_url.startswith('sqlite')
+
+
+def check(failed, name, condition):
+    print(f"{'✅' if condition else '❌'} {name}")
+    if not condition:
+        failed.append(name)
+
+
+def seed():
+    """Основная база с компанией; для SQLite реплика - копия ее файла"""
+    with app.app_context():
+        upgrade()
+        owner = User(email='replica@test.com', password='x', name='Владелец')
+        db.session.add(owner)
+        db.session.flush()
+        company = Company(name='Старое имя', category='Натяжные потолки', city='Москва',
+                          status='approved', owner_id=owner.id)
+        db.session.add(company)
+        db.session.commit()
+        ids = owner.id, company.id
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    if SQLITE:
+        shutil.copy(primary_url[len('sqlite:///'):], replica_url[len('sqlite:///'):])
+    return ids
+
+
+def reads():
+    return dict(router.status()['reads'])
+
+
+def company_name(client, company_id):
+    response_cache.clear()
+    return client.get(f'/api/catalog/{company_id}').json['name']
+
+
+def check_routing(owner_id, company_id):
+    failed = []
+    client = app.test_client()
+
+    router.check()
+    check(failed, f"реплика доступна, отставание {router.lag} с", router.usable)
+    before = reads()
+    name = company_name(client, company_id)
+    check(failed, 'GET читает с реплики', reads()['replica'] > before['replica'] and name == 'Старое имя')
+
+    with app.app_context():
+        token = create_access_token(identity=str(owner_id))
+    response = client.put(f'/api/catalog/{company_id}', json={'name': 'Новое имя'},
+                          headers={'Authorization': f'Bearer {token}'})
+    check(failed, 'запись выполнена в основной базе', response.status_code == 200)
+    check(failed, 'после записи клиент получил cookie закрепления',
+          PIN_COOKIE in response.headers.get('Set-Cookie', ''))
+
+    before = reads()
+    name = company_name(client, company_id)
+    check(failed, f'автор изменения читает из основной базы ({name})',
+          name == 'Новое имя' and reads()['replica'] == before['replica'])
+
+    if SQLITE:
+        other = app.test_client()
+        name = company_name(other, company_id)
+        check(failed, f'другой клиент читает с реплики ({name})', name == 'Старое имя')
+        other.get(f'/api/catalog/{company_id}')
+        check(failed, 'ответ реплики сразу после записи не кэшируется',
+              response_cache.snapshot()['entries'] == 0)
+    return failed
+
+
+def check_fallback(company_id):
+    failed = []
+    client = app.test_client()
+
+    measure_lag = router.measure_lag
+    router.measure_lag = lambda primary, replica: router.max_lag + 1
+    router.check()
+    before = reads()
+    company_name(client, company_id)
+    check(failed, f'реплика отстает на {router.lag} с - чтение из основной базы',
+          not router.usable and reads()['replica'] == before['replica'])
+    router.measure_lag = measure_lag
+
+    router.check()
+    check(failed, 'реплика догнала - чтение снова с нее', router.usable)
+
+    if SQLITE:
+        with app.app_context():
+            db.engines['replica'].dispose()
+        # Без каталога SQLite не может открыть файл - как недоступный сервер
+        os.rename(replica_directory, replica_directory + '.down')
+        try:
+            router.check()
+            before = reads()
+            name = company_name(client, company_id)
+            check(failed, f"реплика недоступна ({router.error}) - чтение из основной базы",
+                  not router.usable and reads()['replica'] == before['replica'] and name == 'Новое имя')
+        finally:
+            os.rename(replica_directory + '.down', replica_directory)
+    return failed
+
+
+if __name__ == "__main__":
+    print("🚀 Проверяем чтение с реплики...")
+    owner_id, company_id = seed()
+    failed = check_routing(owner_id, company_id) + check_fallback(company_id)
+
+    if failed:
+        print(f"💥 Не прошли проверки: {', '.join(failed)}")
+        sys.exit(1)
+    else:
+        print("🎉 Чтение идет с реплики, а свои изменения клиент видит сразу!")
+        sys.exit(0)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Проверка кэша ответов в нескольких процессах.
+
+Запускаются два gunicorn (по одному воркеру) на одной базе и с общим
+RESPONSE_CACHE_DIR - как два воркера одного мастера:
+1. Карточка компании кэшируется во втором процессе (X-Cache: HIT).
+2. Изменение через первый процесс сбрасывает запись во втором - следующий
+   ответ второго процесса уже с новыми данными, а не через TTL.
+3. Имя владельца (сброс всего кэша) тоже видно во втором процессе сразу,
+   и ETag карточки меняется - старая копия клиента не получает 304.
+4. Еще два процесса читают с реплики - копии базы, снятой до записи.
+   Второй процесс кэширует старые данные реплики для других клиентов, но
+   клиент с cookie закрепления от первого процесса получает из второго
+   свое изменение мимо кэша и не кладет ответ в кэш.
+
+Запуск: python backend/check_response_cache.py
+"""
+
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+directory = tempfile.mkdtemp()
+database_url = 'sqlite:///' + os.path.join(directory, 'cache.db')
+replica_path = os.path.join(directory, 'replica.db')
+os.environ['DATABASE_URL'] = database_url
+
+from flask_jwt_extended import create_access_token
+from flask_migrate import upgrade
+from backend.app import app
+from backend.models import db, User, Company
+from backend.read_replica import PIN_COOKIE
+
+
+def check(failed, name, condition):
+    print(f"{'✅' if condition else '❌'} {name}")
+    if not condition:
+        failed.append(name)
+
+
+def seed():
+    with app.app_context():
+        upgrade()
+        owner = User(email='cache@test.com', password='x', name='Владелец')
+        db.session.add(owner)
+        db.session.flush()
+        companies = [Company(name='Старое имя', category='Натяжные потолки', city='Москва',
+                             status='approved', owner_id=owner.id) for _ in range(2)]
+        db.session.add_all(companies)
+        db.session.commit()
+        token = create_access_token(identity=str(owner.id))
+        company_ids = [company.id for company in companies]
+        db.session.remove()
+        db.engine.dispose()
+    # Реплика "отстает" на все записи после этой копии
+    shutil.copy(database_url[len('sqlite:///'):], replica_path)
+    return token, company_ids
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def request(port, path, method='GET', data=None, headers=None):
+    """(статус, заголовки, JSON)"""
+    body = json.dumps(data).encode('utf-8') if data is not None else None
+    http_request = urllib.request.Request(f'http://127.0.0.1:{port}{path}', data=body, method=method,
+                                          headers={'Content-Type': 'application/json', **(headers or {})})
+    try:
+        with urllib.request.urlopen(http_request, timeout=30) as response:
+            return response.status, response.headers, json.loads(response.read() or 'null')
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, None
+    except OSError:
+        return None, {}, None
+
+
+def start(env):
+    """gunicorn с одним воркером; (процесс, порт) или None"""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(BASE_DIR, 'gunicorn.conf.py'),
+         '-b', f'127.0.0.1:{port}', 'backend.app:app'],
+        cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        env={**os.environ, 'PYTHONPATH': BASE_DIR, 'WEB_CONCURRENCY': '1', 'LOG_LEVEL': 'WARNING',
+             'RESPONSE_CACHE_TTL': '300', **env}
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if request(port, '/api/health/live')[0] == 200:
+            return process, port
+        time.sleep(0.2)
+    process.terminate()
+    return None
+
+
+def check_invalidation(token, company_id, writer, reader):
+    failed = []
+    path = f'/api/catalog/{company_id}'
+    auth = {'Authorization': f'Bearer {token}'}
+
+    request(reader, path)
+    status, headers, body = request(reader, path)
+    check(failed, 'второй процесс отдает карточку из кэша',
+          status == 200 and headers.get('X-Cache') == 'HIT' and body['name'] == 'Старое имя')
+
+    status = request(writer, path, method='PUT', data={'name': 'Новое имя'}, headers=auth)[0]
+    check(failed, 'первый процесс изменил компанию', status == 200)
+    status, headers, body = request(reader, path)
+    check(failed, f"второй процесс сразу видит изменение ({body and body['name']}, {headers.get('X-Cache')})",
+          status == 200 and body['name'] == 'Новое имя' and headers.get('X-Cache') == 'MISS')
+    check(failed, 'после сброса карточка снова кэшируется', request(reader, path)[1].get('X-Cache') == 'HIT')
+
+    etag = request(reader, path)[1].get('ETag')
+    status = request(writer, '/api/auth/profile', method='PUT', data={'name': 'Новый владелец'}, headers=auth)[0]
+    check(failed, 'первый процесс изменил имя владельца', status == 200)
+    status, headers, body = request(reader, path, headers={'If-None-Match': etag})
+    owner = body and (body.get('owner') or {}).get('name')
+    check(failed, f"второй процесс сразу видит новое имя владельца ({owner}, {headers.get('X-Cache')})",
+          owner == 'Новый владелец' and headers.get('X-Cache') == 'MISS')
+    check(failed, 'с новым именем владельца сменился ETag карточки', headers.get('ETag') != etag)
+    return failed
+
+
+def check_pinned(token, company_id, writer, reader):
+    failed = []
+    path = f'/api/catalog/{company_id}'
+
+    # Проверка отставания реплики идет в фоне с первого запроса
+    request(reader, path)
+    time.sleep(1)
+    http_request = urllib.request.Request(f'http://127.0.0.1:{writer}{path}', method='PUT',
+                                          data=json.dumps({'name': 'Новое имя'}).encode('utf-8'),
+                                          headers={'Content-Type': 'application/json',
+                                                   'Authorization': f'Bearer {token}'})
+    with urllib.request.urlopen(http_request, timeout=30) as response:
+        cookie = response.headers.get('Set-Cookie', '').split(';', 1)[0]
+    check(failed, 'первый процесс выдал cookie закрепления', cookie.startswith(f'{PIN_COOKIE}='))
+
+    request(reader, path)
+    status, headers, body = request(reader, path)
+    check(failed, f"другой клиент получает из кэша второго процесса данные реплики ({body and body['name']})",
+          headers.get('X-Cache') == 'HIT' and body['name'] == 'Старое имя')
+
+    status, headers, body = request(reader, path, headers={'Cookie': cookie})
+    check(failed, f"клиент с cookie видит свое изменение мимо кэша ({body and body['name']}, "
+                  f"{headers.get('X-Cache')})",
+          status == 200 and body['name'] == 'Новое имя' and headers.get('X-Cache') == 'BYPASS')
+    status, headers, body = request(reader, path)
+    check(failed, 'ответ для клиента с cookie не попал в кэш',
+          headers.get('X-Cache') == 'HIT' and body['name'] == 'Старое имя')
+    return failed
+
+
+if __name__ == "__main__":
+    print("🚀 Проверяем кэш ответов в нескольких процессах...")
+    token, company_ids = seed()
+    shared = {'RESPONSE_CACHE_DIR': os.path.join(directory, 'response-cache')}
+    replica = {'RESPONSE_CACHE_DIR': os.path.join(directory, 'replica-cache'),
+               'DB_REPLICA_URL': 'sqlite:///' + replica_path}
+    servers = [start(shared), start(shared), start(replica), start(replica)]
+    failed = []
+    try:
+        if None in servers:
+            check(failed, 'gunicorn запустился', False)
+        else:
+            (_, writer), (_, reader) = servers[:2]
+            failed += check_invalidation(token, company_ids[0], writer, reader)
+            (_, writer), (_, reader) = servers[2:]
+            failed += check_pinned(token, company_ids[1], writer, reader)
+    finally:
+        for server in servers:
+            if server is not None:
+                server[0].terminate()
+                server[0].wait(timeout=30)
+
+    if failed:
+        print(f"💥 Не прошли проверки: {', '.join(failed)}")
+        sys.exit(1)
+    else:
+        print("🎉 Воркеры не отдают ответы старше последнего коммита, а клиент видит свои изменения!")
+        sys.exit(0)
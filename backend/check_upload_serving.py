@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Проверка раздачи загруженных файлов во всех режимах UPLOAD_SERVE_MODE.
+
+1. Через тестовый клиент Flask: python отдает байты и Range (206),
+   nginx - пустой ответ с X-Accel-Redirect, apache - с X-Sendfile;
+   заголовки Cache-Control у файла из хранилища по хэшу, у копии, которая
+   еще не готова, и у старого плоского имени.
+2. Загрузка JPEG, PNG и WebP с EXIF (GPS): метаданные удалены до
+   вычисления хэша без перекодирования пикселей (в JPEG осталась только
+   ориентация), имя совпадает с SHA-256 содержимого, и фоновая обработка
+   оригинал не перезаписывает - иначе immutable закэшировал бы другие байты.
+3. Фото больше 5 МБ отклоняется еще при разборе формы, не дочитывая
+   тело запроса.
+4. Если nginx установлен: запускает gunicorn с UPLOAD_SERVE_MODE=nginx и
+   nginx с конфигурацией из nginx.conf.example (пути и порты подменяются)
+   и проверяет целый файл и Range-запрос через прокси.
+
+Запуск: python backend/check_upload_serving.py
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'serving.db')
+
+from flask_jwt_extended import create_access_token
+from flask_migrate import upgrade
+from PIL import Image, PngImagePlugin
+from werkzeug.datastructures import FileStorage
+from werkzeug.test import encode_multipart
+from backend.app import app
+from backend.models import db, User
+from backend.images import processor as image_processor
+from backend.file_serving import IMMUTABLE, SHORT, REVALIDATE, SERVE_MODES
+from backend.uploads import content_path, TMP_DIR
+
+# Схему создают миграции, как при деплое
+with app.app_context():
+    upgrade()
+
+CONTENT = os.urandom(100_000)
+
+
+def create_files(folder):
+    """Файл в хранилище по хэшу и файл со старым плоским именем"""
+    filename = content_path(hashlib.sha256(CONTENT).hexdigest(), '.jpg')
+    path = os.path.join(folder, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(CONTENT)
+
+    legacy = '20200101_000000_serving_check.jpg'
+    with open(os.path.join(folder, legacy), 'wb') as f:
+        f.write(CONTENT)
+    return filename, legacy
+
+
+def remove_files(folder, filename, legacy):
+    os.remove(os.path.join(folder, filename))
+    os.remove(os.path.join(folder, legacy))
+    for directory in (os.path.dirname(filename), os.path.dirname(os.path.dirname(filename))):
+        try:
+            os.rmdir(os.path.join(folder, directory))
+        except OSError:
+            pass
+
+
+def check(failed, name, condition):
+    print(f"{'✅' if condition else '❌'} {name}")
+    if not condition:
+        failed.append(name)
+
+
+def check_flask(filename, legacy):
+    failed = []
+    client = app.test_client()
+    url = f'/static/uploads/{filename}'
+    variant_url = f'{url}.thumb.webp'
+
+    app.config['UPLOAD_SERVE_MODE'] = 'python'
+    response = client.get(url)
+    check(failed, 'python: файл целиком', response.status_code == 200 and response.data == CONTENT)
+    check(failed, 'python: immutable для файла по хэшу', response.headers.get('Cache-Control') == IMMUTABLE)
+    response = client.get(url, headers={'Range': 'bytes=10-19'})
+    check(failed, 'python: Range', response.status_code == 206 and response.data == CONTENT[10:20])
+    response = client.get(variant_url)
+    check(failed, 'python: оригинал вместо неготовой копии',
+          response.status_code == 200 and response.headers.get('Cache-Control') == REVALIDATE)
+    response = client.get(f'/static/uploads/{legacy}')
+    check(failed, 'python: короткий кэш для плоского имени', response.headers.get('Cache-Control') == SHORT)
+    check(failed, 'python: 404 для выхода из папки', client.get('/static/uploads/../backend/app.py').status_code == 404)
+    hidden = os.path.join(app.config['UPLOAD_FOLDER'], TMP_DIR, 'gc-check.jpg')
+    os.makedirs(os.path.dirname(hidden), exist_ok=True)
+    with open(hidden, 'wb') as f:
+        f.write(CONTENT)
+    try:
+        for mode in SERVE_MODES:
+            app.config['UPLOAD_SERVE_MODE'] = mode
+            statuses = [client.get(f'/static/uploads/{name}').status_code
+                        for name in (f'{TMP_DIR}/gc-check.jpg', f'./{TMP_DIR}/gc-check.jpg')]
+            check(failed, f'{mode}: 404 для временных файлов {TMP_DIR}/', statuses == [404, 404])
+        app.config['UPLOAD_SERVE_MODE'] = 'python'
+    finally:
+        os.remove(hidden)
+
+    app.config['UPLOAD_SERVE_MODE'] = 'nginx'
+    response = client.get(url)
+    check(failed, 'nginx: X-Accel-Redirect без тела',
+          response.headers.get('X-Accel-Redirect') == f"{app.config['UPLOAD_ACCEL_PREFIX']}{filename}"
+          and not response.data and response.mimetype == 'image/jpeg')
+    check(failed, 'nginx: immutable для файла по хэшу', response.headers.get('Cache-Control') == IMMUTABLE)
+    response = client.get(variant_url)
+    check(failed, 'nginx: оригинал вместо неготовой копии',
+          response.headers.get('X-Accel-Redirect', '').endswith(filename)
+          and response.headers.get('Cache-Control') == REVALIDATE)
+
+    app.config['UPLOAD_SERVE_MODE'] = 'apache'
+    response = client.get(url)
+    check(failed, 'apache: X-Sendfile с абсолютным путем',
+          response.headers.get('X-Sendfile') == os.path.join(app.config['UPLOAD_FOLDER'], filename) and not response.data)
+    check(failed, 'apache: 404 для отсутствующего файла', client.get('/static/uploads/missing.jpg').status_code == 404)
+
+    app.config['UPLOAD_SERVE_MODE'] = 'python'
+    return failed
+
+
+def check_exif_upload():
+    failed = []
+    with app.app_context():
+        user = User(email='exif@test.com', password='x', name='Фотограф')
+        db.session.add(user)
+        db.session.commit()
+        token = create_access_token(identity=str(user.id))
+
+    exif = Image.Exif()
+    exif[0x0112] = 6  # ориентация: повернуть на 90°
+    exif[0x8825] = {2: (55.0, 45.0, 0.0), 4: (37.0, 37.0, 0.0)}  # GPS
+    text = PngImagePlugin.PngInfo()
+    text.add_text('Comment', 'Дом, Москва')
+    originals = {}
+    for extension, save_format, options in (('.jpg', 'JPEG', {'exif': exif}),
+                                            ('.png', 'PNG', {'exif': exif, 'pnginfo': text}),
+                                            ('.webp', 'WEBP', {'exif': exif, 'lossless': True})):
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 32), 'red').save(buffer, save_format, **options)
+        originals[extension] = buffer.getvalue()
+
+    stored = {}
+    for extension, original in originals.items():
+        response = app.test_client().post('/api/upload', data={'file': (io.BytesIO(original), 'gps' + extension)},
+                                          headers={'Authorization': f'Bearer {token}'})
+        filename = response.json['filename']
+        path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        with open(path, 'rb') as f:
+            stored[path] = f.read()
+        with Image.open(path) as image, Image.open(io.BytesIO(original)) as source:
+            tags = set(image.getexif())
+            kept = {0x0112} if extension == '.jpg' else set()
+            check(failed, f'{extension}: GPS и прочие метаданные удалены при загрузке (теги EXIF: {sorted(tags)})',
+                  tags == kept and 'Comment' not in image.info)
+            check(failed, f'{extension}: пиксели не перекодированы', image.tobytes() == source.tobytes())
+            if extension == '.jpg':
+                check(failed, 'ориентация из EXIF сохранена', image.getexif().get(0x0112) == 6)
+        check(failed, f'{extension}: имя файла - SHA-256 очищенного содержимого',
+              filename == content_path(hashlib.sha256(stored[path]).hexdigest(), extension))
+
+    image_processor.join()
+    for path, data in stored.items():
+        with open(path, 'rb') as f:
+            check(failed, f'фоновая обработка не перезаписала {os.path.basename(path)[-8:]}', f.read() == data)
+    return failed
+
+
+def check_photo_limit():
+    failed = []
+    with app.app_context():
+        user = User(email='limit@test.com', password='x', name='Фотограф')
+        db.session.add(user)
+        db.session.commit()
+        token = create_access_token(identity=str(user.id))
+
+    # Два фото по 6 МБ: общий лимит запроса (16 МБ) не превышен, лимит на фото (5 МБ) - да
+    large = b'\xff\xd8' + b'\x00' * (6 * 1024 * 1024)
+    boundary, body = encode_multipart({'photos': [FileStorage(io.BytesIO(large), 'first.jpg'),
+                                                  FileStorage(io.BytesIO(large), 'second.jpg')]})
+    stream = io.BytesIO(body)
+    response = app.test_client().post('/api/upload-photos', input_stream=stream,
+                                      content_type=f'multipart/form-data; boundary={boundary}',
+                                      content_length=len(body), headers={'Authorization': f'Bearer {token}'})
+    check(failed, f'слишком большое фото отклонено ({response.status_code})', response.status_code == 400)
+    # Позиция в теле - сколько из него прочитано
+    check(failed, f'разбор оборван на первом фото: прочитано {stream.tell() // 1024} КБ из {len(body) // 1024} КБ',
+          stream.tell() < len(large))
+    return failed
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def render_nginx_config(workdir, nginx_port, app_port):
+    """nginx.conf.example с временными путями и портами"""
+    with open(os.path.join(BASE_DIR, 'nginx.conf.example'), encoding='utf-8') as f:
+        config = f.read()
+
+    mime_types = next((path for path in ('/etc/nginx/mime.types', '/usr/local/etc/nginx/mime.types',
+                                          '/usr/local/nginx/conf/mime.types') if os.path.exists(path)), None)
+    replacements = {
+        'pid /run/nginx.pid;': f"pid {os.path.join(workdir, 'nginx.pid')};\n"
+                               f"error_log {os.path.join(workdir, 'error.log')};\ndaemon off;",
+        'include mime.types;': f'include {mime_types};' if mime_types else 'types { image/jpeg jpg; }',
+        'listen 80;': f'listen 127.0.0.1:{nginx_port};\n        access_log off;',
+        'server 127.0.0.1:8000;': f'server 127.0.0.1:{app_port};',
+        'alias /opt/app/static/uploads/;': f"alias {app.config['UPLOAD_FOLDER'].rstrip('/')}/;"
+    }
+    for old, new in replacements.items():
+        config = config.replace(old, new)
+
+    # Временные каталоги nginx - во временной папке
+    for name in ('client_body', 'proxy', 'fastcgi', 'uwsgi', 'scgi'):
+        config = config.replace('http {', f"http {{\n    {name}_temp_path {os.path.join(workdir, name)};", 1)
+
+    path = os.path.join(workdir, 'nginx.conf')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(config)
+    return path
+
+
+def check_nginx(filename):
+    nginx = shutil.which('nginx')
+    if not nginx:
+        print("⚠️ nginx не установлен - проверка через прокси пропущена")
+        return []
+
+    failed = []
+    workdir = tempfile.mkdtemp()
+    nginx_port, app_port = free_port(), free_port()
+    env = {**os.environ, 'UPLOAD_SERVE_MODE': 'nginx', 'PYTHONPATH': BASE_DIR}
+    processes = [subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-b', f'127.0.0.1:{app_port}', 'backend.app:app'],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )]
+    try:
+        config = render_nginx_config(workdir, nginx_port, app_port)
+        processes.append(subprocess.Popen([nginx, '-c', config, '-p', workdir],
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        if not (wait_for(app_port) and wait_for(nginx_port)):
+            check(failed, 'nginx и gunicorn запустились', False)
+            return failed
+
+        url = f'http://127.0.0.1:{nginx_port}/static/uploads/{filename}'
+        with urllib.request.urlopen(url) as response:
+            check(failed, 'nginx: файл целиком через прокси', response.status == 200 and response.read() == CONTENT)
+            check(failed, 'nginx: Cache-Control от приложения', response.headers.get('Cache-Control') == IMMUTABLE)
+
+        request = urllib.request.Request(url, headers={'Range': 'bytes=100-199'})
+        with urllib.request.urlopen(request) as response:
+            check(failed, 'nginx: Range через прокси',
+                  response.status == 206 and response.read() == CONTENT[100:200]
+                  and response.headers.get('Content-Range') == f'bytes 100-199/{len(CONTENT)}')
+
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{nginx_port}/internal-uploads/{filename}')
+            check(failed, 'nginx: internal-локация закрыта снаружи', False)
+        except urllib.error.HTTPError as e:
+            check(failed, 'nginx: internal-локация закрыта снаружи', e.code == 404)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return failed
+
+
+if __name__ == "__main__":
+    print("🚀 Проверяем раздачу загруженных файлов...")
+    folder = app.config['UPLOAD_FOLDER']
+    filename, legacy = create_files(folder)
+    try:
+        failed = check_flask(filename, legacy) + check_exif_upload() + check_photo_limit() + check_nginx(filename)
+    finally:
+        remove_files(folder, filename, legacy)
+
+    if failed:
+        print(f"💥 Не прошли проверки: {', '.join(failed)}")
+        sys.exit(1)
+    else:
+        print("🎉 Раздача файлов работает во всех режимах!")
+        sys.exit(0)
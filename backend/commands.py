@@ -0,0 +1,94 @@
+"""
+CLI-команды приложения (запуск: flask --app backend.app <команда>)
+"""
+
+import os
+
+import click
+
+
+def ensure_admin(email=None, password=None):
+    """Создает администратора, если его нет; возвращает True, если создан"""
+    from werkzeug.security import generate_password_hash
+    from backend.models import db, User
+
+    email = email or os.environ.get('ADMIN_EMAIL', 'admin@test.com')
+    if User.query.filter_by(email=email).first():
+        return False
+    admin_user = User(
+        email=email,
+        password=generate_password_hash(password or os.environ.get('ADMIN_PASSWORD', 'admin123')),
+        name='Администратор',
+        role='admin'
+    )
+    db.session.add(admin_user)
+    db.session.commit()
+    return True
+
+
+def register_commands(app):
+    """Регистрирует CLI-команды в приложении"""
+
+    @app.cli.command('reconcile-ratings')
+    @click.option('--batch-size', default=500, show_default=True, help='Компаний в одной транзакции')
+    def reconcile_ratings_command(batch_size):
+        """Пересчитывает рейтинги компаний и исправляет расхождения"""
+        from backend.aggregates import reconcile_company_ratings
+
+        fixed = reconcile_company_ratings(batch_size=batch_size)
+        click.echo(f"✅ Исправлено компаний: {fixed}")
+
+    @app.cli.command('reconcile-comment-counts')
+    @click.option('--batch-size', default=500, show_default=True, help='Статей в одной транзакции')
+    def reconcile_comment_counts_command(batch_size):
+        """Пересчитывает счетчики комментариев статей и исправляет расхождения"""
+        from backend.aggregates import reconcile_comment_counts
+
+        fixed = reconcile_comment_counts(batch_size=batch_size)
+        click.echo(f"✅ Исправлено статей: {fixed}")
+
+    @app.cli.command('backfill-tags')
+    @click.option('--batch-size', default=500, show_default=True, help='Статей в одной транзакции')
+    def backfill_tags_command(batch_size):
+        """Заполняет индекс тегов по Article.tags и пересчитывает счетчики"""
+        from backend.tags import rebuild_tag_index
+
+        processed = rebuild_tag_index(batch_size=batch_size)
+        click.echo(f"✅ Обработано статей: {processed}")
+
+    @app.cli.command('process-images')
+    def process_images_command():
+        """Создает недостающие копии загруженных изображений"""
+        from backend.images import processor
+
+        processed = processor.process_missing()
+        click.echo(f"✅ Обработано изображений: {processed}")
+
+    @app.cli.command('gc-uploads')
+    @click.option('--batch-size', default=100, show_default=True, help='Файлов в одной транзакции')
+    @click.option('--max-batches', default=None, type=int, help='Остановиться после N пачек')
+    def gc_uploads_command(batch_size, max_batches):
+        """Удаляет загруженные файлы, на которые никто не ссылается"""
+        from backend.upload_registry import collect_garbage
+
+        removed, freed = collect_garbage(app.config['UPLOAD_FOLDER'], batch_size=batch_size, max_batches=max_batches)
+        click.echo(f"✅ Удалено файлов: {removed}, освобождено: {freed / (1024 * 1024):.1f} МБ")
+
+    @app.cli.command('rebuild-uploads')
+    @click.option('--batch-size', default=500, show_default=True, help='Записей в одной транзакции')
+    def rebuild_uploads_command(batch_size):
+        """Заносит в реестр файлы с диска и пересчитывает ссылки на них"""
+        from backend.upload_registry import rebuild_registry
+
+        added, fixed = rebuild_registry(app.config['UPLOAD_FOLDER'], batch_size=batch_size)
+        click.echo(f"✅ Добавлено файлов: {added}, исправлено счетчиков: {fixed}")
+
+    @app.cli.command('create-admin')
+    @click.option('--email', default=None, help='По умолчанию ADMIN_EMAIL или admin@test.com')
+    @click.option('--password', default=None, help='По умолчанию ADMIN_PASSWORD или admin123')
+    def create_admin_command(email, password):
+        """Создает администратора, если его еще нет (после flask db upgrade)"""
+        if ensure_admin(email, password):
+            click.echo("✅ Администратор создан")
+        else:
+            click.echo("✅ Администратор уже существует")
@@ -0,0 +1,27 @@
+"""
+Код, долго занимающий процессор, при воркерах gevent.
+
+Под gevent (GUNICORN_WORKER_CLASS=gevent, см. gunicorn.conf.py) потоки -
+это гринлеты в одном потоке ОС: хэширование пароля или обработка
+изображения остановили бы на это время все запросы воркера. run_blocking
+выполняет такую функцию в пуле настоящих потоков gevent (hashlib и Pillow
+отпускают GIL), а гринлет тем временем ждет, не блокируя остальных.
+В воркерах sync и gthread функция просто вызывается.
+"""
+
+import sys
+
+
+def is_gevent():
+    """Пропатчил ли gevent стандартную библиотеку в этом процессе"""
+    if 'gevent' not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched('threading')
+
+
+def run_blocking(function, *args, **kwargs):
+    if is_gevent():
+        import gevent
+        return gevent.get_hub().threadpool.apply(function, args, kwargs)
+    return function(*args, **kwargs)
@@ -0,0 +1,54 @@
+"""
+Условные GET-запросы (ETag / Last-Modified / 304).
+
+Валидаторы карточки компании и статьи строятся из updated_at и агрегатов
+строки (review_count, rating_sum, comment_count), поэтому для ответа 304
+достаточно прочитать одну строку - без отзывов, комментариев и
+сериализации тела. updated_at компании и статьи сдвигается при любом
+изменении их одобренных отзывов и комментариев, а также имени и аватара
+владельца, автора и авторов отзывов и комментариев (см. backend.aggregates).
+"""
+
+import hashlib
+from datetime import timezone
+
+from flask import request, make_response
+
+
+def make_etag(*parts):
+    """Хэш от частей версии ресурса"""
+    raw = ':'.join('' if part is None else str(part) for part in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _http_date(value):
+    # В базе наивное время UTC; HTTP-даты с точностью до секунды
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc, microsecond=0)
+
+
+def set_validators(response, etag, last_modified=None, weak=False):
+    """Проставляет ETag, Last-Modified и требование перепроверки"""
+    response.set_etag(etag, weak=weak)
+    if last_modified is not None:
+        response.last_modified = _http_date(last_modified)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def not_modified(etag, last_modified=None, weak=False):
+    """Ответ 304, если копия клиента актуальна, иначе None.
+
+    If-None-Match важнее If-Modified-Since (RFC 9110, 13.2.2).
+    """
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified is not None:
+        fresh = _http_date(last_modified) <= request.if_modified_since
+    else:
+        fresh = False
+
+    if not fresh:
+        return None
+    return set_validators(make_response('', 304), etag, last_modified, weak)
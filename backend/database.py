@@ -0,0 +1,193 @@
+"""
+Настройки движка базы данных и телеметрия пула соединений.
+
+Параметры пула (для PostgreSQL и файловой SQLite) берутся из окружения:
+- DB_POOL_SIZE - постоянных соединений на процесс (по умолчанию 5);
+- DB_MAX_OVERFLOW - сколько соединений можно открыть сверх него (5);
+- DB_POOL_TIMEOUT - сколько секунд ждать свободное соединение (10);
+- DB_POOL_RECYCLE - переоткрывать соединения старше стольких секунд (1800);
+- DB_POOL_PRE_PING - проверять соединение перед выдачей (1): соединения,
+  которые закрыл сервер или прокси, заменяются без ошибки в запросе.
+Только для PostgreSQL:
+- DB_STATEMENT_TIMEOUT_MS - statement_timeout (30000, 0 - без ограничения);
+- DB_CONNECT_TIMEOUT - таймаут подключения в секундах (10);
+- DB_PGBOUNCER=1 - режим для PgBouncer с pool_mode=transaction: соединения
+  держит PgBouncer (NullPool в процессе), серверные prepared statements
+  выключены, а statement_timeout задается SET LOCAL в каждой транзакции
+  (параметр подключения options PgBouncer не пропускает).
+
+Каждый воркер gunicorn держит свой пул, поэтому к базе открывается до
+воркеры x (DB_POOL_SIZE + DB_MAX_OVERFLOW) соединений - это число должно
+быть меньше max_connections сервера.
+
+Телеметрия (для /api/metrics): время ожидания соединения из пула, выдачи,
+таймауты, новые и сброшенные соединения, занятые соединения и емкость пула.
+"""
+
+import os
+import threading
+import time
+import weakref
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+def _flag(name, default):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes')
+
+
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+POOL_PRE_PING = _flag('DB_POOL_PRE_PING', '1')
+STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', 10))
+PGBOUNCER = _flag('DB_PGBOUNCER', '0')
+
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class PoolStats:
+    """Счетчики пулов процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.events = {'checkout': 0, 'timeout': 0, 'connect': 0, 'invalidate': 0}
+        # Число ожиданий в каждом интервале WAIT_BUCKETS (последний - +Inf) и сумма
+        self.wait = [0] * (len(WAIT_BUCKETS) + 2)
+        # Занятые соединения каждого движка, подключенного instrument. Емкость
+        # считается по текущим пулам этих движков, а не копится при каждом
+        # create_app: в процессе с несколькими приложениями (проверки,
+        # фабрика после импорта backend.app) она иначе завышалась бы
+        self._checked_out = weakref.WeakKeyDictionary()
+
+    def observe_wait(self, seconds, timed_out=False):
+        with self._lock:
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if seconds <= bound:
+                    self.wait[i] += 1
+                    break
+            else:
+                self.wait[len(WAIT_BUCKETS)] += 1
+            self.wait[-1] += seconds
+            if timed_out:
+                self.events['timeout'] += 1
+
+    def count(self, name, delta=1):
+        with self._lock:
+            self.events[name] += delta
+
+    def track(self, engine):
+        with self._lock:
+            self._checked_out.setdefault(engine, 0)
+
+    def shift_checked_out(self, engine, delta):
+        with self._lock:
+            self._checked_out[engine] = self._checked_out.get(engine, 0) + delta
+
+    def snapshot(self, engines=None):
+        """Счетчики процесса; занятые соединения и емкость - по движкам engines (по умолчанию всем)"""
+        with self._lock:
+            tracked = list(self._checked_out.items())
+            snapshot = {'events': dict(self.events), 'wait': list(self.wait)}
+        if engines is not None:
+            engines = set(engines)
+            tracked = [(engine, count) for engine, count in tracked if engine in engines]
+        snapshot['checked_out'] = sum(count for _, count in tracked)
+        # engine.pool меняется при dispose(), поэтому берем текущий
+        snapshot['capacity'] = sum(engine.pool.size() + max(MAX_OVERFLOW, 0)
+                                   for engine, _ in tracked if isinstance(engine.pool, TimedQueuePool))
+        return snapshot
+
+
+pool_stats = PoolStats()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool, который измеряет ожидание свободного соединения"""
+
+    # Журнал пула - в пространстве имен sqlalchemy, как у встроенных пулов
+    _sqla_logger_namespace = 'sqlalchemy.pool.impl.TimedQueuePool'
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_stats.observe_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_stats.observe_wait(time.perf_counter() - start)
+        return connection
+
+
+def engine_options(database_url):
+    """SQLALCHEMY_ENGINE_OPTIONS для адреса базы"""
+    url = make_url(database_url)
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            # Flask-SQLAlchemy сам выбирает StaticPool для базы в памяти
+            return {}
+        return _pool_options()
+
+    options = {'pool_pre_ping': POOL_PRE_PING}
+    connect_args = {}
+    if url.get_backend_name() == 'postgresql':
+        connect_args['connect_timeout'] = CONNECT_TIMEOUT
+        if PGBOUNCER:
+            # В режиме transaction соседние транзакции идут через разные серверные
+            # соединения, поэтому prepared statements psycopg ломаются
+            connect_args['prepare_threshold'] = None
+        elif STATEMENT_TIMEOUT_MS:
+            connect_args['options'] = f'-c statement_timeout={STATEMENT_TIMEOUT_MS}'
+
+    if url.get_backend_name() == 'postgresql' and PGBOUNCER:
+        options['poolclass'] = NullPool
+    else:
+        options.update(_pool_options())
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+def _pool_options():
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': POOL_SIZE,
+        'max_overflow': MAX_OVERFLOW,
+        'pool_timeout': POOL_TIMEOUT,
+        'pool_recycle': POOL_RECYCLE,
+        'pool_pre_ping': POOL_PRE_PING
+    }
+
+
+def instrument(engine):
+    """Подключает телеметрию пула и SET LOCAL statement_timeout для PgBouncer"""
+    pool_stats.track(engine)
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        pool_stats.count('connect')
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_stats.count('checkout')
+        pool_stats.shift_checked_out(engine, 1)
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        pool_stats.shift_checked_out(engine, -1)
+
+    @event.listens_for(engine, 'invalidate')
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        # В том числе соединения, отвергнутые pre-ping
+        pool_stats.count('invalidate')
+
+    if engine.dialect.name == 'postgresql' and PGBOUNCER and STATEMENT_TIMEOUT_MS:
+        @event.listens_for(engine, 'begin')
+        def set_statement_timeout(connection):
+            connection.exec_driver_sql(f'SET LOCAL statement_timeout = {STATEMENT_TIMEOUT_MS}')
+
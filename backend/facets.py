@@ -0,0 +1,127 @@
+"""
+Фасеты каталога: категории, города и пороги рейтинга с количеством
+одобренных компаний.
+
+В памяти процесса хранится куб "(категория, город, целая часть рейтинга)
+-> количество компаний", построенный одним GROUP BY. Куб маленький (порядка
+категорий x городов x 6), поэтому счетчики под любой выбор фильтров
+считаются по нему без обращения к базе.
+
+Куб сбрасывается через backend.changes, когда меняются компании или
+одобренные отзывы (они двигают рейтинг), и перестраивается при следующем
+запросе. Изменения других воркеров подхватываются не позже TTL_SECONDS.
+"""
+
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import case, func
+from backend.models import db, Company, Review
+from backend import changes
+
+TTL_SECONDS = 60
+
+# Пороги фильтра "Минимальный рейтинг" в каталоге
+RATING_THRESHOLDS = [4, 3, 2]
+
+
+class FacetCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cube = None
+        self._built_at = 0
+
+    def _load(self):
+        rating_floor = case(
+            (Company.rating >= 5, 5),
+            (Company.rating >= 4, 4),
+            (Company.rating >= 3, 3),
+            (Company.rating >= 2, 2),
+            (Company.rating >= 1, 1),
+            else_=0
+        )
+        rows = db.session.query(
+            Company.category, Company.city, rating_floor, func.count(Company.id)
+        ).filter(
+            Company.status == 'approved'
+        ).group_by(
+            Company.category, Company.city, rating_floor
+        ).all()
+        return Counter({(category, city, floor): count for category, city, floor, count in rows})
+
+    def _get_cube(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._cube is None or now - self._built_at > TTL_SECONDS:
+                self._cube = self._load()
+                self._built_at = now
+            return self._cube
+
+    def invalidate(self):
+        """Перестроить куб при следующем запросе"""
+        with self._lock:
+            self._cube = None
+
+    def apply_changes(self, change_list):
+        for change in change_list:
+            if change.model is Company and change.changed('category', 'city', 'status', 'rating'):
+                self.invalidate()
+                return
+            if change.model is Review and change.changed('status', 'rating'):
+                # Рейтинг компании двигают только одобренные отзывы
+                if 'approved' in (change.values.get('status'), change.previous.get('status')):
+                    self.invalidate()
+                    return
+
+    def counts(self, category=None, city=None, min_rating=None):
+        """Фасеты под текущий выбор.
+
+        Счетчики каждого фасета учитывают остальные фильтры, но не свой
+        собственный, чтобы в списке были видны и соседние варианты.
+        """
+        cube = self._get_cube()
+
+        categories = Counter()
+        cities = Counter()
+        ratings = Counter()
+        total = 0
+
+        for (row_category, row_city, floor), count in cube.items():
+            category_ok = not category or row_category == category
+            city_ok = not city or row_city == city
+            rating_ok = min_rating is None or floor >= min_rating
+
+            if city_ok and rating_ok:
+                categories[row_category] += count
+            if category_ok and rating_ok:
+                cities[row_city] += count
+            if category_ok and city_ok:
+                for threshold in RATING_THRESHOLDS:
+                    if floor >= threshold:
+                        ratings[threshold] += count
+                if rating_ok:
+                    total += count
+
+        return {
+            'categories': [{'value': value, 'count': count} for value, count in _ordered(categories)],
+            'cities': [{'value': value, 'count': count} for value, count in _ordered(cities)],
+            'ratings': [{'min': threshold, 'count': ratings[threshold]} for threshold in RATING_THRESHOLDS],
+            'total': total
+        }
+
+    def values(self, field):
+        """Категории или города одобренных компаний, самые частые первыми"""
+        position = {'category': 0, 'city': 1}[field]
+        totals = Counter()
+        for key, count in self._get_cube().items():
+            totals[key[position]] += count
+        return [value for value, _ in _ordered(totals)]
+
+
+def _ordered(counter):
+    return sorted(counter.items(), key=lambda item: (-item[1], item[0] or ''))
+
+
+cache = FacetCache()
+changes.subscribe(cache.apply_changes)
@@ -0,0 +1,69 @@
+"""
+Раздача загруженных файлов.
+
+Режим задается UPLOAD_SERVE_MODE:
+- python (по умолчанию) - файл отдает сам Flask (с поддержкой Range и 304);
+- nginx - Flask только проверяет путь и отвечает заголовком
+  X-Accel-Redirect: <UPLOAD_ACCEL_PREFIX><имя>, а байты (и Range) отдает
+  nginx из internal-локации (пример - nginx.conf.example);
+- apache - то же через X-Sendfile: <абсолютный путь> (mod_xsendfile).
+
+Файлы из хранилища по хэшу (и их копии) не меняются - метаданные удалены
+еще до вычисления хэша, - поэтому отдаются с Cache-Control immutable на год. Пока копия изображения не готова, по ее
+адресу отдается оригинал без долгого кэширования. Служебная папка .tmp
+(временные файлы загрузок и сборщика мусора) не отдается.
+"""
+
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import Response, abort, send_from_directory
+from werkzeug.security import safe_join
+from backend.images import original_name
+from backend.uploads import CONTENT_ADDRESSED, TMP_DIR
+
+SERVE_MODES = ('python', 'nginx', 'apache')
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+SHORT = 'public, max-age=3600'
+REVALIDATE = 'no-cache'
+
+
+def _cache_control(filename, fallback):
+    if fallback:
+        return REVALIDATE
+    if CONTENT_ADDRESSED.match(filename):
+        return IMMUTABLE
+    # Старые файлы с плоскими именами теоретически могут быть перезаписаны
+    return SHORT
+
+
+def send_upload(folder, filename, mode='python', accel_prefix='/internal-uploads/'):
+    """Ответ с загруженным файлом; 404, если путь выходит за папку загрузок"""
+    path = safe_join(folder, filename)
+    if path is None:
+        abort(404)
+    # Недописанные загрузки и файлы, которые удаляет сборщик мусора, не публичны
+    if os.path.relpath(path, folder).split(os.sep)[0] == TMP_DIR:
+        abort(404)
+
+    fallback = False
+    original = original_name(filename)
+    if original and not os.path.exists(path):
+        # Копия еще не готова (или не создается) - отдаем оригинал
+        filename, path, fallback = original, safe_join(folder, original), True
+
+    if mode == 'nginx':
+        response = Response(status=200, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = accel_prefix + quote(filename)
+    elif mode == 'apache':
+        if not os.path.isfile(path):
+            abort(404)
+        response = Response(status=200, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['X-Sendfile'] = os.path.abspath(path)
+    else:
+        response = send_from_directory(folder, filename)
+
+    response.headers['Cache-Control'] = _cache_control(filename, fallback)
+    return response
@@ -0,0 +1,118 @@
+"""
+Полнотекстовый поиск по компаниям, статьям и отзывам.
+
+PostgreSQL: генерируемая колонка search_vector (tsvector, конфигурация
+'russian') с GIN-индексом. SQLite: теневые таблицы FTS5 <таблица>_fts,
+которые триггеры синхронизируют при вставке, изменении и удалении.
+Обе структуры создаются миграцией 0004_fulltext_search; пока ее нет,
+поиск работает по-старому через ILIKE.
+"""
+
+import re
+import time
+
+from sqlalchemy import column, false, func, inspect, literal, literal_column, or_, select, table as table_clause
+from backend.models import db
+
+# Поля, по которым ищем, и их веса для ранжирования в SQLite
+# (в PostgreSQL те же веса заданы через setweight в миграции)
+SEARCH_FIELDS = {
+    'company': [('name', 10.0), ('category', 4.0), ('city', 4.0), ('description', 1.0)],
+    'article': [('title', 10.0), ('tags', 4.0), ('excerpt', 4.0), ('content', 1.0)],
+    'review': [('text', 1.0)],
+}
+
+MAX_TERMS = 8
+# Через сколько секунд снова проверять базу, в которой индекса не было
+RECHECK_SECONDS = 60
+
+# (URL базы, таблица) -> True или время, когда индекса не оказалось
+_available = {}
+
+
+def _terms(query_text):
+    return re.findall(r'\w+', query_text.lower())[:MAX_TERMS]
+
+
+def _tsquery(terms):
+    return func.to_tsquery('russian', ' & '.join(f'{term}:*' for term in terms))
+
+
+def _fts_query(terms):
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _fts_table(table):
+    return table_clause(f'{table}_fts', column('rowid'))
+
+
+def _dialect():
+    return db.engine.dialect.name
+
+
+def is_available(table):
+    """Есть ли в базе поисковый индекс для таблицы.
+
+    Найденный индекс кэшируется навсегда, отсутствие - на RECHECK_SECONDS:
+    миграция, примененная к работающему приложению, включает поиск без перезапуска.
+    """
+    key = (str(db.engine.url), table)
+    cached = _available.get(key)
+    if cached is True or (cached is not None and time.monotonic() - cached < RECHECK_SECONDS):
+        return cached is True
+    inspector = inspect(db.engine)
+    if _dialect() == 'postgresql':
+        available = any(column['name'] == 'search_vector' for column in inspector.get_columns(table))
+    elif _dialect() == 'sqlite':
+        available = inspector.has_table(f'{table}_fts')
+    else:
+        available = False
+    _available[key] = True if available else time.monotonic()
+    return available
+
+
+def _fallback_match(model, query_text):
+    table = model.__tablename__
+    search_term = f"%{query_text}%"
+    return or_(*[getattr(model, field).ilike(search_term) for field, _ in SEARCH_FIELDS[table]])
+
+
+def match(model, query_text):
+    """Условие WHERE: запись подходит под поисковый запрос"""
+    table = model.__tablename__
+    terms = _terms(query_text)
+    if not terms:
+        return false()
+
+    if not is_available(table):
+        return _fallback_match(model, query_text)
+
+    if _dialect() == 'postgresql':
+        return literal_column(f'{table}.search_vector').op('@@')(_tsquery(terms))
+
+    fts = _fts_table(table)
+    return model.id.in_(
+        select(fts.c.rowid).where(literal_column(fts.name).op('MATCH')(_fts_query(terms)))
+    )
+
+
+def rank(model, query_text):
+    """Релевантность записи (чем больше, тем выше в выдаче)"""
+    table = model.__tablename__
+    terms = _terms(query_text)
+    if not terms or not is_available(table):
+        return literal(0)
+
+    if _dialect() == 'postgresql':
+        return func.ts_rank_cd(literal_column(f'{table}.search_vector'), _tsquery(terms))
+
+    # bm25 в FTS5 отрицательный: чем меньше, тем релевантнее
+    fts = _fts_table(table)
+    return -(
+        select(func.bm25(literal_column(fts.name), *[literal(weight) for _, weight in SEARCH_FIELDS[table]]))
+        .where(
+            literal_column(fts.name).op('MATCH')(_fts_query(terms)),
+            fts.c.rowid == model.id
+        )
+        .scalar_subquery()
+    )
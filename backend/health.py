@@ -0,0 +1,231 @@
+"""
+Пробы живости и готовности.
+
+- GET /api/health/live - процесс жив и обрабатывает запросы; без обращений
+  к базе и диску.
+- GET /api/health/ready (и старый адрес /api/health) - готовность принимать
+  трафик. База и версия миграций проверяются фоновым потоком раз в
+  HEALTH_INTERVAL_SECONDS (5), проба только читает сохраненное состояние,
+  поэтому частые проверки не нагружают базу и не ждут соединение из
+  занятого пула. Пока пул занят полностью, поток тоже не берет соединение.
+  Ответ 503, если база недоступна, миграции не применены, упал фоновый
+  поток или состояние старше HEALTH_STALE_SECONDS (30).
+
+Поток запускается при старте воркера gunicorn (post_worker_init в
+gunicorn.conf.py) или с первым запросом, а не при импорте приложения.
+Проба готовности до первой проверки ждет ее результат не дольше
+HEALTH_STARTUP_WAIT_SECONDS (2), чтобы новый воркер не отвечал 503
+только потому, что проверка еще не успела выполниться.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+from flask import jsonify
+from sqlalchemy import text
+
+from backend.models import db
+from backend.database import pool_stats
+from backend.view_counter import counter as view_counter
+from backend.images import processor as image_processor
+from backend.read_replica import router as replica_router
+from backend.log import get_logger
+
+logger = get_logger(__name__)
+
+INTERVAL_SECONDS = float(os.environ.get('HEALTH_INTERVAL_SECONDS', 5))
+STALE_SECONDS = float(os.environ.get('HEALTH_STALE_SECONDS', 30))
+STARTUP_WAIT_SECONDS = float(os.environ.get('HEALTH_STARTUP_WAIT_SECONDS', 2))
+# Доля занятых соединений, начиная с которой пул считается перегруженным
+POOL_SATURATION = float(os.environ.get('HEALTH_POOL_SATURATION', 0.9))
+
+WORKERS = {
+    'view_counter': view_counter,
+    'image_processor': image_processor
+}
+
+
+class HealthMonitor:
+    def __init__(self, interval=INTERVAL_SECONDS, stale=STALE_SECONDS):
+        self.interval = interval
+        self.stale = stale
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        # Первая проверка в этом процессе выполнена
+        self._checked = threading.Event()
+        self._state = None
+        self._heads = None
+        self._app = None
+        self._engines = ()
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        self._app = app
+        # Загрузка пула - по движкам этого приложения, а не всего процесса
+        with app.app_context():
+            self._engines = tuple(db.engines.values())
+        app.extensions['health'] = self
+        app.add_url_rule('/api/health/live', 'health_live', self._live)
+        app.add_url_rule('/api/health/ready', 'health_ready', self._ready)
+        app.add_url_rule('/api/health', 'health_check', self._ready)
+        # Без gunicorn (flask run, python -m backend.app) поток стартует с первым запросом
+        app.before_request(self.start)
+
+    def start(self):
+        """Запускает фоновую проверку в этом процессе, если она еще не идет"""
+        self._ensure_thread()
+
+    # --- Пробы ---
+
+    def _live(self):
+        response = jsonify({'status': 'ok', 'pid': os.getpid()})
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    def _ready(self):
+        self._ensure_thread()
+        if self._state is None:
+            # Свежий воркер: даем первой проверке время завершиться
+            self._checked.wait(STARTUP_WAIT_SECONDS)
+        report = self.report()
+        response = jsonify(report)
+        response.status_code = 200 if report['status'] in ('ready', 'degraded') else 503
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    def report(self):
+        """Готовность по последней фоновой проверке и текущему состоянию процесса"""
+        with self._lock:
+            state = self._state
+        pool = pool_stats.snapshot(self._engines)
+        saturation = pool['checked_out'] / pool['capacity'] if pool['capacity'] else 0.0
+        workers = {name: worker.status() for name, worker in WORKERS.items()}
+        report = {
+            'pool': {
+                'checked_out': pool['checked_out'],
+                'capacity': pool['capacity'],
+                'saturation': round(saturation, 3),
+                'timeouts': pool['events']['timeout']
+            },
+            'workers': workers
+        }
+        if replica_router.enabled:
+            # Без реплики чтение идет в основную базу, поэтому на готовность она не влияет
+            report['replica'] = replica_router.status()
+        if state is None:
+            report['status'] = 'starting'
+            return report
+
+        age = time.monotonic() - state['monotonic']
+        report.update({
+            'checked_at': state['checked_at'],
+            'age_seconds': round(age, 3),
+            'database': state['database'],
+            'migrations': state['migrations']
+        })
+        problems = []
+        if state['database']['status'] != 'ok':
+            problems.append('database')
+        if not state['migrations']['up_to_date']:
+            problems.append('migrations')
+        problems.extend(name for name, worker in workers.items() if worker['thread'] == 'dead')
+        if age > self.stale:
+            problems.append('stale')
+
+        if problems:
+            report['status'] = 'not_ready'
+            report['problems'] = problems
+        elif saturation >= POOL_SATURATION:
+            # Перегруженный пул - повод насторожиться, но не снимать воркер с трафика
+            report['status'] = 'degraded'
+        else:
+            report['status'] = 'ready'
+        return report
+
+    # --- Фоновая проверка ---
+
+    def _ensure_thread(self):
+        # После fork (воркеры gunicorn) поток родителя не наследуется
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._state = None
+                self._checked = threading.Event()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='health-monitor', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning('Не удалось обновить состояние готовности', extra={'error': str(e)})
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def refresh(self):
+        """Проверяет базу и версию миграций, сохраняет результат"""
+        with self._lock:
+            previous = self._state
+        pool = pool_stats.snapshot(self._engines)
+        if previous is not None and pool['capacity'] and pool['checked_out'] >= pool['capacity']:
+            # Свободных соединений нет: не встаем в очередь за запросами,
+            # повторяем прошлый результат
+            database = dict(previous['database'], skipped=True)
+            migrations = previous['migrations']
+        else:
+            database, migrations = self._check_database()
+
+        state = {
+            'monotonic': time.monotonic(),
+            'checked_at': datetime.utcnow().isoformat(),
+            'database': database,
+            'migrations': migrations
+        }
+        with self._lock:
+            self._state = state
+        self._checked.set()
+        return state
+
+    def _check_database(self):
+        heads = self._migration_heads()
+        migrations = {'current': [], 'head': heads, 'up_to_date': False}
+        start = time.perf_counter()
+        try:
+            with self._app.app_context():
+                with db.engine.connect() as connection:
+                    connection.execute(text('SELECT 1'))
+                    database = {'status': 'ok', 'latency_ms': round((time.perf_counter() - start) * 1000, 1)}
+                    try:
+                        migrations['current'] = sorted(connection.execute(
+                            text('SELECT version_num FROM alembic_version')
+                        ).scalars())
+                    except Exception:
+                        # Таблицы alembic_version нет - миграции не применялись
+                        pass
+        except Exception as e:
+            return {'status': 'error', 'error': str(e).splitlines()[0]}, migrations
+
+        migrations['up_to_date'] = bool(heads) and migrations['current'] == heads
+        return database, migrations
+
+    def _migration_heads(self):
+        # Последние ревизии из migrations/versions: читаются с диска один раз
+        if self._heads is None:
+            from alembic.config import Config
+            from alembic.script import ScriptDirectory
+
+            config = Config()
+            config.set_main_option('script_location', self._app.extensions['migrate'].directory)
+            self._heads = sorted(ScriptDirectory.from_config(config).get_heads())
+        return self._heads
+
+
+monitor = HealthMonitor()
@@ -0,0 +1,400 @@
+"""
+Обработка загруженных изображений.
+
+После загрузки файл ставится в очередь, и фоновый поток (не запрос)
+создает уменьшенные копии для трех размеров - thumb, medium, large - в
+исходном формате и в WebP. EXIF, GPS и другие метаданные удаляются из
+оригинала еще при загрузке (strip_metadata) без перекодирования: store_upload
+выбрасывает их сегменты из потока до вычисления хэша, и файл по адресу из
+хэша потом не меняется. Имена копий выводятся из имени
+оригинала: photo.jpg -> photo.jpg.thumb.jpg и photo.jpg.thumb.webp, поэтому
+фронтенду достаточно имени файла. Пока копия не готова, по ее адресу
+отдается оригинал.
+
+Если процесс остановился с непустой очередью, недостающие копии создает
+команда flask --app backend.app process-images.
+"""
+
+import os
+import queue
+import re
+import threading
+import uuid
+
+from PIL import Image, ImageOps
+from backend.uploads import iter_files, CONTENT_ADDRESSED, CHUNK_SIZE
+from backend.log import get_logger
+from backend.concurrency import run_blocking
+
+logger = get_logger(__name__)
+
+# Наибольшая сторона копии в пикселях
+VARIANTS = {'thumb': 320, 'medium': 800, 'large': 1600}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+SAVE_FORMATS = {'.png': 'PNG', '.jpg': 'JPEG', '.jpeg': 'JPEG', '.gif': 'GIF', '.webp': 'WEBP'}
+
+# Метаданные, которые удаляются из загруженных файлов: APP1 (EXIF, XMP),
+# APP13 (IPTC) и комментарий в JPEG, текстовые чанки, eXIf и tIME в PNG,
+# EXIF и XMP в WebP
+JPEG_METADATA = (0xE1, 0xED, 0xFE)
+PNG_METADATA = (b'tEXt', b'iTXt', b'zTXt', b'eXIf', b'tIME')
+WEBP_METADATA = (b'EXIF', b'XMP ')
+EXIF_HEADER = b'Exif\x00\x00'
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+VP8X_FLAGS = bytes(byte & ~0x0C for byte in range(256))
+
+# Не открываем «бомбы» из сжатых картинок огромного разрешения
+Image.MAX_IMAGE_PIXELS = 50_000_000
+
+VARIANT_NAME = re.compile(r'^(?P<original>.+\.(?:png|jpe?g|gif|webp))\.(?P<size>%s)\.(?:png|jpe?g|gif|webp)$'
+                          % '|'.join(VARIANTS), re.IGNORECASE)
+
+
+def variant_name(filename, size, webp=False):
+    """Имя копии оригинала filename размера size"""
+    extension = '.webp' if webp else os.path.splitext(filename)[1].lower()
+    return f'{filename}.{size}{extension}'
+
+
+def original_name(filename):
+    """Имя оригинала для имени копии или None, если это не копия"""
+    match = VARIANT_NAME.match(filename)
+    return match.group('original') if match else None
+
+
+def variant_map(filename, url_prefix='/static/uploads/'):
+    """Адреса оригинала и копий - для ответа API"""
+    variants = {'original': f'{url_prefix}{filename}'}
+    for size in VARIANTS:
+        variants[size] = {
+            'src': f'{url_prefix}{variant_name(filename, size)}',
+            'webp': f'{url_prefix}{variant_name(filename, size, webp=True)}'
+        }
+    return variants
+
+
+def _save(image, path, save_format):
+    # Пишем во временный файл и подменяем: читатели не видят недописанный файл.
+    # Имя уникально - один файл могут одновременно обрабатывать разные воркеры
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    options = {}
+    if save_format == 'JPEG':
+        options = {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}
+    elif save_format == 'WEBP':
+        options = {'quality': WEBP_QUALITY, 'method': 4}
+    elif save_format == 'PNG':
+        options = {'optimize': True}
+    try:
+        image.save(tmp_path, save_format, **options)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_exact(read, size):
+    """Ровно size байт или меньше в конце потока"""
+    data = b''
+    while len(data) < size:
+        chunk = read(min(size - len(data), CHUNK_SIZE))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def _copy(read, size):
+    """Куски следующих size байт потока"""
+    while size > 0:
+        chunk = read(min(size, CHUNK_SIZE))
+        if not chunk:
+            return
+        size -= len(chunk)
+        yield chunk
+
+
+def _skip(read, size):
+    for _ in _copy(read, size):
+        pass
+
+
+def _rest(read):
+    return iter(lambda: read(CHUNK_SIZE), b'')
+
+
+def _exif_orientation(tiff):
+    """Ориентация (тег 0x0112) из TIFF-заголовка EXIF или None"""
+    order = {b'II': 'little', b'MM': 'big'}.get(tiff[:2])
+    if order is None or len(tiff) < 8:
+        return None
+    offset = int.from_bytes(tiff[4:8], order)
+    if offset + 2 > len(tiff):
+        return None
+    for i in range(int.from_bytes(tiff[offset:offset + 2], order)):
+        entry = offset + 2 + i * 12
+        if entry + 12 > len(tiff):
+            return None
+        if int.from_bytes(tiff[entry:entry + 2], order) == 0x0112:
+            return int.from_bytes(tiff[entry + 8:entry + 10], order)
+    return None
+
+
+def _orientation_segment(orientation):
+    """APP1 с EXIF из одного тега - ориентации"""
+    tiff = (b'MM\x00\x2a' + (8).to_bytes(4, 'big') + (1).to_bytes(2, 'big')
+            + (0x0112).to_bytes(2, 'big') + (3).to_bytes(2, 'big') + (1).to_bytes(4, 'big')
+            + orientation.to_bytes(2, 'big') + b'\x00\x00' + (0).to_bytes(4, 'big'))
+    payload = EXIF_HEADER + tiff
+    return b'\xff\xe1' + (len(payload) + 2).to_bytes(2, 'big') + payload
+
+
+class MetadataStripper:
+    """Байты изображения без EXIF, GPS, XMP, IPTC и текстовых комментариев.
+
+    Сегменты и чанки с метаданными выбрасываются из потока без
+    декодирования, остальные байты - как были, поэтому пикселей это не
+    меняет. Из EXIF в JPEG остается только ориентация. После итерации
+    patches - правки [(смещение, байты)], которые нужно внести в уже
+    записанный поток (размер RIFF у WebP).
+    """
+
+    def __init__(self, read, extension):
+        self._read = read
+        self.extension = extension
+        self.size = 0
+        self.patches = []
+
+    def __iter__(self):
+        parse = {'.jpg': self._jpeg, '.jpeg': self._jpeg, '.png': self._png, '.webp': self._webp}.get(self.extension)
+        for chunk in parse() if parse else _rest(self._read):
+            self.size += len(chunk)
+            yield chunk
+
+    def _jpeg(self):
+        read = self._read
+        start = _read_exact(read, 2)
+        yield start
+        if start != b'\xff\xd8':
+            yield from _rest(read)
+            return
+        while True:
+            marker = _read_exact(read, 2)
+            # Байты-заполнители 0xFF перед маркером
+            while marker[:1] == b'\xff' and marker[1:] == b'\xff':
+                marker = b'\xff' + _read_exact(read, 1)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                yield marker
+                break
+            code = marker[1]
+            if code == 0x01 or 0xD0 <= code <= 0xD8:
+                yield marker
+                continue
+            if code == 0xD9:
+                yield marker
+                break
+            length = _read_exact(read, 2)
+            size = int.from_bytes(length, 'big') - 2
+            if len(length) < 2 or size < 0:
+                yield marker + length
+                break
+            if code in JPEG_METADATA:
+                if code == 0xE1:
+                    # Сегмент не длиннее 64 КБ
+                    payload = _read_exact(read, size)
+                    orientation = _exif_orientation(payload[len(EXIF_HEADER):]) \
+                        if payload.startswith(EXIF_HEADER) else None
+                    if orientation not in (None, 1):
+                        yield _orientation_segment(orientation)
+                else:
+                    _skip(read, size)
+                continue
+            yield marker + length
+            yield from _copy(read, size)
+            if code == 0xDA:
+                # Дальше сжатые данные изображения: метаданных после них не ищем
+                break
+        yield from _rest(read)
+
+    def _png(self):
+        read = self._read
+        signature = _read_exact(read, 8)
+        yield signature
+        if signature != PNG_SIGNATURE:
+            yield from _rest(read)
+            return
+        while True:
+            header = _read_exact(read, 8)
+            if len(header) < 8:
+                yield header
+                return
+            # Данные и CRC
+            size = int.from_bytes(header[:4], 'big') + 4
+            if header[4:] in PNG_METADATA:
+                _skip(read, size)
+                continue
+            yield header
+            yield from _copy(read, size)
+            if header[4:] == b'IEND':
+                break
+        yield from _rest(read)
+
+    def _webp(self):
+        read = self._read
+        header = _read_exact(read, 12)
+        yield header
+        if header[:4] != b'RIFF' or header[8:] != b'WEBP':
+            yield from _rest(read)
+            return
+        dropped = False
+        while True:
+            chunk_header = _read_exact(read, 8)
+            if len(chunk_header) < 8:
+                yield chunk_header
+                break
+            # Данные чанка дополняются до четной длины
+            size = int.from_bytes(chunk_header[4:], 'little')
+            size += size & 1
+            if chunk_header[:4] in WEBP_METADATA:
+                _skip(read, size)
+                dropped = True
+            elif chunk_header[:4] == b'VP8X':
+                # Флаги EXIF и XMP в заголовке расширенного формата
+                data = _read_exact(read, size)
+                yield chunk_header + data[:1].translate(VP8X_FLAGS) + data[1:]
+            else:
+                yield chunk_header
+                yield from _copy(read, size)
+        if dropped:
+            self.patches.append((4, (self.size - 8).to_bytes(4, 'little')))
+
+
+def strip_metadata(read, extension):
+    """Поток загружаемого файла без метаданных изображения (для store_upload)"""
+    return MetadataStripper(read, extension)
+
+
+def process_image(folder, filename):
+    """Создает копии оригинала. Возвращает число созданных копий"""
+    path = os.path.join(folder, filename)
+    extension = os.path.splitext(filename)[1].lower()
+    save_format = SAVE_FORMATS.get(extension)
+    if save_format is None or not os.path.isfile(path):
+        return 0
+
+    with Image.open(path) as source:
+        # Анимированные GIF/WebP не трогаем: по адресам копий отдается оригинал
+        if getattr(source, 'is_animated', False):
+            return 0
+        source.load()
+        image = ImageOps.exif_transpose(source)
+
+    image.info = {}
+    if not CONTENT_ADDRESSED.match(filename):
+        # Старые файлы с плоскими именами очищаются здесь; файлы по хэшу
+        # очищены при загрузке и отдаются как неизменяемые
+        _save(_for_format(image, save_format), path, save_format)
+
+    created = 0
+    for size, bound in VARIANTS.items():
+        # Палитру уменьшаем в RGBA, иначе ресемплинг дает грубые края
+        variant = image.convert('RGBA') if image.mode == 'P' else image.copy()
+        variant.thumbnail((bound, bound), Image.LANCZOS)
+        _save(_for_format(variant, save_format), os.path.join(folder, variant_name(filename, size)), save_format)
+        _save(variant, os.path.join(folder, variant_name(filename, size, webp=True)), 'WEBP')
+        created += 2
+    return created
+
+
+def _for_format(image, save_format):
+    # Приводим режим изображения к поддерживаемому форматом
+    if save_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        return image.convert('RGB')
+    if save_format == 'GIF' and image.mode not in ('P', 'L'):
+        return image.convert('P', palette=Image.ADAPTIVE)
+    return image
+
+
+def has_variants(folder, filename):
+    return all(
+        os.path.exists(os.path.join(folder, variant_name(filename, size, webp=True)))
+        for size in VARIANTS
+    )
+
+
+class ImageProcessor:
+    """Фоновая очередь обработки загруженных изображений"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.folder = None
+
+    def init_app(self, app):
+        self.folder = app.config['UPLOAD_FOLDER']
+        app.extensions['image_processor'] = self
+
+    def submit(self, filename):
+        """Ставит файл в очередь обработки (без ожидания)"""
+        if not filename.lower().endswith(IMAGE_EXTENSIONS):
+            return
+        self._ensure_thread()
+        self._queue.put(filename)
+
+    def status(self):
+        """Состояние фонового потока и очереди (для /api/health/ready)"""
+        if self._thread is None or self._pid != os.getpid():
+            # Поток запускается при первой загрузке
+            thread = 'idle'
+        else:
+            thread = 'running' if self._thread.is_alive() else 'dead'
+        return {'thread': thread, 'queued': self._queue.qsize()}
+
+    def _ensure_thread(self):
+        # После fork (воркеры gunicorn) поток родителя не наследуется
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='image-processor', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            filename = self._queue.get()
+            try:
+                # Под gevent - в настоящем потоке, чтобы не останавливать запросы
+                run_blocking(process_image, self.folder, filename)
+            except Exception as e:
+                logger.warning('Не удалось обработать изображение', extra={'upload': filename, 'error': str(e)})
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """Ждет обработки всех файлов из очереди"""
+        self._queue.join()
+
+    def process_missing(self):
+        """Обрабатывает оригиналы без копий (синхронно), возвращает их количество"""
+        processed = 0
+        for filename in iter_files(self.folder):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS) or original_name(filename):
+                continue
+            if has_variants(self.folder, filename):
+                continue
+            try:
+                if process_image(self.folder, filename):
+                    processed += 1
+            except Exception as e:
+                logger.warning('Не удалось обработать изображение', extra={'upload': filename, 'error': str(e)})
+        return processed
+
+
+processor = ImageProcessor()
@@ -0,0 +1,64 @@
+"""
+Пакетная подгрузка связей для сериализаторов.
+
+to_dict() у Review, Comment и Article обращается к author, а роуты поиска
+и отзывов пользователя еще и к review.company. Для списка записей ленивая
+загрузка дает по запросу на строку, поэтому перед сериализацией страницы
+связи подгружаются одним IN-запросом на каждую связь. Записи без внешнего ключа (анонимные, user_id = NULL)
+получают None без обращения к базе.
+"""
+
+from sqlalchemy import inspect
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+from backend.models import db, Review, Comment, Article
+
+# Связи, которые читают методы to_dict() моделей
+SERIALIZER_RELATIONS = {
+    Review: ('author',),
+    Comment: ('author',),
+    Article: ('author',),
+}
+
+
+def _prefetch_relation(mapper, items, name):
+    relationship = mapper.relationships[name]
+    (local_column, remote_column), = relationship.local_remote_pairs
+    local_key = mapper.get_property_by_column(local_column).key
+    target = relationship.mapper.class_
+
+    # Уже загруженные связи не трогаем
+    pending = [item for item in items if name not in inspect(item).dict]
+    ids = {getattr(item, local_key) for item in pending} - {None}
+
+    loaded = {}
+    missing = set()
+    for value in ids:
+        obj = db.session.identity_map.get(identity_key(target, value))
+        if obj is not None:
+            loaded[value] = obj
+        else:
+            missing.add(value)
+
+    if missing:
+        remote_key = relationship.mapper.get_property_by_column(remote_column).key
+        for obj in db.session.query(target).filter(getattr(target, remote_key).in_(missing)):
+            loaded[getattr(obj, remote_key)] = obj
+
+    for item in pending:
+        set_committed_value(item, name, loaded.get(getattr(item, local_key)))
+
+
+def prefetch(items, *relations):
+    """Подгружает связи relations для всех items (по умолчанию - нужные сериализатору).
+
+    Возвращает items, чтобы вызов можно было встроить в выражение.
+    """
+    items = [item for item in items if item is not None]
+    if not items:
+        return items
+
+    mapper = inspect(type(items[0]))
+    for name in relations or SERIALIZER_RELATIONS.get(mapper.class_, ()):
+        _prefetch_relation(mapper, items, name)
+    return items
@@ -0,0 +1,199 @@
+"""
+Структурированное логирование.
+
+Записи уходят в очередь (QueueHandler), а в stdout их пишет отдельный
+поток, поэтому запрос тратит на запись лога только форматирование
+сообщения и постановку в очередь. Каждая запись - одна строка JSON
+с временем, уровнем, логгером, сообщением, request_id текущего запроса и
+полями из extra={...}.
+
+Настройки окружения:
+- LOG_LEVEL - минимальный уровень (по умолчанию INFO);
+- LOG_FORMAT - json (по умолчанию) или text для локальной разработки;
+- LOG_SAMPLE - доля записей по уровням, например DEBUG=0.01,INFO=0.5;
+  WARNING и выше по умолчанию пишутся всегда.
+
+request_id берется из заголовка X-Request-ID (от прокси) или создается,
+и возвращается клиенту в ответе.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_SAMPLE = os.environ.get('LOG_SAMPLE', '')
+QUEUE_SIZE = 10000
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+_FORMATTER = logging.Formatter()
+
+# Стандартные атрибуты LogRecord - все остальные считаются полями из extra
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+
+def get_logger(name):
+    return logging.getLogger(name)
+
+
+def parse_sample_rates(value):
+    """'DEBUG=0.01,INFO=0.5' -> {10: 0.01, 20: 0.5}"""
+    rates = {}
+    for part in filter(None, (item.strip() for item in value.split(','))):
+        level, _, rate = part.partition('=')
+        try:
+            rates[logging.getLevelName(level.strip().upper())] = min(max(float(rate), 0.0), 1.0)
+        except (TypeError, ValueError):
+            continue
+    return {level: rate for level, rate in rates.items() if isinstance(level, int)}
+
+
+class RequestContextFilter(logging.Filter):
+    """Добавляет request_id текущего запроса (в потоке, который пишет запись)"""
+
+    def filter(self, record):
+        record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает заданную долю записей каждого уровня"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = None
+        line = super().format(record)
+        fields = {key: value for key, value in vars(record).items()
+                  if key not in _RESERVED and not key.startswith('_')}
+        return f'{line} {fields}' if fields else line
+
+
+class AsyncHandler(logging.handlers.QueueHandler):
+    """Кладет записи в очередь; поток-писатель запускается заново после fork"""
+
+    def __init__(self, target):
+        super().__init__(queue.Queue(QUEUE_SIZE))
+        self.target = target
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # Очередь родителя после fork могла остаться с чужими записями
+            self.queue = queue.Queue(QUEUE_SIZE)
+            self._listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Сообщение и трейсбек форматируются сразу: аргументы могут измениться,
+        # а exc_info нельзя передавать в другой поток
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _FORMATTER.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Лучше потерять запись, чем заблокировать запрос
+            self.dropped += 1
+
+    def stop(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._pid = None
+
+
+def configure(level=LOG_LEVEL, fmt=LOG_FORMAT, sample=LOG_SAMPLE, stream=None):
+    """Настраивает корневой логгер: очередь -> поток -> stdout"""
+    target = logging.StreamHandler(stream or sys.stdout)
+    target.setFormatter(TextFormatter() if fmt == 'text' else JsonFormatter())
+
+    handler = AsyncHandler(target)
+    rates = parse_sample_rates(sample)
+    if rates:
+        handler.addFilter(SamplingFilter(rates))
+    handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for old in [h for h in root.handlers if isinstance(h, AsyncHandler)]:
+        root.removeHandler(old)
+        old.stop()
+    root.addHandler(handler)
+    root.setLevel(level)
+    atexit.register(handler.stop)
+    return handler
+
+
+def init_app(app):
+    """request_id для каждого запроса"""
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+
+    @app.after_request
+    def return_request_id(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers[REQUEST_ID_HEADER] = request_id
+        return response
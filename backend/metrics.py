@@ -0,0 +1,444 @@
+"""
+Метрики запросов в формате Prometheus (GET /api/metrics).
+
+Для каждого эндпоинта (имя Flask-эндпоинта и метод) собираются:
+- число ответов по статусам;
+- гистограмма времени ответа;
+- число SQL-команд и суммарное время в базе (события курсора SQLAlchemy),
+  плюс гистограмма числа команд на запрос - рост ее хвоста выдает N+1;
+- число запросов в обработке прямо сейчас.
+Вместе с ними отдаются счетчики кэша ответов, потерянных записей лога и
+пула соединений с базой (backend/database.py).
+
+Воркеры gunicorn не делят память, поэтому каждый процесс раз в
+METRICS_FLUSH_SECONDS сохраняет свои счетчики в файл <pid>-<метка>.json в
+METRICS_DIR (по умолчанию <tmp>/app-metrics-<pid родителя> - общий каталог
+для воркеров одного мастера gunicorn). Воркер, к которому пришел запрос
+метрик, складывает файлы всех процессов. Счетчики завершившихся воркеров
+сохраняются (переносятся в archive.json), чтобы суммы не убывали; запросы
+в обработке учитываются только у живых.
+
+Если задан METRICS_TOKEN, эндпоинт требует Authorization: Bearer <токен>.
+Без токена метрики отдаются только прямым запросам с этой же машины
+(127.0.0.1 или ::1 без заголовков прокси): запрос через nginx тоже приходит
+с 127.0.0.1, но несет X-Forwarded-For.
+"""
+
+import atexit
+import glob
+import hmac
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows - архив завершившихся воркеров не собирается
+    fcntl = None
+
+from flask import Response, abort, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from backend.log import AsyncHandler, get_logger
+from backend.database import WAIT_BUCKETS, pool_stats
+from backend.read_replica import router as replica_router
+
+logger = get_logger(__name__)
+
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 1))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Без METRICS_TOKEN: адреса, с которых отдаются метрики, и заголовки, выдающие прокси
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+PROXY_HEADERS = ('X-Forwarded-For', 'X-Real-IP', 'Forwarded')
+
+ARCHIVE = 'archive.json'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Имя метрики -> (описание, метки)
+COUNTERS = {
+    'app_http_requests_total': ('Ответы по эндпоинту, методу и статусу', ('endpoint', 'method', 'status')),
+    'app_sql_statements_total': ('SQL-команды, выполненные при обработке запросов', ('endpoint', 'method')),
+    'app_sql_duration_seconds_total': ('Время SQL-команд при обработке запросов', ('endpoint', 'method')),
+    'app_response_cache_events_total': ('События кэша ответов', ('event',)),
+    'app_log_records_dropped_total': ('Записи лога, потерянные из-за переполненной очереди', ()),
+    'app_db_pool_events_total': ('События пула соединений: выдачи, таймауты, подключения, сброшенные',
+                                 ('event',)),
+    'app_db_reads_total': ('SELECT в GET-запросах по базе, где они выполнены (при DB_REPLICA_URL)', ('target',)),
+}
+HISTOGRAMS = {
+    'app_http_request_duration_seconds': ('Время ответа', ('endpoint', 'method'), LATENCY_BUCKETS),
+    'app_http_request_sql_statements': ('SQL-команд на один запрос', ('endpoint', 'method'), SQL_BUCKETS),
+    'app_db_pool_checkout_wait_seconds': ('Ожидание соединения из пула', (), WAIT_BUCKETS),
+}
+# Значения живых процессов складываются, у завершившихся не учитываются
+GAUGES = {
+    'app_http_requests_in_flight': ('Запросы в обработке', ()),
+    'app_db_pool_checked_out': ('Соединения с базой, выданные из пула', ()),
+    'app_db_pool_capacity': ('Наибольшее число соединений пула (pool_size + max_overflow)', ()),
+    'app_db_replica_usable': ('Воркеры, которые сейчас читают с реплики', ()),
+}
+IN_FLIGHT = 'app_http_requests_in_flight'
+
+
+def _empty_state():
+    return {
+        'counters': {name: {} for name in COUNTERS},
+        'histograms': {name: {} for name in HISTOGRAMS},
+        'gauges': {name: {} for name in GAUGES}
+    }
+
+
+def _observe(histogram, buckets, labels, value):
+    # Значения: число наблюдений в каждом интервале (последний - +Inf) и сумма
+    values = histogram.get(labels)
+    if values is None:
+        values = histogram[labels] = [0] * (len(buckets) + 2)
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            values[i] += 1
+            break
+    else:
+        values[len(buckets)] += 1
+    values[-1] += value
+
+
+def _merge(target, state):
+    for name, series in state['counters'].items():
+        merged = target['counters'].setdefault(name, {})
+        for labels, value in series.items():
+            merged[labels] = merged.get(labels, 0) + value
+    for name, series in state['histograms'].items():
+        merged = target['histograms'].setdefault(name, {})
+        for labels, values in series.items():
+            current = merged.get(labels)
+            merged[labels] = list(values) if current is None else [a + b for a, b in zip(current, values)]
+    for name, series in state['gauges'].items():
+        merged = target['gauges'].setdefault(name, {})
+        for labels, value in series.items():
+            merged[labels] = merged.get(labels, 0) + value
+
+
+def _dump(state):
+    """Состояние -> JSON (кортежи меток в ключах словаря JSON не допускает)"""
+    return json.dumps({
+        'counters': {name: [[list(labels), value] for labels, value in series.items()]
+                     for name, series in state['counters'].items()},
+        'histograms': {name: [[list(labels), values] for labels, values in series.items()]
+                       for name, series in state['histograms'].items()},
+        'gauges': {name: [[list(labels), value] for labels, value in series.items()]
+                   for name, series in state['gauges'].items()}
+    })
+
+
+def _load(data):
+    raw = json.loads(data)
+    return {
+        'counters': {name: {tuple(labels): value for labels, value in series}
+                     for name, series in raw.get('counters', {}).items()},
+        'histograms': {name: {tuple(labels): values for labels, values in series}
+                       for name, series in raw.get('histograms', {}).items()},
+        'gauges': {name: {tuple(labels): value for labels, value in series}
+                   for name, series in raw.get('gauges', {}).items()}
+    }
+
+
+def _read_state(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return _load(f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning('Не удалось прочитать файл метрик', extra={'path': path, 'error': str(e)})
+        return None
+
+
+def _write_atomic(path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _le(bound):
+    return 'le="%s"' % bound
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def render(state):
+    """Текстовый формат Prometheus 0.0.4"""
+    lines = []
+    for name, (help_text, label_names) in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for labels, value in sorted(state['counters'].get(name, {}).items()):
+            lines.append(f'{name}{_labels(label_names, labels)} {_number(value)}')
+
+    for name, (help_text, label_names, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for labels, values in sorted(state['histograms'].get(name, {}).items()):
+            cumulative = 0
+            for bound, count in zip(buckets, values):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(label_names, labels, _le(bound))} {cumulative}')
+            total = cumulative + values[len(buckets)]
+            lines.append(f'{name}_bucket{_labels(label_names, labels, _le("+Inf"))} {total}')
+            lines.append(f'{name}_sum{_labels(label_names, labels)} {_number(values[-1])}')
+            lines.append(f'{name}_count{_labels(label_names, labels)} {total}')
+
+    for name, (help_text, label_names) in GAUGES.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+        for labels, value in sorted(state['gauges'].get(name, {}).items()):
+            lines.append(f'{name}{_labels(label_names, labels)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+class Metrics:
+    def __init__(self, directory=METRICS_DIR, flush_seconds=FLUSH_SECONDS, token=METRICS_TOKEN):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self.token = token
+        self._lock = threading.Lock()
+        self._state = _empty_state()
+        self._dirty = False
+        self._thread = None
+        self._pid = None
+        self._path = None
+
+    def init_app(self, app):
+        app.extensions['metrics'] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule('/api/metrics', 'metrics', self._view)
+        # Слушатели на классе Engine общие для всех приложений процесса
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            atexit.register(self._flush_on_exit)
+
+    # --- Сбор ---
+
+    def _before_request(self):
+        self._ensure_thread()
+        g.metrics_start = time.perf_counter()
+        g.metrics_in_flight = True
+        g.sql_statements = 0
+        g.sql_seconds = 0.0
+        with self._lock:
+            in_flight = self._state['gauges'][IN_FLIGHT]
+            in_flight[()] = in_flight.get((), 0) + 1
+            self._dirty = True
+
+    def _after_request(self, response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        self.observe(
+            request.endpoint or 'unmatched', request.method, response.status_code,
+            time.perf_counter() - start, g.get('sql_statements', 0), g.get('sql_seconds', 0.0)
+        )
+        return response
+
+    def _teardown_request(self, exc):
+        if not g.pop('metrics_in_flight', False):
+            return
+        with self._lock:
+            in_flight = self._state['gauges'][IN_FLIGHT]
+            in_flight[()] = in_flight.get((), 0) - 1
+            self._dirty = True
+
+    def observe(self, endpoint, method, status, duration, sql_statements=0, sql_seconds=0.0):
+        """Учитывает один ответ"""
+        labels = (endpoint, method)
+        with self._lock:
+            counters = self._state['counters']
+            requests = counters['app_http_requests_total']
+            key = (endpoint, method, str(status))
+            requests[key] = requests.get(key, 0) + 1
+            statements = counters['app_sql_statements_total']
+            statements[labels] = statements.get(labels, 0) + sql_statements
+            seconds = counters['app_sql_duration_seconds_total']
+            seconds[labels] = seconds.get(labels, 0.0) + sql_seconds
+
+            histograms = self._state['histograms']
+            _observe(histograms['app_http_request_duration_seconds'], LATENCY_BUCKETS, labels, duration)
+            _observe(histograms['app_http_request_sql_statements'], SQL_BUCKETS, labels, sql_statements)
+            self._dirty = True
+
+    def snapshot(self):
+        """Копия счетчиков текущего процесса вместе с кэшем ответов и логом"""
+        from backend.response_cache import cache as response_cache
+
+        state = _empty_state()
+        with self._lock:
+            _merge(state, self._state)
+        state['counters']['app_response_cache_events_total'] = {
+            (name,): value for name, value in response_cache.stats.items()
+        }
+        dropped = sum(handler.dropped for handler in logging.getLogger().handlers
+                      if isinstance(handler, AsyncHandler))
+        state['counters']['app_log_records_dropped_total'] = {(): dropped}
+
+        pool = pool_stats.snapshot()
+        state['counters']['app_db_pool_events_total'] = {(name,): value for name, value in pool['events'].items()}
+        state['histograms']['app_db_pool_checkout_wait_seconds'] = {(): pool['wait']}
+        state['gauges']['app_db_pool_checked_out'] = {(): pool['checked_out']}
+        state['gauges']['app_db_pool_capacity'] = {(): pool['capacity']}
+
+        if replica_router.enabled:
+            replica = replica_router.status()
+            state['counters']['app_db_reads_total'] = {(target,): value for target, value in replica['reads'].items()}
+            state['gauges']['app_db_replica_usable'] = {(): int(replica['usable'])}
+        return state
+
+    # --- Файлы процессов ---
+
+    def _directory(self):
+        # Воркеры gunicorn - дети одного мастера, поэтому у них общий каталог
+        return self.directory or os.path.join(tempfile.gettempdir(), f'app-metrics-{os.getppid()}')
+
+    def _process_path(self):
+        if self._path is None or self._pid != os.getpid():
+            # Метка отличает процесс от более позднего с тем же pid
+            self._path = os.path.join(self._directory(), f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+        return self._path
+
+    def flush(self):
+        """Сохраняет счетчики процесса в общий каталог"""
+        with self._lock:
+            self._dirty = False
+        path = self._process_path()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _write_atomic(path, _dump(self.snapshot()))
+        except OSError as e:
+            logger.warning('Не удалось сохранить метрики', extra={'path': path, 'error': str(e)})
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            # После fork счетчики родителя не принадлежат воркеру
+            if self._pid is not None and self._pid != os.getpid():
+                self._state = _empty_state()
+            self._process_path()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            if self._dirty:
+                self.flush()
+
+    def _flush_on_exit(self):
+        if self._pid == os.getpid():
+            with self._lock:
+                self._state['gauges'][IN_FLIGHT] = {}
+            self.flush()
+
+    def collect(self):
+        """Сумма счетчиков всех процессов"""
+        directory = self._directory()
+        own = self._path if self._pid == os.getpid() else None
+        total = _empty_state()
+        _merge(total, self.snapshot())
+
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, '.lock'), 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            archive_path = os.path.join(directory, ARCHIVE)
+            archive = _read_state(archive_path) or _empty_state()
+            archived = []
+
+            for path in glob.glob(os.path.join(directory, '*-*.json')):
+                if path == own:
+                    continue
+                state = _read_state(path)
+                if state is None:
+                    continue
+                pid = int(os.path.basename(path).split('-', 1)[0])
+                if _pid_alive(pid):
+                    _merge(total, state)
+                else:
+                    state['gauges'] = {}
+                    _merge(archive, state)
+                    archived.append(path)
+
+            if archived and fcntl is not None:
+                _write_atomic(archive_path, _dump(archive))
+                for path in archived:
+                    os.remove(path)
+            # Без блокировки архив не пишется, и файлы остаются на месте
+            _merge(total, archive)
+        return total
+
+    # --- Эндпоинт ---
+
+    def _view(self):
+        if self.token:
+            if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {self.token}'):
+                abort(401)
+        elif request.remote_addr not in LOCAL_ADDRESSES or any(name in request.headers for name in PROXY_HEADERS):
+            abort(403)
+        response = Response(render(self.collect()), mimetype='text/plain')
+        response.headers['Content-Type'] = CONTENT_TYPE
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    starts = conn.info.get('metrics_query_start')
+    if not starts:
+        return
+    g.sql_statements = g.get('sql_statements', 0) + 1
+    g.sql_seconds = g.get('sql_seconds', 0.0) + time.perf_counter() - starts.pop()
+
+
+metrics = Metrics()
@@ -1,8 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 import json
+from backend.read_replica import RoutingSession
 
-db = SQLAlchemy()
+# Сессия отправляет чтение GET-запросов на реплику, если задан DB_REPLICA_URL
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -20,6 +22,16 @@ class User(db.Model):
     comments = db.relationship('Comment', backref='author', lazy=True)
 
 class Company(db.Model):
+    # Индексы под фильтры и сортировки каталога, поиска и модерации
+    __table_args__ = (
+        db.Index('ix_company_status_rating', 'status', 'rating'),
+        db.Index('ix_company_status_category_city', 'status', 'category', 'city'),
+        db.Index('ix_company_status_created_at', 'status', 'created_at'),
+        db.Index('ix_company_owner_id', 'owner_id'),
+        # Синхронизация индекса подсказок (backend.suggestions)
+        db.Index('ix_company_updated_at', 'updated_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     category = db.Column(db.String(50), nullable=False)
@@ -32,6 +44,7 @@ class Company(db.Model):
     logo = db.Column(db.String(200))
     rating = db.Column(db.Float, default=0.0)
     review_count = db.Column(db.Integer, default=0)
+    rating_sum = db.Column(db.Integer, default=0)  # Сумма оценок одобренных отзывов
     owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -64,6 +77,13 @@ class Company(db.Model):
         }
 
 class Review(db.Model):
+    # Индексы под списки отзывов компании, пользователя и очередь модерации
+    __table_args__ = (
+        db.Index('ix_review_company_status_created_at', 'company_id', 'status', 'created_at'),
+        db.Index('ix_review_user_created_at', 'user_id', 'created_at'),
+        db.Index('ix_review_status_created_at', 'status', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Может быть NULL для анонимных
@@ -74,6 +94,17 @@ class Review(db.Model):
     status = db.Column(db.String(20), default='pending')  # pending, approved, rejected
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    def author_info(self):
+        return {
+            'id': self.author.id,
+            'name': self.author.name,
+            'avatar': self.author.avatar
+        } if self.user_id and self.author else {
+            'id': None,
+            'name': self.anonymous_name or 'Анонимный пользователь',
+            'avatar': None
+        }
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -81,18 +112,17 @@ class Review(db.Model):
             'text': self.text,
             'photos': json.loads(self.photos) if self.photos else [],
             'created_at': self.created_at.isoformat(),
-            'author': {
-                'id': self.author.id,
-                'name': self.author.name,
-                'avatar': self.author.avatar
-            } if self.user_id and self.author else {
-                'id': None,
-                'name': self.anonymous_name or 'Анонимный пользователь',
-                'avatar': None
-            }
+            'author': self.author_info()
         }
 
 class Article(db.Model):
+    # Индексы под ленту статей, статьи автора и очередь модерации
+    __table_args__ = (
+        db.Index('ix_article_status_created_at', 'status', 'created_at'),
+        db.Index('ix_article_author_id', 'author_id'),
+        db.Index('ix_article_updated_at', 'updated_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
@@ -103,12 +133,24 @@ class Article(db.Model):
     author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Может быть None для анонимных
     anonymous_author = db.Column(db.String(100), nullable=True)  # Имя для анонимных авторов
     views = db.Column(db.Integer, default=0)
+    comment_count = db.Column(db.Integer, default=0)  # Количество одобренных комментариев
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Связи
     comments = db.relationship('Comment', backref='article', lazy=True, cascade='all, delete-orphan')
     
+    def author_info(self):
+        return {
+            'id': self.author.id,
+            'name': self.author.name,
+            'avatar': self.author.avatar
+        } if self.author_id and self.author else {
+            'id': None,
+            'name': self.anonymous_author or 'Анонимный автор',
+            'avatar': None
+        }
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -121,18 +163,34 @@ class Article(db.Model):
             'views': self.views,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
-            'author': {
-                'id': self.author.id,
-                'name': self.author.name,
-                'avatar': self.author.avatar
-            } if self.author_id and self.author else {
-                'id': None,
-                'name': self.anonymous_author or 'Анонимный автор',
-                'avatar': None
-            }
+            'author': self.author_info()
         }
 
+# Связь статей с тегами (заполняется по Article.tags, см. backend/tags.py)
+article_tag = db.Table(
+    'article_tag',
+    db.Column('article_id', db.Integer, db.ForeignKey('article.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_article_tag_tag_id', 'tag_id', 'article_id')
+)
+
+class Tag(db.Model):
+    # Индекс под список тегов по популярности
+    __table_args__ = (
+        db.Index('ix_tag_article_count', 'article_count'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    article_count = db.Column(db.Integer, default=0)  # Количество одобренных статей с тегом
+
 class Comment(db.Model):
+    # Индексы под комментарии статьи и очередь модерации
+    __table_args__ = (
+        db.Index('ix_comment_article_status_created_at', 'article_id', 'status', 'created_at'),
+        db.Index('ix_comment_status_created_at', 'status', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     article_id = db.Column(db.Integer, db.ForeignKey('article.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Может быть None для анонимных
@@ -142,30 +200,57 @@ class Comment(db.Model):
     status = db.Column(db.String(20), default='approved')  # pending, approved, rejected
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    def to_dict(self):
-        if self.user_id:
+    def author_info(self):
+        if self.user_id and self.author:
             # Авторизованный пользователь
             return {
-                'id': self.id,
-                'text': self.text,
-                'photos': json.loads(self.photos) if self.photos else [],
-                'created_at': self.created_at.isoformat(),
-                'author': {
-                    'id': self.author.id,
-                    'name': self.author.name,
-                    'avatar': self.author.avatar
-                }
-            }
-        else:
-            # Анонимный пользователь
-            return {
-                'id': self.id,
-                'text': self.text,
-                'photos': json.loads(self.photos) if self.photos else [],
-                'created_at': self.created_at.isoformat(),
-                'author': {
-                    'id': None,
-                    'name': self.anonymous_name or 'Анонимный пользователь',
-                    'avatar': None
-                }
+                'id': self.author.id,
+                'name': self.author.name,
+                'avatar': self.author.avatar
             }
+        # Анонимный пользователь
+        return {
+            'id': None,
+            'name': self.anonymous_name or 'Анонимный пользователь',
+            'avatar': None
+        }
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'text': self.text,
+            'photos': json.loads(self.photos) if self.photos else [],
+            'created_at': self.created_at.isoformat(),
+            'author': self.author_info()
+        }
+
+class Upload(db.Model):
+    # Реестр загруженных файлов: сборщик мусора ищет сироты по (ref_count, orphaned_at)
+    __table_args__ = (
+        db.Index('ix_upload_ref_count_orphaned_at', 'ref_count', 'orphaned_at'),
+        db.Index('ix_upload_sha256', 'sha256'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), unique=True, nullable=False)  # Путь относительно папки загрузок
+    sha256 = db.Column(db.String(64))  # None для старых файлов с плоскими именами
+    size = db.Column(db.Integer)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # Сколько записей ссылается на файл
+    orphaned_at = db.Column(db.DateTime)  # Когда ссылок не осталось (None, пока они есть)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'url': f'/static/uploads/{self.filename}',
+            'sha256': self.sha256,
+            'size': self.size,
+            'width': self.width,
+            'height': self.height,
+            'ref_count': self.ref_count,
+            'orphaned_at': self.orphaned_at.isoformat() if self.orphaned_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,126 @@
+"""
+Курсорная (keyset) пагинация.
+
+Вместо OFFSET и COUNT(*) страница выбирается условием по ключу сортировки
+последней показанной записи, поэтому глубокие страницы стоят столько же,
+сколько первая. Курсор непрозрачен для клиента: это base64 от JSON
+со значениями ключа и направлением перехода.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+from sqlalchemy.types import DateTime
+
+
+class InvalidCursor(ValueError):
+    """Курсор поврежден или не подходит к сортировке эндпоинта"""
+
+
+def encode_cursor(values, direction='next'):
+    payload = {
+        'v': [value.isoformat() if isinstance(value, datetime) else value for value in values],
+        'd': direction
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, order):
+    """Разбирает курсор в (значения ключа, направление)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = payload['v']
+        direction = payload.get('d', 'next')
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor(cursor)
+
+    if direction not in ('next', 'prev') or not isinstance(values, list) or len(values) != len(order):
+        raise InvalidCursor(cursor)
+
+    try:
+        values = [
+            datetime.fromisoformat(value) if value is not None and isinstance(column.type, DateTime) else value
+            for (column, _), value in zip(order, values)
+        ]
+    except (TypeError, ValueError):
+        raise InvalidCursor(cursor)
+
+    return values, direction
+
+
+def _after(order, values):
+    """Условие "строка идет после ключа values" для сортировки order"""
+    clauses = []
+    for i, (column, descending) in enumerate(order):
+        equal = [order[j][0] == values[j] for j in range(i)]
+        step = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+
+class KeysetPage:
+    """Страница курсорной пагинации"""
+
+    def __init__(self, items, next_cursor, prev_cursor, per_page, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.per_page = per_page
+        self.total = total
+
+    def meta(self):
+        meta = {
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor,
+            'per_page': self.per_page
+        }
+        if self.total is not None:
+            meta['total'] = self.total
+        return meta
+
+
+def keyset_paginate(query, order, cursor, per_page, with_total=False):
+    """Курсорная пагинация запроса.
+
+    order - список пар (колонка, по убыванию), последней должна идти
+    уникальная колонка (обычно id). Пустой cursor - первая страница.
+    COUNT(*) выполняется только при with_total.
+    """
+    per_page = max(per_page, 1)
+    total = query.order_by(None).count() if with_total else None
+
+    direction = 'next'
+    if cursor:
+        values, direction = decode_cursor(cursor, order)
+        # Для перехода назад идем от ключа в обратном порядке
+        walk = order if direction == 'next' else [(column, not descending) for column, descending in order]
+        query = query.filter(_after(walk, values))
+    else:
+        walk = order
+
+    rows = query.order_by(*[
+        column.desc() if descending else column.asc() for column, descending in walk
+    ]).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+    if direction == 'prev':
+        items.reverse()
+
+    def key(item):
+        return [getattr(item, column.key) for column, _ in order]
+
+    next_cursor = prev_cursor = None
+    if items:
+        if direction == 'next':
+            next_cursor = encode_cursor(key(items[-1]), 'next') if has_more else None
+            prev_cursor = encode_cursor(key(items[0]), 'prev') if cursor else None
+        else:
+            prev_cursor = encode_cursor(key(items[0]), 'prev') if has_more else None
+            next_cursor = encode_cursor(key(items[-1]), 'next')
+
+    return KeysetPage(items, next_cursor, prev_cursor, per_page, total)
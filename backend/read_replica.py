@@ -0,0 +1,236 @@
+"""
+Чтение с реплики базы данных.
+
+С DB_REPLICA_URL (по умолчанию не задан - все идет в DATABASE_URL) у
+приложения появляется второй движок (bind 'replica'):
+- SELECT в запросах GET/HEAD/OPTIONS выполняются на реплике;
+- запись (INSERT/UPDATE/DELETE, flush сессии) всегда идет в основную базу,
+  и до конца запроса чтение тоже идет туда;
+- после запроса с записью клиент получает cookie db_primary_until и еще
+  DB_REPLICA_PIN_SECONDS (10) читает из основной базы, поэтому видит свои
+  изменения, даже если реплика их еще не получила (read-your-writes);
+- фоновый поток раз в DB_REPLICA_CHECK_SECONDS (2) измеряет отставание
+  реплики. Пока оно больше DB_REPLICA_MAX_LAG_SECONDS (5), реплика
+  недоступна или еще не проверена, чтение идет в основную базу. Обрыв
+  соединения с репликой во время запроса выключает ее сразу.
+
+Отставание измеряется только для PostgreSQL (pg_last_wal_replay_lsn и
+pg_last_xact_replay_timestamp); у других баз (например, SQLite-файла в
+проверках) оно считается нулевым.
+"""
+
+import os
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+from backend.log import get_logger
+
+logger = get_logger(__name__)
+
+REPLICA_BIND = 'replica'
+PIN_COOKIE = 'db_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+CHECK_SECONDS = float(os.environ.get('DB_REPLICA_CHECK_SECONDS', 2))
+MAX_LAG_SECONDS = float(os.environ.get('DB_REPLICA_MAX_LAG_SECONDS', 5))
+PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', 10))
+
+
+class RoutingSession(Session):
+    """Сессия Flask-SQLAlchemy, которая отправляет чтение на реплику"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and REPLICA_BIND in self._db.engines:
+            if router.use_replica(self, clause):
+                return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    def __init__(self, check_seconds=CHECK_SECONDS, max_lag=MAX_LAG_SECONDS, pin_seconds=PIN_SECONDS):
+        self.check_seconds = check_seconds
+        self.max_lag = max_lag
+        self.pin_seconds = pin_seconds
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._app = None
+        self._thread = None
+        self._pid = None
+        self.available = False
+        self.lag = None
+        self.error = None
+        self.checked_at = None
+        self.last_write = float('-inf')
+        self.reads = {'replica': 0, 'primary': 0}
+
+    def init_app(self, app):
+        """Вызывается после db.init_app: нужен уже созданный движок реплики"""
+        app.extensions['read_replica'] = self
+        with app.app_context():
+            engines = app.extensions['sqlalchemy'].engines
+        if REPLICA_BIND not in engines:
+            return
+        self._app = app
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        event.listen(engines[REPLICA_BIND], 'handle_error', self._on_replica_error)
+
+    @property
+    def enabled(self):
+        return self._app is not None
+
+    # --- Запросы ---
+
+    def _before_request(self):
+        self._ensure_thread()
+        g.db_read_replica = request.method in SAFE_METHODS and not self.pinned()
+        g.db_wrote = False
+
+    def _after_request(self, response):
+        if g.get('db_wrote'):
+            response.set_cookie(PIN_COOKIE, str(int(time.time()) + self.pin_seconds),
+                                max_age=self.pin_seconds, httponly=True, samesite='Lax')
+        return response
+
+    def pinned(self):
+        """Читает ли клиент из основной базы после своей записи (cookie еще не истекла)"""
+        if not has_request_context():
+            return False
+        pinned_until = request.cookies.get(PIN_COOKIE, '')
+        return pinned_until.isdigit() and int(pinned_until) > time.time()
+
+    def use_replica(self, session, clause):
+        """Выполнять ли команду на реплике"""
+        write = session._flushing or getattr(clause, 'is_dml', False)
+        if write:
+            self.last_write = time.monotonic()
+        if not has_request_context():
+            return False
+        if write:
+            # Остаток запроса читает из основной базы
+            g.db_wrote = True
+            g.db_read_replica = False
+            return False
+        if not g.get('db_read_replica') or not getattr(clause, 'is_select', False):
+            return False
+        target = 'replica' if self.usable else 'primary'
+        with self._lock:
+            self.reads[target] += 1
+        if target == 'replica':
+            g.db_replica_reads = g.get('db_replica_reads', 0) + 1
+        return target == 'replica'
+
+    def may_cache(self):
+        """Можно ли сохранить ответ в кэш ответов.
+
+        Реплика может еще не получить запись, сделанную этим процессом, -
+        ответ с ее данными не кэшируем, пока с записи не прошло max_lag секунд.
+        """
+        if not has_request_context() or not g.get('db_replica_reads'):
+            return True
+        return time.monotonic() - self.last_write > self.max_lag
+
+    @property
+    def usable(self):
+        return self.available and self.lag is not None and self.lag <= self.max_lag
+
+    def _on_replica_error(self, context):
+        if context.is_disconnect or context.connection is None:
+            self._mark_down(str(context.original_exception).splitlines()[0])
+
+    def _mark_down(self, error):
+        if self.available:
+            logger.warning('Реплика недоступна, чтение идет в основную базу', extra={'error': error})
+        self.available = False
+        self.error = error
+        self._wake.set()
+
+    # --- Проверка отставания ---
+
+    def _ensure_thread(self):
+        # После fork (воркеры gunicorn) поток родителя не наследуется
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self.available = False
+                self.lag = None
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='replica-lag', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self.check()
+            self._wake.wait(self.check_seconds)
+            self._wake.clear()
+
+    def check(self):
+        """Измеряет отставание реплики и включает или выключает чтение с нее"""
+        if not self.enabled:
+            return
+        try:
+            with self._app.app_context():
+                engines = current_app.extensions['sqlalchemy'].engines
+                lag = self.measure_lag(engines[None], engines[REPLICA_BIND])
+        except Exception as e:
+            self._mark_down(str(e).splitlines()[0])
+            self.checked_at = time.time()
+            return
+
+        usable = lag <= self.max_lag
+        if usable != self.usable:
+            if usable:
+                logger.info('Чтение идет с реплики', extra={'replica_lag_seconds': lag})
+            else:
+                logger.warning('Реплика отстает, чтение идет в основную базу',
+                               extra={'replica_lag_seconds': lag, 'max_lag_seconds': self.max_lag})
+        self.lag = lag
+        self.available = True
+        self.error = None
+        self.checked_at = time.time()
+
+    def measure_lag(self, primary, replica):
+        """Отставание реплики в секундах"""
+        if replica.dialect.name != 'postgresql':
+            with replica.connect() as connection:
+                connection.execute(text('SELECT 1'))
+            return 0.0
+
+        with primary.connect() as connection:
+            primary_lsn = connection.execute(text('SELECT pg_current_wal_lsn()')).scalar()
+        with replica.connect() as connection:
+            in_recovery, caught_up, behind = connection.execute(text(
+                'SELECT pg_is_in_recovery(), '
+                'pg_last_wal_replay_lsn() >= CAST(:lsn AS pg_lsn), '
+                'EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())'
+            ), {'lsn': primary_lsn}).one()
+        # Реплика, применившая весь WAL основной базы, не отстает, даже если
+        # последняя транзакция была давно
+        if not in_recovery or caught_up:
+            return 0.0
+        return float(behind or 0.0)
+
+    def status(self):
+        """Состояние реплики (для /api/health/ready и /api/metrics)"""
+        with self._lock:
+            reads = dict(self.reads)
+        return {
+            'enabled': self.enabled,
+            'available': self.available,
+            'usable': self.usable,
+            'lag_seconds': self.lag,
+            'max_lag_seconds': self.max_lag,
+            'error': self.error,
+            'checked_at': self.checked_at,
+            'reads': reads
+        }
+
+
+router = ReplicaRouter()
@@ -0,0 +1,347 @@
+"""
+Кэш ответов публичных GET-эндпоинтов.
+
+Ключ - имя эндпоинта, параметры пути и отсортированные параметры
+запроса. Записи живут не дольше TTL, общий размер ограничен LRU. Каждая запись помечена тегами (company:<id>,
+article:<id>, companies, articles, tags); после коммита изменений
+backend.changes сбрасывает только записи с затронутыми тегами.
+
+Ответы отдаются с ETag (собственным у роута или хэшем тела), поэтому
+клиент с актуальной копией получает 304 прямо из кэша.
+
+Кэш свой у каждого процесса, а сбросы общие: процесс, закоммитивший
+изменения, дописывает их теги строкой в журнал invalidations.log в
+RESPONSE_CACHE_DIR (по умолчанию <tmp>/app-response-cache-<pid родителя> -
+общий каталог для воркеров одного мастера gunicorn). Перед поиском в кэше
+воркер проверяет размер журнала и применяет новые строки, поэтому другие
+воркеры не отдают ответ старше последнего коммита. Ответ, при подготовке
+которого пришел сброс его тегов, не сохраняется. Журнал, выросший больше
+RESPONSE_CACHE_JOURNAL_BYTES, начинается заново; увидев новый файл, воркер
+очищает кэш целиком. Ответ, прочитанный с реплики вскоре после записи в
+этом процессе, не кэшируется (см. backend.read_replica). Запросы с cookie
+закрепления за основной базой (клиент недавно писал) идут мимо кэша: и не
+читают его, и не пополняют.
+"""
+
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+try:
+    import fcntl
+except ImportError:  # Windows - журнал сбросов не обрезается
+    fcntl = None
+
+from flask import request, make_response
+from backend.log import get_logger
+from backend.models import Company, Review, Article, Comment, User
+from backend import changes
+from backend.read_replica import router as replica_router
+
+logger = get_logger(__name__)
+
+DEFAULT_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 30))
+MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1000))
+CACHE_DIR = os.environ.get('RESPONSE_CACHE_DIR') or None
+JOURNAL_BYTES = int(os.environ.get('RESPONSE_CACHE_JOURNAL_BYTES', 1024 * 1024))
+
+JOURNAL = 'invalidations.log'
+CLEAR_ALL = '*'
+
+# Заголовки ответа, которые сохраняются вместе с телом
+VALIDATOR_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control')
+
+
+class ResponseCache:
+    def __init__(self, max_entries=MAX_ENTRIES, default_ttl=DEFAULT_TTL, directory=CACHE_DIR):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._tags = defaultdict(set)
+        # Номер последнего сброса: всего кэша и каждого тега
+        self._generation = 0
+        self._cleared_at = 0
+        self._invalidated_at = {}
+        # Журнал сбросов: путь, метка своих строк и прочитанная позиция (inode, смещение)
+        self._pid = None
+        self._path = None
+        self._token = None
+        self._position = (None, 0)
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0,
+                      'invalidations': 0, 'stale': 0}
+
+    # --- Хранилище ---
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry['tags']:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key):
+        with self._lock:
+            self._sync()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            if entry['expires_at'] <= time.monotonic():
+                self._drop(key)
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+
+    @property
+    def generation(self):
+        """Номер последнего сброса; передается в set, чтобы не сохранить устаревший ответ"""
+        with self._lock:
+            self._sync()
+            return self._generation
+
+    def set(self, key, body, status, mimetype, headers, tags, ttl=None, since=None):
+        with self._lock:
+            self._sync()
+            if since is not None and self._reset_since(since, tags):
+                self.stats['stale'] += 1
+                return
+            self._drop(key)
+            self._entries[key] = {
+                'body': body,
+                'status': status,
+                'mimetype': mimetype,
+                'headers': headers,
+                'tags': tuple(tags),
+                'expires_at': time.monotonic() + (ttl or self.default_ttl)
+            }
+            for tag in tags:
+                self._tags[tag].add(key)
+            self.stats['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+
+    def _reset_since(self, generation, tags):
+        """Был ли после generation сброс всего кэша или одного из тегов"""
+        if self._cleared_at > generation:
+            return True
+        return any(self._invalidated_at.get(tag, 0) > generation for tag in tags)
+
+    def _invalidate(self, tags):
+        self._generation += 1
+        for tag in tags:
+            self._invalidated_at[tag] = self._generation
+            for key in list(self._tags.get(tag, ())):
+                self._drop(key)
+                self.stats['invalidations'] += 1
+
+    def _clear(self):
+        self._generation += 1
+        self._cleared_at = self._generation
+        self._invalidated_at.clear()
+        self.stats['invalidations'] += len(self._entries)
+        self._entries.clear()
+        self._tags.clear()
+
+    def invalidate(self, *tags):
+        """Сбрасывает записи с любым из тегов в этом процессе"""
+        with self._lock:
+            self._invalidate(tags)
+
+    def clear(self):
+        """Очищает кэш этого процесса"""
+        with self._lock:
+            self._clear()
+
+    def snapshot(self):
+        """Статистика для подбора TTL и размера"""
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.default_ttl,
+                'hit_ratio': round(self.stats['hits'] / lookups, 4) if lookups else None
+            }
+
+    # --- Декоратор для роутов ---
+
+    def cached(self, tags, ttl=None):
+        """Кэширует JSON-ответ GET-роута.
+
+        tags - функция от параметров пути, возвращающая список тегов записи.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET':
+                    return view(*args, **kwargs)
+
+                # Клиент после своей записи (в любом воркере) не должен получить
+                # ответ, закэшированный до нее или по данным отстающей реплики
+                bypass = replica_router.pinned()
+                key = _cache_key(kwargs)
+                entry = None if bypass else self.get(key)
+                if entry is not None:
+                    response = make_response(entry['body'], entry['status'])
+                    response.mimetype = entry['mimetype']
+                    response.headers.extend(entry['headers'])
+                    response.headers['X-Cache'] = 'HIT'
+                    return response.make_conditional(request)
+
+                # Сброс, пришедший пока готовится ответ, делает его устаревшим
+                since = self.generation
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and response.is_json:
+                    # Без собственных валидаторов роута ETag - хэш тела
+                    if 'ETag' not in response.headers:
+                        response.add_etag()
+                        response.headers['Cache-Control'] = 'no-cache'
+                    if not bypass and replica_router.may_cache():
+                        headers = [(name, response.headers[name]) for name in VALIDATOR_HEADERS
+                                   if name in response.headers]
+                        self.set(key, response.get_data(), response.status_code, response.mimetype,
+                                 headers, tags(**kwargs), ttl, since=since)
+                    response.make_conditional(request)
+                response.headers['X-Cache'] = 'BYPASS' if bypass else 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+    # --- Изменения из backend.changes ---
+
+    def apply_changes(self, change_list):
+        tags = set()
+        for change in change_list:
+            if change.model is Company:
+                tags.update({f'company:{change.id}', 'companies'})
+            elif change.model is Review:
+                tags.update(f'company:{company_id}' for company_id in _related_ids(change, 'company_id'))
+                # Рейтинг и порядок в каталоге двигают только одобренные отзывы
+                if 'approved' in (change.values.get('status'), change.previous.get('status')):
+                    tags.add('companies')
+            elif change.model is Article:
+                tags.update({f'article:{change.id}', 'articles', 'tags'})
+            elif change.model is Comment:
+                tags.update(f'article:{article_id}' for article_id in _related_ids(change, 'article_id'))
+                tags.add('articles')
+            elif change.model is User and change.changed('name', 'avatar'):
+                # Имя и аватар автора есть почти в любом ответе
+                tags = {CLEAR_ALL}
+                break
+        if not tags:
+            return
+        with self._lock:
+            self._sync()
+            if CLEAR_ALL in tags:
+                self._clear()
+            else:
+                self._invalidate(tags)
+        self._publish(tags)
+
+    # --- Журнал сбросов для других процессов ---
+
+    def _sync(self):
+        """Применяет сбросы, которые записали другие процессы (под self._lock)"""
+        if self._pid != os.getpid():
+            # После fork записи и позиция родителя не принадлежат воркеру
+            self._pid = os.getpid()
+            self._token = uuid.uuid4().hex[:12]
+            directory = self.directory or os.path.join(tempfile.gettempdir(),
+                                                       f'app-response-cache-{os.getppid()}')
+            self._path = os.path.join(directory, JOURNAL)
+            self._clear()
+            try:
+                stat = os.stat(self._path)
+                self._position = (stat.st_ino, stat.st_size)
+            except OSError:
+                self._position = (None, 0)
+            return
+
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return
+        inode, offset = self._position
+        if stat.st_ino != inode or stat.st_size < offset:
+            # Журнал начат заново: конец прежнего мог остаться непрочитанным
+            if inode is not None:
+                self._clear()
+            inode, offset = stat.st_ino, 0
+        if stat.st_size > offset:
+            try:
+                with open(self._path, 'rb') as f:
+                    f.seek(offset)
+                    data = f.read(stat.st_size - offset)
+            except OSError:
+                return
+            # Строку, которую еще дописывают, дочитаем в следующий раз
+            data = data[:data.rfind(b'\n') + 1]
+            for line in data.decode('utf-8').splitlines():
+                token, _, tags = line.partition(' ')
+                if token == self._token:
+                    continue
+                if tags == CLEAR_ALL:
+                    self._clear()
+                else:
+                    self._invalidate(tags.split())
+            offset += len(data)
+        self._position = (inode, offset)
+
+    def _publish(self, tags):
+        """Дописывает сброс в журнал одной строкой"""
+        line = f"{self._token} {' '.join(sorted(tags))}\n".encode('utf-8')
+        lock_path = self._path + '.lock'
+        try:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            with open(lock_path, 'a') as lock:
+                # Дописывать можно вместе, начинать журнал заново - только одному
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_SH)
+                fd = os.open(self._path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, line)
+                    size = os.fstat(fd).st_size
+                finally:
+                    os.close(fd)
+                if size <= JOURNAL_BYTES or fcntl is None:
+                    return
+                fcntl.flock(lock, fcntl.LOCK_UN)
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                if os.stat(self._path).st_size > JOURNAL_BYTES:
+                    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self._path))
+                    os.close(fd)
+                    os.chmod(tmp_path, 0o644)
+                    os.replace(tmp_path, self._path)
+        except OSError as e:
+            logger.warning('Не удалось записать сброс кэша ответов для других воркеров',
+                           extra={'path': self._path, 'error': str(e)})
+
+
+def _related_ids(change, key):
+    """Текущее и прежнее значение внешнего ключа изменения"""
+    return {change.values.get(key), change.previous.get(key)} - {None}
+
+
+def _cache_key(view_args):
+    # Порядок параметров не важен; пустые значения значимы (?cursor= - курсорный режим)
+    args = tuple(sorted((name, tuple(sorted(values))) for name, values in request.args.lists()))
+    return (request.endpoint, tuple(sorted(view_args.items())), args)
+
+
+cache = ResponseCache()
+changes.subscribe(cache.apply_changes)
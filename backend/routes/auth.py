@@ -2,8 +2,12 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from werkzeug.security import generate_password_hash, check_password_hash
 from backend.models import db, User
+from backend import aggregates
+from backend.log import get_logger
+from backend.concurrency import run_blocking
 
 auth_bp = Blueprint('auth', __name__)
+logger = get_logger(__name__)
 
 @auth_bp.route('/test', methods=['GET'])
 def test_auth():
@@ -38,7 +42,7 @@ def register():
         # Создаем нового пользователя
         user = User(
             email=data['email'],
-            password=generate_password_hash(data['password']),
+            password=run_blocking(generate_password_hash, data['password']),
             name=data['name']
         )
         
@@ -60,6 +64,7 @@ def register():
         }), 201
         
     except Exception as e:
+        logger.exception('Ошибка регистрации')
         db.session.rollback()
         return jsonify({'error': f'Registration failed: {str(e)}'}), 500
 
@@ -72,7 +77,7 @@ def login():
     
     user = User.query.filter_by(email=data['email']).first()
     
-    if user and check_password_hash(user.password, data['password']):
+    if user and run_blocking(check_password_hash, user.password, data['password']):
         # Автовыдача роли админа для служебного аккаунта
         if user.email == 'admin@test.com' and user.role != 'admin':
             user.role = 'admin'
@@ -121,12 +126,18 @@ def update_profile():
     
     data = request.get_json()
     
+    shown = (user.name, user.avatar)
+    
     if 'name' in data:
         user.name = data['name']
     
     if 'avatar' in data:
         user.avatar = data['avatar']
     
+    # Имя и аватар есть в карточках компаний и статей - их ETag должен смениться
+    if (user.name, user.avatar) != shown:
+        aggregates.user_changed(user.id)
+    
     db.session.commit()
     
     return jsonify({
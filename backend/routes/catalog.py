@@ -1,11 +1,20 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from backend.models import db, Company, User, Review
+from backend.pagination import keyset_paginate, InvalidCursor
+from backend import fulltext
+from backend.loaders import prefetch
+from backend import facets
+from backend.response_cache import cache as response_cache
+from backend import conditional
+from backend.log import get_logger
 import json
 
 catalog_bp = Blueprint('catalog', __name__)
+logger = get_logger(__name__)
 
 @catalog_bp.route('/', methods=['GET'])
+@response_cache.cached(lambda: ['companies'])
 def get_companies():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
@@ -14,6 +23,7 @@ def get_companies():
     search = request.args.get('search')
     rating = request.args.get('rating')
     owner_id = request.args.get('owner_id', type=int)
+    cursor = request.args.get('cursor')
     
     # Если запрашиваются компании конкретного владельца, показываем все его компании
     # Иначе показываем только одобренные
@@ -30,23 +40,33 @@ def get_companies():
     
     if search:
         # Полнотекстовый поиск по названию, категории, городу и описанию
-        search_term = f"%{search}%"
-        query = query.filter(
-            db.or_(
-                Company.name.ilike(search_term),
-                Company.category.ilike(search_term),
-                Company.city.ilike(search_term),
-                Company.description.ilike(search_term)
-            )
-        )
+        query = query.filter(fulltext.match(Company, search))
     
     if rating:
         min_rating = float(rating)
         query = query.filter(Company.rating >= min_rating)
     
-    companies = query.order_by(Company.rating.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    if cursor is not None:
+        # Курсорная пагинация по ключу (rating, id)
+        try:
+            companies = keyset_paginate(
+                query, [(Company.rating, True), (Company.id, True)], cursor, per_page,
+                with_total=request.args.get('with_total', type=int)
+            )
+        except InvalidCursor:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        meta = companies.meta()
+    else:
+        # При поиске сначала самые релевантные
+        order = [fulltext.rank(Company, search).desc()] if search else []
+        companies = query.order_by(*order, Company.rating.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        meta = {
+            'total': companies.total,
+            'pages': companies.pages,
+            'current_page': page
+        }
     
     return jsonify({
         'companies': [{
@@ -64,20 +84,26 @@ def get_companies():
             'status': company.status,
             'created_at': company.created_at.isoformat()
         } for company in companies.items],
-        'total': companies.total,
-        'pages': companies.pages,
-        'current_page': page
+        **meta
     })
 
 @catalog_bp.route('/<int:company_id>', methods=['GET'])
+@response_cache.cached(lambda company_id: [f'company:{company_id}'])
 def get_company(company_id):
     try:
         company = Company.query.get_or_404(company_id)
         
+        # Версия карточки: строка компании и агрегаты ее одобренных отзывов
+        etag = conditional.make_etag('company', company.id, company.updated_at,
+                                     company.review_count, company.rating_sum)
+        cached = conditional.not_modified(etag, company.updated_at)
+        if cached is not None:
+            return cached
+        
         # Получаем отзывы
         reviews = Review.query.filter_by(company_id=company_id, status='approved').order_by(Review.created_at.desc()).limit(10).all()
         
-        return jsonify({
+        response = jsonify({
             'id': company.id,
             'name': company.name,
             'category': company.category,
@@ -93,10 +119,12 @@ def get_company(company_id):
                 'id': company.owner.id,
                 'name': company.owner.name
             } if company.owner else None,
-            'reviews': [review.to_dict() for review in reviews],
+            'reviews': [review.to_dict() for review in prefetch(reviews)],
             'created_at': company.created_at.isoformat()
         })
+        return conditional.set_validators(response, etag, company.updated_at)
     except Exception as e:
+        logger.exception('Ошибка загрузки компании')
         return jsonify({'error': f'Ошибка загрузки компании: {str(e)}'}), 500
 
 @catalog_bp.route('/', methods=['POST'])
@@ -140,6 +168,7 @@ def create_company():
             }
         }), 201
     except Exception as e:
+        logger.exception('Ошибка создания компании')
         db.session.rollback()
         return jsonify({'error': 'Failed to create company: ' + str(e)}), 500
 
@@ -202,11 +231,22 @@ def delete_company(company_id):
     return jsonify({'message': 'Company deleted successfully'})
 
 @catalog_bp.route('/categories', methods=['GET'])
+@response_cache.cached(lambda: ['companies'])
 def get_categories():
-    categories = db.session.query(Company.category).distinct().all()
-    return jsonify([cat[0] for cat in categories])
+    # Категории одобренных компаний из кэша фасетов
+    return jsonify(facets.cache.values('category'))
 
 @catalog_bp.route('/cities', methods=['GET'])
+@response_cache.cached(lambda: ['companies'])
 def get_cities():
-    cities = db.session.query(Company.city).distinct().all()
-    return jsonify([city[0] for city in cities])
+    # Города одобренных компаний из кэша фасетов
+    return jsonify(facets.cache.values('city'))
+
+@catalog_bp.route('/facets', methods=['GET'])
+def get_facets():
+    # Количество одобренных компаний по категориям, городам и порогам рейтинга
+    return jsonify(facets.cache.counts(
+        category=request.args.get('category') or None,
+        city=request.args.get('city') or None,
+        min_rating=request.args.get('rating', type=int)
+    ))
@@ -0,0 +1,176 @@
+import os
+
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import jwt_required
+from backend.models import db, Upload
+from backend import assets, upload_registry
+from backend.assets import FRONTEND_DIR
+from backend.file_serving import send_upload
+from backend.images import processor as image_processor, variant_map, strip_metadata
+from backend.uploads import store_upload, UploadTooLarge
+from backend.log import get_logger
+
+# Страницы фронтенда, проверка состояния, загрузка и раздача файлов
+core_bp = Blueprint('core', __name__)
+logger = get_logger(__name__)
+
+PHOTO_MAX_SIZE = 5 * 1024 * 1024
+
+@core_bp.route('/')
+def index():
+    try:
+        return assets.send_page('index.html')
+    except Exception as e:
+        return jsonify({'error': f'Frontend directory not found: {FRONTEND_DIR}', 'exception': str(e)}), 500
+
+@core_bp.route('/js/<path:filename>')
+def serve_js(filename):
+    return assets.send_asset('js', filename)
+
+@core_bp.route('/css/<path:filename>')
+def serve_css(filename):
+    return assets.send_asset('css', filename)
+
+@core_bp.route('/<path:filename>')
+def serve_html(filename):
+    # Исключаем API маршруты
+    if filename.startswith('api/'):
+        return jsonify({'error': 'Not found'}), 404
+    return assets.send_page(filename)
+
+@core_bp.route('/test')
+def test():
+    return '''
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>Test Page</title>
+    </head>
+    <body>
+        <h1>Test Page Works!</h1>
+        <p>Frontend directory: {}</p>
+        <p>Frontend exists: {}</p>
+        <p><a href="/api/health">Check API Health</a></p>
+    </body>
+    </html>
+    '''.format(FRONTEND_DIR, os.path.exists(FRONTEND_DIR))
+
+@core_bp.app_errorhandler(404)
+def not_found(error):
+    return jsonify({'error': 'Not found'}), 404
+
+@core_bp.app_errorhandler(500)
+def internal_error(error):
+    logger.error('Внутренняя ошибка сервера', extra={'error': str(error)})
+    return jsonify({
+        'error': 'Internal server error',
+        'details': str(error)
+    }), 500
+
+@core_bp.route('/api/upload', methods=['POST'])
+@jwt_required()
+def upload_file():
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+    
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    
+    if file and allowed_file(file.filename):
+        try:
+            filename, created = store_upload(file, current_app.config['UPLOAD_FOLDER'], current_app.config['MAX_CONTENT_LENGTH'],
+                                              transform=strip_metadata)
+        except UploadTooLarge as e:
+            return jsonify({'error': str(e)}), 413
+        upload_registry.register(current_app.config['UPLOAD_FOLDER'], filename)
+        db.session.commit()
+        if created:
+            image_processor.submit(filename)
+        
+        # Возвращаем URL файла
+        file_url = f'/static/uploads/{filename}'
+        return jsonify({'url': file_url, 'filename': filename, 'variants': variant_map(filename)})
+    
+    return jsonify({'error': 'Invalid file type'}), 400
+
+def allowed_file(filename):
+    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+@core_bp.route('/static/uploads/<path:filename>')
+def uploaded_file(filename):
+    return send_upload(current_app.config['UPLOAD_FOLDER'], filename,
+                       current_app.config['UPLOAD_SERVE_MODE'], current_app.config['UPLOAD_ACCEL_PREFIX'])
+
+@core_bp.route('/uploads/<path:filename>')
+def uploaded_file_alt(filename):
+    """Альтернативный endpoint для обслуживания файлов"""
+    return uploaded_file(filename)
+
+@core_bp.route('/api/debug-uploads')
+def debug_uploads():
+    """Отладочный endpoint для проверки загруженных файлов (по реестру, без обхода папки)"""
+    try:
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        latest = Upload.query.order_by(Upload.id.desc()).limit(50).all()
+        
+        return jsonify({
+            'upload_folder': upload_folder,
+            'folder_exists': os.path.exists(upload_folder),
+            'files': [{'name': upload.filename, 'size': upload.size, 'ref_count': upload.ref_count}
+                      for upload in latest],
+            **upload_registry.summary()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# API для загрузки фотографий
+@core_bp.route('/api/upload-photos', methods=['POST'])
+def upload_photos():
+    """Загрузка фотографий для комментариев и отзывов"""
+    try:
+        # Размер каждого фото проверяется еще при разборе формы, до конца загрузки
+        request.max_file_size = PHOTO_MAX_SIZE
+        try:
+            files = request.files.getlist('photos')
+        except UploadTooLarge:
+            return jsonify({'error': 'File size too large (max 5MB)'}), 400
+        if not files:
+            return jsonify({'error': 'No photos provided'}), 400
+        
+        if len(files) > 5:
+            return jsonify({'error': 'Maximum 5 photos allowed'}), 400
+        
+        uploaded_files = []
+        
+        for file in files:
+            if file and file.filename:
+                # Проверяем расширение файла
+                if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp')):
+                    return jsonify({'error': 'Only image files are allowed'}), 400
+                
+                # Одинаковые фото хранятся один раз
+                try:
+                    filename, created = store_upload(file, current_app.config['UPLOAD_FOLDER'], PHOTO_MAX_SIZE,
+                                                     transform=strip_metadata)
+                except UploadTooLarge:
+                    return jsonify({'error': 'File size too large (max 5MB)'}), 400
+                logger.info('Фото сохранено' if created else 'Фото уже загружено', extra={'upload': filename})
+                
+                uploaded_files.append(filename)
+                upload_registry.register(current_app.config['UPLOAD_FOLDER'], filename)
+                if created:
+                    image_processor.submit(filename)
+        
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Photos uploaded successfully',
+            'files': uploaded_files,
+            'variants': {filename: variant_map(filename) for filename in uploaded_files}
+        })
+        
+    except Exception as e:
+        logger.exception('Ошибка загрузки фотографий')
+        return jsonify({'error': 'Failed to upload photos'}), 500
@@ -1,12 +1,24 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
-from backend.models import db, Article, Comment, User
+from sqlalchemy.orm import joinedload
+from backend.models import db, Article, Comment, User, Tag
+from backend.aggregates import comment_changed
+from backend.loaders import prefetch
+from backend import tags as tag_index
+from backend.view_counter import counter as view_counter
+from backend.response_cache import cache as response_cache
+from backend import conditional
+from backend.pagination import keyset_paginate, InvalidCursor
+from backend import fulltext
+from backend.log import get_logger
 import json
 import requests
 
 forum_bp = Blueprint('forum', __name__)
+logger = get_logger(__name__)
 
 @forum_bp.route('/articles', methods=['GET'])
+@response_cache.cached(lambda: ['articles'])
 def get_articles():
     try:
         page = request.args.get('page', 1, type=int)
@@ -14,30 +26,40 @@ def get_articles():
         tag = request.args.get('tag')
         search = request.args.get('search')
         author_id = request.args.get('author_id', type=int)
+        cursor = request.args.get('cursor')
         
-        query = Article.query.filter_by(status='approved')
+        # Авторов подгружаем тем же запросом, счетчик комментариев хранится в статье
+        query = Article.query.options(joinedload(Article.author)).filter_by(status='approved')
         
         if author_id:
             query = query.filter_by(author_id=author_id)
         
         if tag:
-            query = query.filter(Article.tags.contains(tag))
+            # Точное совпадение тега по индексу article_tag
+            query = query.filter(Article.id.in_(tag_index.articles_with_tag(tag)))
         
         if search:
-            # Полнотекстовый поиск по заголовку, содержанию, тегам и автору
-            search_term = f"%{search}%"
-            query = query.filter(
-                db.or_(
-                    Article.title.ilike(search_term),
-                    Article.content.ilike(search_term),
-                    Article.tags.ilike(search_term),
-                    Article.excerpt.ilike(search_term)
-                )
-            )
+            # Полнотекстовый поиск по заголовку, содержанию, тегам и анонсу
+            query = query.filter(fulltext.match(Article, search))
         
-        articles = query.order_by(Article.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        if cursor is not None:
+            # Курсорная пагинация по ключу (created_at, id)
+            articles = keyset_paginate(
+                query, [(Article.created_at, True), (Article.id, True)], cursor, per_page,
+                with_total=request.args.get('with_total', type=int)
+            )
+            meta = articles.meta()
+        else:
+            # При поиске сначала самые релевантные
+            order = [fulltext.rank(Article, search).desc()] if search else []
+            articles = query.order_by(*order, Article.created_at.desc()).paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+            meta = {
+                'total': articles.total,
+                'pages': articles.pages,
+                'current_page': page
+            }
         
         return jsonify({
             'articles': [{
@@ -57,53 +79,56 @@ def get_articles():
                     'avatar': None
                 },
                 'created_at': article.created_at.isoformat(),
-                'comment_count': len(article.comments)
+                'comment_count': article.comment_count or 0
             } for article in articles.items],
-            'total': articles.total,
-            'pages': articles.pages,
-            'current_page': page
+            **meta
         })
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     except Exception as e:
+        logger.exception('Ошибка загрузки статей')
         return jsonify({'error': f'Ошибка загрузки статей: {str(e)}'}), 500
 
 @forum_bp.route('/articles/<int:article_id>', methods=['GET'])
 def get_article(article_id):
     article = Article.query.get_or_404(article_id)
     
-    # Увеличиваем счетчик просмотров
-    article.views += 1
-    db.session.commit()
+    # Просмотр копится в памяти и записывается в базу пачкой в фоне
+    view_counter.record(article.id)
+    
+    # Слабый ETag: тело отличается только счетчиком просмотров, его в версии нет
+    etag = conditional.make_etag('article', article.id, article.updated_at, article.comment_count, article.status)
+    cached = conditional.not_modified(etag, article.updated_at, weak=True)
+    if cached is not None:
+        return cached
     
     # Получаем комментарии
     comments = Comment.query.filter_by(article_id=article_id, status='approved').order_by(Comment.created_at.asc()).all()
     
-    return jsonify({
+    response = jsonify({
         'id': article.id,
         'title': article.title,
         'content': article.content,
         'excerpt': article.excerpt,
         'cover_image': article.cover_image,
         'tags': json.loads(article.tags) if article.tags else [],
-        'views': article.views,
+        'views': (article.views or 0) + view_counter.pending(article.id),
         'status': article.status,
         'author': {
             'id': article.author.id if article.author else None,
             'name': article.author.name if article.author else article.anonymous_author,
             'avatar': article.author.avatar if article.author else None
         },
-        'comments': [comment.to_dict() for comment in comments],
+        'comments': [comment.to_dict() for comment in prefetch(comments)],
         'created_at': article.created_at.isoformat(),
         'updated_at': article.updated_at.isoformat()
     })
+    return conditional.set_validators(response, etag, article.updated_at, weak=True)
 
 @forum_bp.route('/articles', methods=['POST'])
 def create_article():
     data = request.get_json()
     
-    # Логируем заголовки для отладки
-    print(f"📝 Заголовки запроса: {dict(request.headers)}")
-    print(f"📝 Данные запроса: {data}")
-    
     if not data or not data.get('title') or not data.get('content'):
         return jsonify({'error': 'Title and content are required'}), 400
     
@@ -116,13 +141,11 @@ def create_article():
         verify_jwt_in_request()
         user_id = get_jwt_identity()
         user_id = int(user_id)
-        print(f"✅ Пользователь авторизован: {user_id}")
         # Пользователь авторизован - пропускаем капчу
     except Exception as e:
-        print(f"❌ Пользователь не авторизован: {e}")
+        logger.debug('Анонимная статья', extra={'auth_error': str(e)})
         # Пользователь не авторизован - анонимная статья
         # Капча отключена для тестирования
-        print("🔓 Капча отключена для статей - пропускаем проверку")
         
         # Запрашиваем имя для анонимной статьи
         anonymous_author = data.get('anonymous_author', 'Анонимный автор')
@@ -139,7 +162,13 @@ def create_article():
     )
     
     db.session.add(article)
+    db.session.flush()
+    
+    # Обновляем индекс тегов
+    tag_index.article_tags_changed(article.id, new_tags=article.tags, new_status=article.status)
+    
     db.session.commit()
+    logger.info('Статья создана', extra={'article_id': article.id, 'user_id': user_id})
     
     return jsonify({
         'message': 'Article created successfully',
@@ -164,6 +193,8 @@ def update_article(article_id):
         return jsonify({'error': 'Access denied'}), 403
     
     data = request.get_json()
+    old_tags = article.tags
+    old_status = article.status
     
     if 'title' in data:
         article.title = data['title']
@@ -177,6 +208,9 @@ def update_article(article_id):
     if 'status' in data:
         article.status = data['status']
     
+    # Обновляем индекс тегов
+    tag_index.article_tags_changed(article.id, old_tags, old_status, article.tags, article.status)
+    
     db.session.commit()
     
     return jsonify({
@@ -200,6 +234,7 @@ def delete_article(article_id):
     if article.author_id != int(user_id) and user.role != 'admin':
         return jsonify({'error': 'Access denied'}), 403
     
+    tag_index.article_tags_changed(article.id, old_tags=article.tags, old_status=article.status)
     db.session.delete(article)
     db.session.commit()
     
@@ -223,8 +258,12 @@ def moderate_article(article_id):
         return jsonify({'error': 'Недопустимый статус'}), 400
     
     article = Article.query.get_or_404(article_id)
+    old_status = article.status
     article.status = status
     
+    # Обновляем счетчики тегов
+    tag_index.article_tags_changed(article.id, article.tags, old_status, article.tags, article.status)
+    
     db.session.commit()
     
     article_data = {
@@ -266,13 +305,11 @@ def create_comment(article_id):
         verify_jwt_in_request()
         user_id = get_jwt_identity()
         user_id = int(user_id)
-        print(f"✅ Пользователь авторизован для комментария: {user_id}")
         # Пользователь авторизован - пропускаем капчу
     except Exception as e:
-        print(f"❌ Пользователь не авторизован для комментария: {e}")
+        logger.debug('Анонимный комментарий', extra={'article_id': article_id, 'auth_error': str(e)})
         # Пользователь не авторизован - анонимный комментарий
         # Капча отключена для тестирования
-        print("🔓 Капча отключена для комментариев - пропускаем проверку")
         
         # Запрашиваем имя для анонимного комментария
         anonymous_name = data.get('anonymous_name', 'Анонимный пользователь')
@@ -288,6 +325,7 @@ def create_comment(article_id):
     
     try:
         db.session.add(comment)
+        comment_changed(article_id, new_status=comment.status)
         db.session.commit()
         
         return jsonify({
@@ -295,14 +333,16 @@ def create_comment(article_id):
             'comment': comment.to_dict()
         })
     except Exception as e:
-        print(f"❌ Ошибка при создании комментария: {e}")
+        logger.exception('Ошибка при создании комментария', extra={'article_id': article_id, 'user_id': user_id})
         db.session.rollback()
         
         # Если ошибка связана с полем photos, создаем комментарий без фото
         if 'photos' in str(e):
-            print("🔧 Поле photos не существует, создаем комментарий без фото...")
+            logger.warning('Поле photos не существует, комментарий сохраняется без фото',
+                           extra={'article_id': article_id})
             comment.photos = None
             db.session.add(comment)
+            comment_changed(article_id, new_status=comment.status)
             db.session.commit()
             
             return jsonify({
@@ -327,6 +367,9 @@ def update_comment(comment_id):
     if 'text' in data:
         comment.text = data['text']
     
+    # Версия статьи для ETag
+    comment_changed(comment.article_id, comment.status, comment.status)
+    
     db.session.commit()
     
     return jsonify({
@@ -359,21 +402,18 @@ def delete_comment(comment_id):
         return jsonify({'error': 'Access denied'}), 403
     
     db.session.delete(comment)
+    comment_changed(comment.article_id, old_status=comment.status)
     db.session.commit()
     
     return jsonify({'message': 'Comment deleted successfully'})
 
 @forum_bp.route('/tags', methods=['GET'])
+@response_cache.cached(lambda: ['tags'])
 def get_tags():
-    articles = Article.query.filter_by(status='approved').all()
-    all_tags = []
-    
-    for article in articles:
-        if article.tags:
-            tags = json.loads(article.tags)
-            all_tags.extend(tags)
+    # Теги одобренных статей, популярные первыми
+    tags = Tag.query.filter(Tag.article_count > 0).order_by(Tag.article_count.desc(), Tag.name).all()
     
-    # Убираем дубликаты и сортируем
-    unique_tags = sorted(list(set(all_tags)))
+    if request.args.get('with_counts', type=int):
+        return jsonify([{'name': tag.name, 'count': tag.article_count} for tag in tags])
     
-    return jsonify(unique_tags)
+    return jsonify([tag.name for tag in tags])
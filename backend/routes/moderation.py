@@ -1,10 +1,18 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from backend.models import db, Article, Comment, Review, User, Company
+from backend.models import db, Article, Comment, Review, User, Company, Upload
+from backend.aggregates import review_changed, comment_changed
+from backend.pagination import keyset_paginate, InvalidCursor
+from backend.loaders import prefetch
+from backend import tags as tag_index
+from backend import upload_registry
+from backend.response_cache import cache as response_cache
+from backend.log import get_logger
 from sqlalchemy import inspect
 from datetime import datetime
 
 moderation_bp = Blueprint('moderation', __name__, url_prefix='/api/moderation')
+logger = get_logger(__name__)
 
 # Проверка прав администратора
 def require_admin():
@@ -19,6 +27,41 @@ def require_admin():
     except Exception as e:
         return jsonify({'error': f'Ошибка проверки прав: {str(e)}'}), 403
 
+# Статистика кэша ответов (попадания, промахи, вытеснения)
+@moderation_bp.route('/cache-stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    admin_check = require_admin()
+    if admin_check:
+        return admin_check
+    
+    return jsonify(response_cache.snapshot())
+
+# Реестр загруженных файлов: итоги и список (?orphaned=1 - только файлы без ссылок)
+@moderation_bp.route('/uploads', methods=['GET'])
+@jwt_required()
+def get_uploads():
+    admin_check = require_admin()
+    if admin_check:
+        return admin_check
+    
+    per_page = min(request.args.get('per_page', 50, type=int), 200)
+    cursor = request.args.get('cursor', '')
+    
+    try:
+        query = Upload.query
+        if request.args.get('orphaned', type=int):
+            query = query.filter(Upload.ref_count <= 0)
+        
+        uploads = keyset_paginate(query, [(Upload.id, True)], cursor, per_page)
+        return jsonify({
+            'summary': upload_registry.summary(),
+            'uploads': [upload.to_dict() for upload in uploads.items],
+            **uploads.meta()
+        })
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
 # Получение статей на модерации
 @moderation_bp.route('/articles', methods=['GET'])
 @jwt_required()
@@ -30,20 +73,37 @@ def get_pending_articles():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     status = request.args.get('status', 'pending')
+    cursor = request.args.get('cursor')
     
     try:
-        articles = Article.query.filter_by(status=status).order_by(Article.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        query = Article.query.filter_by(status=status)
+        
+        if cursor is not None:
+            # Курсорная пагинация по ключу (created_at, id)
+            articles = keyset_paginate(
+                query, [(Article.created_at, True), (Article.id, True)], cursor, per_page,
+                with_total=request.args.get('with_total', type=int)
+            )
+            meta = articles.meta()
+        else:
+            articles = query.order_by(Article.created_at.desc()).paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+            meta = {
+                'total': articles.total,
+                'pages': articles.pages,
+                'current_page': articles.page,
+                'per_page': articles.per_page
+            }
         
         return jsonify({
-            'articles': [article.to_dict() for article in articles.items],
-            'total': articles.total,
-            'pages': articles.pages,
-            'current_page': articles.page,
-            'per_page': articles.per_page
+            'articles': [article.to_dict() for article in prefetch(articles.items)],
+            **meta
         })
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     except Exception as e:
+        logger.exception('Ошибка загрузки статей на модерации')
         return jsonify({'error': f'Ошибка загрузки статей: {str(e)}'}), 500
 
 # Получение комментариев на модерации
@@ -57,17 +117,34 @@ def get_pending_comments():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     status = request.args.get('status', 'pending')
-    
-    comments = Comment.query.filter_by(status=status).order_by(Comment.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    cursor = request.args.get('cursor')
+    
+    query = Comment.query.filter_by(status=status)
+    
+    if cursor is not None:
+        # Курсорная пагинация по ключу (created_at, id)
+        try:
+            comments = keyset_paginate(
+                query, [(Comment.created_at, True), (Comment.id, True)], cursor, per_page,
+                with_total=request.args.get('with_total', type=int)
+            )
+        except InvalidCursor:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        meta = comments.meta()
+    else:
+        comments = query.order_by(Comment.created_at.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        meta = {
+            'total': comments.total,
+            'pages': comments.pages,
+            'current_page': comments.page,
+            'per_page': comments.per_page
+        }
     
     return jsonify({
-        'comments': [comment.to_dict() for comment in comments.items],
-        'total': comments.total,
-        'pages': comments.pages,
-        'current_page': comments.page,
-        'per_page': comments.per_page
+        'comments': [comment.to_dict() for comment in prefetch(comments.items)],
+        **meta
     })
 
 # Получение отзывов на модерации
@@ -81,17 +158,34 @@ def get_pending_reviews():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     status = request.args.get('status', 'pending')
-    
-    reviews = Review.query.filter_by(status=status).order_by(Review.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    cursor = request.args.get('cursor')
+    
+    query = Review.query.filter_by(status=status)
+    
+    if cursor is not None:
+        # Курсорная пагинация по ключу (created_at, id)
+        try:
+            reviews = keyset_paginate(
+                query, [(Review.created_at, True), (Review.id, True)], cursor, per_page,
+                with_total=request.args.get('with_total', type=int)
+            )
+        except InvalidCursor:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        meta = reviews.meta()
+    else:
+        reviews = query.order_by(Review.created_at.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        meta = {
+            'total': reviews.total,
+            'pages': reviews.pages,
+            'current_page': reviews.page,
+            'per_page': reviews.per_page
+        }
     
     return jsonify({
-        'reviews': [review.to_dict() for review in reviews.items],
-        'total': reviews.total,
-        'pages': reviews.pages,
-        'current_page': reviews.page,
-        'per_page': reviews.per_page
+        'reviews': [review.to_dict() for review in prefetch(reviews.items)],
+        **meta
     })
 
 # Компании на модерации
@@ -105,10 +199,30 @@ def get_pending_companies():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     status = request.args.get('status', 'pending')
-    
-    companies = Company.query.filter_by(status=status).order_by(Company.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    cursor = request.args.get('cursor')
+    
+    query = Company.query.filter_by(status=status)
+    
+    if cursor is not None:
+        # Курсорная пагинация по ключу (created_at, id)
+        try:
+            companies = keyset_paginate(
+                query, [(Company.created_at, True), (Company.id, True)], cursor, per_page,
+                with_total=request.args.get('with_total', type=int)
+            )
+        except InvalidCursor:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        meta = companies.meta()
+    else:
+        companies = query.order_by(Company.created_at.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        meta = {
+            'total': companies.total,
+            'pages': companies.pages,
+            'current_page': companies.page,
+            'per_page': companies.per_page
+        }
     
     return jsonify({
         'companies': [{
@@ -118,10 +232,7 @@ def get_pending_companies():
             'city': c.city,
             'created_at': c.created_at.isoformat()
         } for c in companies.items],
-        'total': companies.total,
-        'pages': companies.pages,
-        'current_page': companies.page,
-        'per_page': companies.per_page
+        **meta
     })
 
 # Модерация статьи
@@ -139,9 +250,13 @@ def moderate_article(article_id):
         return jsonify({'error': 'Недопустимый статус'}), 400
     
     article = Article.query.get_or_404(article_id)
+    old_status = article.status
     article.status = status
     article.updated_at = datetime.utcnow()
     
+    # Обновляем счетчики тегов
+    tag_index.article_tags_changed(article.id, article.tags, old_status, article.tags, article.status)
+    
     db.session.commit()
     
     return jsonify({'message': 'Статус статьи обновлен', 'article': article.to_dict()})
@@ -161,8 +276,12 @@ def moderate_comment(comment_id):
         return jsonify({'error': 'Недопустимый статус'}), 400
     
     comment = Comment.query.get_or_404(comment_id)
+    old_status = comment.status
     comment.status = status
     
+    # Обновляем счетчик комментариев статьи
+    comment_changed(comment.article_id, old_status, comment.status)
+    
     db.session.commit()
     
     return jsonify({'message': 'Статус комментария обновлен', 'comment': comment.to_dict()})
@@ -182,8 +301,12 @@ def moderate_review(review_id):
         return jsonify({'error': 'Недопустимый статус'}), 400
     
     review = Review.query.get_or_404(review_id)
+    old_status = review.status
     review.status = status
     
+    # Обновляем агрегаты рейтинга компании
+    review_changed(review.company_id, old_status, review.rating, review.status, review.rating)
+    
     db.session.commit()
     
     return jsonify({'message': 'Статус отзыва обновлен', 'review': review.to_dict()})
@@ -223,8 +346,11 @@ def delete_article(article_id):
         article = Article.query.get_or_404(article_id)
         article_title = article.title
         
-        # Удаляем все комментарии к статье
-        Comment.query.filter_by(article_id=article_id).delete()
+        # Удаляем все комментарии к статье (со ссылками на их фото) и ее теги
+        comments = Comment.query.filter_by(article_id=article_id)
+        upload_registry.release(Comment, comments)
+        comments.delete()
+        tag_index.article_tags_changed(article.id, old_tags=article.tags, old_status=article.status)
         
         # Удаляем саму статью
         db.session.delete(article)
@@ -235,6 +361,7 @@ def delete_article(article_id):
         }), 200
         
     except Exception as e:
+        logger.exception('Ошибка при удалении статьи')
         db.session.rollback()
         return jsonify({'error': f'Ошибка при удалении статьи: {str(e)}'}), 500
 
@@ -251,6 +378,7 @@ def delete_comment(comment_id):
         comment_text = comment.text[:50] + "..." if len(comment.text) > 50 else comment.text
         
         db.session.delete(comment)
+        comment_changed(comment.article_id, old_status=comment.status)
         db.session.commit()
         
         return jsonify({
@@ -258,6 +386,7 @@ def delete_comment(comment_id):
         }), 200
         
     except Exception as e:
+        logger.exception('Ошибка при удалении комментария')
         db.session.rollback()
         return jsonify({'error': f'Ошибка при удалении комментария: {str(e)}'}), 500
 
@@ -275,6 +404,10 @@ def delete_review(review_id):
         company_name = company.name if company else "Неизвестная компания"
         
         db.session.delete(review)
+        
+        # Обновляем агрегаты рейтинга компании
+        review_changed(review.company_id, old_status=review.status, old_rating=review.rating)
+        
         db.session.commit()
         
         return jsonify({
@@ -282,6 +415,7 @@ def delete_review(review_id):
         }), 200
         
     except Exception as e:
+        logger.exception('Ошибка при удалении отзыва')
         db.session.rollback()
         return jsonify({'error': f'Ошибка при удалении отзыва: {str(e)}'}), 500
 
@@ -297,8 +431,10 @@ def delete_company(company_id):
         company = Company.query.get_or_404(company_id)
         company_name = company.name
         
-        # Удаляем все отзывы компании
-        Review.query.filter_by(company_id=company_id).delete()
+        # Удаляем все отзывы компании (со ссылками на их фото)
+        reviews = Review.query.filter_by(company_id=company_id)
+        upload_registry.release(Review, reviews)
+        reviews.delete()
         
         # Удаляем саму компанию
         db.session.delete(company)
@@ -309,5 +445,6 @@ def delete_company(company_id):
         }), 200
         
     except Exception as e:
+        logger.exception('Ошибка при удалении компании')
         db.session.rollback()
         return jsonify({'error': f'Ошибка при удалении компании: {str(e)}'}), 500
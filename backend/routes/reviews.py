@@ -1,20 +1,22 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
 from backend.models import db, Review, Company, User
+from backend.aggregates import review_changed
+from backend.pagination import keyset_paginate, InvalidCursor
+from backend.loaders import prefetch
+from backend.response_cache import cache as response_cache
+from backend.log import get_logger
 import json
 import requests
 
 reviews_bp = Blueprint('reviews', __name__)
+logger = get_logger(__name__)
 
 @reviews_bp.route('/', methods=['POST'])
 @jwt_required()
 def create_review():
     data = request.get_json()
     
-    # Логируем заголовки для отладки
-    print(f"📝 Заголовки запроса отзыва: {dict(request.headers)}")
-    print(f"📝 Данные запроса отзыва: {data}")
-    
     if not data or not data.get('company_id') or not data.get('rating'):
         return jsonify({'error': 'Company ID and rating are required'}), 400
     
@@ -27,7 +29,6 @@ def create_review():
     # Получаем ID авторизованного пользователя
     user_id = get_jwt_identity()
     user_id = int(user_id)
-    print(f"✅ Пользователь авторизован для отзыва: {user_id}")
     
     # Проверяем, что пользователь не оставлял отзыв на эту компанию
     existing_review = Review.query.filter_by(company_id=company_id, user_id=user_id).first()
@@ -36,8 +37,6 @@ def create_review():
     
     # Создаем отзыв
     try:
-        print(f"🔨 Создаем отзыв: company_id={company_id}, user_id={user_id}, rating={rating}")
-        
         review = Review(
             company_id=company_id,
             user_id=user_id,
@@ -47,25 +46,20 @@ def create_review():
             status='approved'  # Автоматически одобряем отзывы
         )
         
-        print(f"✅ Объект Review создан: {review}")
         db.session.add(review)
-        print("✅ Отзыв добавлен в сессию")
         
     except Exception as e:
-        print(f"❌ Ошибка при создании отзыва: {e}")
+        logger.exception('Ошибка при создании отзыва', extra={'company_id': company_id, 'user_id': user_id})
         db.session.rollback()
         return jsonify({'error': f'Failed to create review: {str(e)}'}), 500
     
-    # Пересчитываем рейтинг компании
+    # Обновляем агрегаты рейтинга компании
     try:
-        all_reviews = Review.query.filter_by(company_id=company_id, status='approved').all()
-        if all_reviews:
-            total_rating = sum(r.rating for r in all_reviews)
-            company.rating = total_rating / len(all_reviews)
-            company.review_count = len(all_reviews)
+        review_changed(company_id, new_status=review.status, new_rating=review.rating)
         
         db.session.commit()
-        print("✅ Отзыв сохранен в базу данных")
+        logger.info('Отзыв создан', extra={'review_id': review.id, 'company_id': company_id, 'user_id': user_id,
+                                           'rating': rating})
         
         return jsonify({
             'message': 'Review created successfully',
@@ -73,7 +67,7 @@ def create_review():
         }), 201
         
     except Exception as e:
-        print(f"❌ Ошибка при сохранении отзыва: {e}")
+        logger.exception('Ошибка при сохранении отзыва', extra={'company_id': company_id, 'user_id': user_id})
         db.session.rollback()
         return jsonify({'error': f'Failed to save review: {str(e)}'}), 500
 
@@ -110,6 +104,9 @@ def update_review(review_id):
     
     data = request.get_json()
     
+    old_status = review.status
+    old_rating = review.rating
+    
     if 'rating' in data:
         review.rating = data['rating']
     if 'text' in data:
@@ -117,16 +114,10 @@ def update_review(review_id):
     if 'photos' in data:
         review.photos = json.dumps(data['photos'])
     
-    db.session.commit()
+    # Обновляем агрегаты рейтинга компании
+    review_changed(review.company_id, old_status, old_rating, review.status, review.rating)
     
-    # Пересчитываем рейтинг компании
-    company = Company.query.get(review.company_id)
-    all_reviews = Review.query.filter_by(company_id=company.id, status='approved').all()
-    if all_reviews:
-        total_rating = sum(r.rating for r in all_reviews)
-        company.rating = total_rating / len(all_reviews)
-        company.review_count = len(all_reviews)
-        db.session.commit()
+    db.session.commit()
     
     return jsonify({
         'message': 'Review updated successfully',
@@ -143,38 +134,47 @@ def delete_review(review_id):
     if review.user_id != int(user_id):
         return jsonify({'error': 'Access denied'}), 403
     
-    company_id = review.company_id
     db.session.delete(review)
     
-    # Пересчитываем рейтинг компании
-    company = Company.query.get(company_id)
-    all_reviews = Review.query.filter_by(company_id=company_id, status='approved').all()
-    if all_reviews:
-        total_rating = sum(r.rating for r in all_reviews)
-        company.rating = total_rating / len(all_reviews)
-        company.review_count = len(all_reviews)
-    else:
-        company.rating = 0.0
-        company.review_count = 0
+    # Обновляем агрегаты рейтинга компании
+    review_changed(review.company_id, old_status=review.status, old_rating=review.rating)
     
     db.session.commit()
     
     return jsonify({'message': 'Review deleted successfully'})
 
 @reviews_bp.route('/company/<int:company_id>', methods=['GET'])
+@response_cache.cached(lambda company_id: [f'company:{company_id}'])
 def get_company_reviews(company_id):
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
-    
-    reviews = Review.query.filter_by(company_id=company_id, status='approved').order_by(Review.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    cursor = request.args.get('cursor')
+    
+    query = Review.query.filter_by(company_id=company_id, status='approved')
+    
+    if cursor is not None:
+        # Курсорная пагинация по ключу (created_at, id)
+        try:
+            reviews = keyset_paginate(
+                query, [(Review.created_at, True), (Review.id, True)], cursor, per_page,
+                with_total=request.args.get('with_total', type=int)
+            )
+        except InvalidCursor:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        meta = reviews.meta()
+    else:
+        reviews = query.order_by(Review.created_at.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        meta = {
+            'total': reviews.total,
+            'pages': reviews.pages,
+            'current_page': page
+        }
     
     return jsonify({
-        'reviews': [review.to_dict() for review in reviews.items],
-        'total': reviews.total,
-        'pages': reviews.pages,
-        'current_page': page
+        'reviews': [review.to_dict() for review in prefetch(reviews.items)],
+        **meta
     })
 
 @reviews_bp.route('/user', methods=['GET'])
@@ -183,10 +183,29 @@ def get_user_reviews():
     user_id = get_jwt_identity()
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
-    
-    reviews = Review.query.filter_by(user_id=int(user_id)).order_by(Review.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    cursor = request.args.get('cursor')
+    
+    query = Review.query.filter_by(user_id=int(user_id))
+    
+    if cursor is not None:
+        # Курсорная пагинация по ключу (created_at, id)
+        try:
+            reviews = keyset_paginate(
+                query, [(Review.created_at, True), (Review.id, True)], cursor, per_page,
+                with_total=request.args.get('with_total', type=int)
+            )
+        except InvalidCursor:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        meta = reviews.meta()
+    else:
+        reviews = query.order_by(Review.created_at.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        meta = {
+            'total': reviews.total,
+            'pages': reviews.pages,
+            'current_page': page
+        }
     
     return jsonify({
         'reviews': [{
@@ -196,8 +215,6 @@ def get_user_reviews():
                 'name': review.company.name,
                 'category': review.company.category
             }
-        } for review in reviews.items],
-        'total': reviews.total,
-        'pages': reviews.pages,
-        'current_page': page
+        } for review in prefetch(reviews.items, 'author', 'company')],
+        **meta
     })
@@ -2,6 +2,9 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from backend.models import db, Company, Article, Review
 from sqlalchemy import or_, and_
+from backend import fulltext
+from backend.loaders import prefetch
+from backend import suggestions as suggestion_index
 
 search_bp = Blueprint('search', __name__, url_prefix='/search')
 
@@ -25,7 +28,6 @@ def global_search():
             'current_page': page
         })
     
-    search_term = f"%{query}%"
     results = {
         'companies': [],
         'articles': [],
@@ -40,14 +42,9 @@ def global_search():
         companies_query = Company.query.filter(
             and_(
                 Company.status == 'approved',
-                or_(
-                    Company.name.ilike(search_term),
-                    Company.category.ilike(search_term),
-                    Company.city.ilike(search_term),
-                    Company.description.ilike(search_term)
-                )
+                fulltext.match(Company, query)
             )
-        ).order_by(Company.rating.desc())
+        ).order_by(fulltext.rank(Company, query).desc(), Company.rating.desc())
         
         companies = companies_query.paginate(
             page=page, per_page=per_page, error_out=False
@@ -72,14 +69,9 @@ def global_search():
         articles_query = Article.query.filter(
             and_(
                 Article.status == 'approved',
-                or_(
-                    Article.title.ilike(search_term),
-                    Article.content.ilike(search_term),
-                    Article.tags.ilike(search_term),
-                    Article.excerpt.ilike(search_term)
-                )
+                fulltext.match(Article, query)
             )
-        ).order_by(Article.created_at.desc())
+        ).order_by(fulltext.rank(Article, query).desc(), Article.created_at.desc())
         
         articles = articles_query.paginate(
             page=page, per_page=per_page, error_out=False
@@ -93,14 +85,10 @@ def global_search():
             'tags': article.tags,
             'cover_image': article.cover_image,
             'views': article.views,
-            'author': {
-                'id': article.author.id if article.author else None,
-                'name': article.author.name if article.author else article.anonymous_author,
-                'avatar': article.author.avatar if article.author else None
-            },
+            'author': article.author_info(),
             'created_at': article.created_at.isoformat(),
             'type': 'article'
-        } for article in articles.items]
+        } for article in prefetch(articles.items)]
         
         results['total'] += articles.total
     
@@ -109,11 +97,9 @@ def global_search():
         reviews_query = Review.query.filter(
             and_(
                 Review.status == 'approved',
-                or_(
-                    Review.text.ilike(search_term)
-                )
+                fulltext.match(Review, query)
             )
-        ).order_by(Review.created_at.desc())
+        ).order_by(fulltext.rank(Review, query).desc(), Review.created_at.desc())
         
         reviews = reviews_query.paginate(
             page=page, per_page=per_page, error_out=False
@@ -128,14 +114,10 @@ def global_search():
                 'name': review.company.name,
                 'category': review.company.category
             },
-            'author': {
-                'id': review.author.id,
-                'name': review.author.name,
-                'avatar': review.author.avatar
-            },
+            'author': review.author_info(),
             'created_at': review.created_at.isoformat(),
             'type': 'review'
-        } for review in reviews.items]
+        } for review in prefetch(reviews.items, 'author', 'company')]
         
         results['total'] += reviews.total
     
@@ -151,66 +133,14 @@ def search_suggestions():
     if len(query) < 2:
         return jsonify({'suggestions': []})
     
-    search_term = f"%{query}%"
-    suggestions = []
-    
-    # Предложения из названий компаний
-    companies = Company.query.filter(
-        and_(
-            Company.status == 'approved',
-            Company.name.ilike(search_term)
-        )
-    ).limit(5).all()
-    
-    for company in companies:
-        suggestions.append({
-            'text': company.name,
-            'type': 'company',
-            'category': company.category,
-            'city': company.city
-        })
-    
-    # Предложения из заголовков статей
-    articles = Article.query.filter(
-        and_(
-            Article.status == 'approved',
-            Article.title.ilike(search_term)
-        )
-    ).limit(5).all()
-    
-    for article in articles:
-        suggestions.append({
-            'text': article.title,
-            'type': 'article',
-            'author': article.author.name if article.author else article.anonymous_author
-        })
+    # Лимиты по типам: ?company_limit=5&article_limit=5&category_limit=3&city_limit=3
+    limits = {}
+    for kind in suggestion_index.TYPE_ORDER:
+        value = request.args.get(f'{kind}_limit', type=int)
+        if value is not None:
+            limits[kind] = min(max(value, 0), 20)
+    limit = min(max(request.args.get('limit', 10, type=int), 0), 50)
     
-    # Предложения из категорий
-    categories = db.session.query(Company.category).filter(
-        and_(
-            Company.status == 'approved',
-            Company.category.ilike(search_term)
-        )
-    ).distinct().limit(3).all()
-    
-    for category in categories:
-        suggestions.append({
-            'text': category[0],
-            'type': 'category'
-        })
-    
-    # Предложения из городов
-    cities = db.session.query(Company.city).filter(
-        and_(
-            Company.status == 'approved',
-            Company.city.ilike(search_term)
-        )
-    ).distinct().limit(3).all()
-    
-    for city in cities:
-        suggestions.append({
-            'text': city[0],
-            'type': 'city'
-        })
+    suggestions = suggestion_index.index.lookup(query, limits=limits, limit=limit)
     
-    return jsonify({'suggestions': suggestions[:10]})  # Ограничиваем до 10 предложений
+    return jsonify({'suggestions': suggestions})
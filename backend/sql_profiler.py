@@ -0,0 +1,234 @@
+"""
+Профилировщик SQL для разработки: N+1 и медленные запросы.
+
+Команды каждого запроса группируются по форме - тексту SQL без литералов и
+с одним "?" вместо списка параметров IN. Форма, повторившаяся за запрос
+SQL_PROFILE_REPEAT раз (по умолчанию 5), почти всегда означает N+1: to_dict()
+лениво дочитывает связь для каждой строки списка. Команды дольше
+SQL_PROFILE_SLOW_MS (по умолчанию 100 мс) записываются вместе с планом
+EXPLAIN.
+
+Включается SQL_PROFILE=1 или в режиме отладки Flask. Тогда каждый ответ
+получает заголовок X-SQL-Profile (число команд, время, повторы, медленные),
+а повторы и медленные команды пишутся в лог предупреждением.
+
+В проверочных скриптах:
+
+    with sql_profiler.capture() as profile:
+        client.get('/api/catalog/')
+    profile.assert_no_repeats()
+"""
+
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from backend.log import get_logger
+
+logger = get_logger(__name__)
+
+SQL_PROFILE = os.environ.get('SQL_PROFILE', '').lower() in ('1', 'true', 'yes')
+REPEAT_THRESHOLD = int(os.environ.get('SQL_PROFILE_REPEAT', 5))
+SLOW_MS = float(os.environ.get('SQL_PROFILE_SLOW_MS', 100))
+
+HEADER = 'X-SQL-Profile'
+EXPLAIN_SAVEPOINT = 'sql_profiler_explain'
+
+_PLACEHOLDER = re.compile(r'%\(\w+\)s|%s|:\w+|\$\d+|\?')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_VALUE_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE = re.compile(r'\s+')
+
+
+def normalize(statement):
+    """Форма команды: литералы и параметры заменены на ?, списки IN (?, ?, ...) - на (?)"""
+    shape = _STRING.sub('?', statement)
+    shape = _PLACEHOLDER.sub('?', shape)
+    shape = _NUMBER.sub('?', shape)
+    shape = _VALUE_LIST.sub('(?)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+def explain(cursor, dialect, statement, parameters):
+    """План команды через отдельный курсор того же соединения (события не срабатывают).
+
+    Курсор работает в транзакции запроса. В PostgreSQL ошибка EXPLAIN
+    перевела бы ее в состояние aborted, и запрос упал бы на следующей
+    команде, поэтому план снимается внутри SAVEPOINT и при ошибке
+    транзакция откатывается только до него.
+    """
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+    # В SQLite ошибка EXPLAIN транзакцию не ломает; в autocommit транзакции нет
+    savepoint = dialect.name != 'sqlite' and not getattr(cursor.connection, 'autocommit', False)
+    try:
+        plan_cursor = cursor.connection.cursor()
+        try:
+            if savepoint:
+                plan_cursor.execute(f'SAVEPOINT {EXPLAIN_SAVEPOINT}')
+            try:
+                plan_cursor.execute(prefix + statement, parameters)
+                rows = plan_cursor.fetchall()
+            except Exception:
+                if savepoint:
+                    plan_cursor.execute(f'ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}')
+                raise
+            finally:
+                if savepoint:
+                    plan_cursor.execute(f'RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}')
+        finally:
+            plan_cursor.close()
+    except Exception as e:
+        return [f'EXPLAIN не выполнен: {e}']
+    if dialect.name == 'sqlite':
+        return [str(row[-1]) for row in rows]
+    return [' '.join(str(value) for value in row) for row in rows]
+
+
+class Profile:
+    """Команды одного запроса (или блока capture)"""
+
+    def __init__(self):
+        self.shapes = {}
+        self.slow = []
+        self.count = 0
+        self.seconds = 0.0
+
+    def record(self, statement, duration):
+        shape = normalize(statement)
+        entry = self.shapes.get(shape)
+        if entry is None:
+            entry = self.shapes[shape] = {'count': 0, 'seconds': 0.0, 'statement': statement}
+        entry['count'] += 1
+        entry['seconds'] += duration
+        self.count += 1
+        self.seconds += duration
+
+    def repeated(self, threshold=None):
+        """Формы, повторившиеся не меньше threshold раз, начиная с самых частых"""
+        threshold = threshold or REPEAT_THRESHOLD
+        found = [{'sql': shape, 'count': entry['count'], 'ms': round(entry['seconds'] * 1000, 2)}
+                 for shape, entry in self.shapes.items() if entry['count'] >= threshold]
+        return sorted(found, key=lambda item: item['count'], reverse=True)
+
+    def header(self, threshold=None):
+        return (f'queries={self.count}; time={self.seconds * 1000:.1f}ms; '
+                f'repeated={len(self.repeated(threshold))}; slow={len(self.slow)}')
+
+    def assert_no_repeats(self, threshold=None):
+        repeated = self.repeated(threshold)
+        if repeated:
+            details = '\n'.join(f"  {item['count']}x {item['sql']}" for item in repeated)
+            raise AssertionError(f'Повторяющиеся SQL-команды (похоже на N+1):\n{details}')
+
+    def assert_max_queries(self, limit):
+        if self.count > limit:
+            details = '\n'.join(f"  {entry['count']}x {shape}" for shape, entry in self.shapes.items())
+            raise AssertionError(f'{self.count} SQL-команд при допустимых {limit}:\n{details}')
+
+
+class SQLProfiler:
+    def __init__(self, enabled=SQL_PROFILE, repeat_threshold=REPEAT_THRESHOLD, slow_ms=SLOW_MS):
+        self.enabled = enabled
+        self.repeat_threshold = repeat_threshold
+        self.slow_ms = slow_ms
+        self._local = threading.local()
+        self._listening = False
+        self._listen_lock = threading.Lock()
+
+    def init_app(self, app):
+        app.extensions['sql_profiler'] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _listen(self):
+        with self._listen_lock:
+            if not self._listening:
+                event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+                self._listening = True
+
+    # --- Запросы ---
+
+    def _before_request(self):
+        # debug известен только после app.run(debug=True), поэтому проверяется здесь
+        if not (self.enabled or current_app.debug):
+            return
+        self._listen()
+        g.sql_profile = Profile()
+
+    def _after_request(self, response):
+        profile = g.pop('sql_profile', None)
+        if profile is None:
+            return response
+        response.headers[HEADER] = profile.header(self.repeat_threshold)
+
+        repeated = profile.repeated(self.repeat_threshold)
+        if repeated:
+            logger.warning('Повторяющиеся SQL-команды (похоже на N+1)', extra={
+                'endpoint': request.endpoint, 'path': request.path,
+                'queries': profile.count, 'repeated': repeated
+            })
+        for slow in profile.slow:
+            logger.warning('Медленная SQL-команда', extra={'endpoint': request.endpoint, 'path': request.path, **slow})
+        return response
+
+    # --- Блоки для проверочных скриптов ---
+
+    @contextmanager
+    def capture(self):
+        """Профиль всех команд текущего потока внутри блока (в том числе запросов тестового клиента)"""
+        self._listen()
+        profile = Profile()
+        stack = self._captures()
+        stack.append(profile)
+        try:
+            yield profile
+        finally:
+            stack.remove(profile)
+
+    def _captures(self):
+        stack = getattr(self._local, 'captures', None)
+        if stack is None:
+            stack = self._local.captures = []
+        return stack
+
+    def _profiles(self):
+        profiles = list(self._captures())
+        if has_request_context():
+            profile = g.get('sql_profile')
+            if profile is not None:
+                profiles.append(profile)
+        return profiles
+
+    # --- События SQLAlchemy ---
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self._profiles():
+            conn.info.setdefault('profiler_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profiles = self._profiles()
+        starts = conn.info.get('profiler_query_start')
+        if not profiles or not starts:
+            return
+        duration = time.perf_counter() - starts.pop()
+        for profile in profiles:
+            profile.record(statement, duration)
+
+        if duration * 1000 >= self.slow_ms and not executemany and statement.lstrip()[:6].upper() == 'SELECT':
+            slow = {
+                'sql': statement,
+                'ms': round(duration * 1000, 2),
+                'plan': explain(cursor, conn.dialect, statement, parameters)
+            }
+            for profile in profiles:
+                profile.slow.append(slow)
+
+
+profiler = SQLProfiler()
@@ -0,0 +1,376 @@
+"""
+Индекс автодополнения для /api/search/suggestions.
+
+Держит в памяти процесса одобренные компании, заголовки статей, категории
+и города. Поиск - одна выборка из словаря префиксов слов; если точных
+совпадений мало, добираем записи со словами, похожими по триграммам
+(опечатки).
+
+Индекс строится при первом запросе и поддерживается инкрементально:
+изменения своего процесса приходят через backend.changes сразу после
+коммита, изменения других воркеров подтягиваются по updated_at раз в
+SYNC_SECONDS, полная пересборка (в т.ч. для удалений) - раз в REBUILD_SECONDS.
+Синхронизация и пересборка идут в фоновом потоке и читают базу без
+блокировки: новый индекс собирается отдельно и подменяет старый под
+блокировкой, а запросы до этого момента отвечают по старому. Изменения,
+закоммиченные за время чтения, применяются к результату еще раз.
+"""
+
+import heapq
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import current_app
+from backend.models import db, Company, Article, User
+from backend import changes
+from backend.log import get_logger
+
+logger = get_logger(__name__)
+
+SYNC_SECONDS = 30
+REBUILD_SECONDS = 600
+MAX_PREFIX = 12
+FUZZY_THRESHOLD = 0.6
+FUZZY_MIN_LENGTH = 4
+
+DEFAULT_LIMITS = {'company': 5, 'article': 5, 'category': 3, 'city': 3}
+TYPE_ORDER = ['company', 'article', 'category', 'city']
+
+
+def normalize(value):
+    return (value or '').lower().replace('ё', 'е').strip()
+
+
+def _words(value):
+    return re.findall(r'\w+', normalize(value))
+
+
+def _trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _IndexData:
+    """Структуры одного индекса; потокобезопасность обеспечивает SuggestionIndex"""
+
+    def __init__(self):
+        self._companies = {}
+        self._articles = {}
+        self._user_names = {}
+        self._counts = {'category': Counter(), 'city': Counter()}
+        self._entries = {}
+        self._lengths = {}
+        self._prefixes = {kind: defaultdict(set) for kind in TYPE_ORDER}
+        self._word_entries = defaultdict(set)
+        self._trigram_index = defaultdict(set)
+
+    # --- Записи индекса ---
+
+    def _add_entry(self, key, text, payload):
+        self._entries[key] = (text, payload)
+        self._lengths[key] = len(text)
+        prefixes = self._prefixes[key[0]]
+        for word in _words(text):
+            for i in range(1, min(len(word), MAX_PREFIX) + 1):
+                prefixes[word[:i]].add(key)
+            if word not in self._word_entries:
+                for trigram in _trigrams(word):
+                    self._trigram_index[trigram].add(word)
+            self._word_entries[word].add(key)
+
+    def _remove_entry(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        del self._lengths[key]
+        prefixes = self._prefixes[key[0]]
+        for word in _words(entry[0]):
+            for i in range(1, min(len(word), MAX_PREFIX) + 1):
+                bucket = prefixes.get(word[:i])
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del prefixes[word[:i]]
+            entries = self._word_entries.get(word)
+            if entries is None:
+                continue
+            entries.discard(key)
+            if entries:
+                continue
+            del self._word_entries[word]
+            for trigram in _trigrams(word):
+                bucket = self._trigram_index.get(trigram)
+                if bucket is not None:
+                    bucket.discard(word)
+                    if not bucket:
+                        del self._trigram_index[trigram]
+
+    def _count(self, kind, value, delta):
+        if not value:
+            return
+        counter = self._counts[kind]
+        before = counter[value]
+        after = before + delta
+        if after <= 0:
+            counter.pop(value, None)
+            self._remove_entry((kind, value))
+        else:
+            counter[value] = after
+            if before == 0:
+                self._add_entry((kind, value), value, {})
+
+    def _upsert_company(self, company_id, name, category, city, status):
+        self._remove_company(company_id)
+        if status != 'approved':
+            return
+        self._companies[company_id] = (category, city)
+        self._add_entry(('company', company_id), name, {'category': category, 'city': city})
+        self._count('category', category, 1)
+        self._count('city', city, 1)
+
+    def _remove_company(self, company_id):
+        existing = self._companies.pop(company_id, None)
+        if existing is None:
+            return
+        self._remove_entry(('company', company_id))
+        self._count('category', existing[0], -1)
+        self._count('city', existing[1], -1)
+
+    def _upsert_article(self, article_id, title, author_id, author, status):
+        self._remove_entry(('article', article_id))
+        self._articles.pop(article_id, None)
+        if status != 'approved':
+            return
+        self._articles[article_id] = author_id
+        self._add_entry(('article', article_id), title, {'author': author})
+
+    def _article_author(self, author_id, anonymous_author):
+        if author_id:
+            return self._user_names.get(author_id)
+        return anonymous_author
+
+    def apply_rows(self, companies, articles):
+        """Записи из базы (см. _query); возвращает наибольший updated_at среди них"""
+        seen = []
+        for company_id, name, category, city, status, updated_at in companies:
+            self._upsert_company(company_id, name, category, city, status)
+            seen.append(updated_at)
+        for article_id, title, status, author_id, anonymous_author, updated_at, user_name in articles:
+            if author_id and user_name:
+                self._user_names[author_id] = user_name
+            self._upsert_article(article_id, title, author_id, user_name if author_id else anonymous_author, status)
+            seen.append(updated_at)
+        return max((value for value in seen if value is not None), default=None)
+
+    def apply_changes(self, change_list):
+        """Изменения из backend.changes; True, если не хватило имени автора"""
+        stale = False
+        for change in change_list:
+            values = change.values
+            if change.model is Company:
+                if change.action == 'delete':
+                    self._remove_company(change.id)
+                elif change.changed('name', 'category', 'city', 'status'):
+                    self._upsert_company(change.id, values['name'], values['category'],
+                                         values['city'], values['status'])
+            elif change.model is Article:
+                if change.action == 'delete':
+                    self._upsert_article(change.id, None, None, None, 'deleted')
+                elif change.changed('title', 'status', 'author_id', 'anonymous_author'):
+                    author = self._article_author(values['author_id'], values['anonymous_author'])
+                    if values['author_id'] and author is None:
+                        # Имени автора нет в кэше - подтянем при ближайшей синхронизации
+                        stale = True
+                    self._upsert_article(change.id, values['title'], values['author_id'],
+                                         author, values['status'])
+            elif change.model is User and change.action == 'update' and change.changed('name'):
+                self._user_names[change.id] = values['name']
+                for article_id, author_id in self._articles.items():
+                    if author_id == change.id:
+                        self._entries[('article', article_id)][1]['author'] = values['name']
+        return stale
+
+
+def _query(since=None):
+    """Строки компаний и статей: одобренные или измененные с момента since"""
+    companies = db.session.query(
+        Company.id, Company.name, Company.category, Company.city, Company.status, Company.updated_at
+    )
+    articles = db.session.query(
+        Article.id, Article.title, Article.status, Article.author_id,
+        Article.anonymous_author, Article.updated_at, User.name
+    ).outerjoin(User, User.id == Article.author_id)
+
+    if since is None:
+        companies = companies.filter(Company.status == 'approved')
+        articles = articles.filter(Article.status == 'approved')
+    else:
+        # Индексы ix_company_updated_at и ix_article_updated_at
+        companies = companies.filter(Company.updated_at >= since)
+        articles = articles.filter(Article.updated_at >= since)
+    return companies.all(), articles.all()
+
+
+class SuggestionIndex:
+    def __init__(self):
+        # _lock защищает индекс и короток; _refresh_lock - один читатель базы
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._data = _IndexData()
+        self._built_at = 0
+        self._synced_at = 0
+        self._watermark = None
+        self._stale = False
+        self._rebuild = False
+        # Изменения, закоммиченные во время чтения базы (None - чтения нет)
+        self._pending = None
+        self._thread = None
+
+    def _refresh(self, full):
+        """Читает базу без блокировки индекса, затем подменяет или дополняет его.
+
+        Вызывается под _refresh_lock.
+        """
+        with self._lock:
+            self._pending = []
+            since = None if full else self._watermark
+        try:
+            companies, articles = _query(since)
+            if full:
+                data = _IndexData()
+                watermark = data.apply_rows(companies, articles)
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            pending, self._pending = self._pending, None
+            if full:
+                self._data = data
+                self._built_at = time.monotonic()
+                self._rebuild = False
+            else:
+                watermark = self._data.apply_rows(companies, articles)
+                watermark = max(filter(None, (self._watermark, watermark)), default=None)
+            self._watermark = watermark
+            # Строки могли быть прочитаны до этих коммитов - применяем их поверх
+            stale = False
+            for change_list in pending:
+                stale = self._data.apply_changes(change_list) or stale
+            self._synced_at = time.monotonic()
+            self._stale = stale
+
+    def _due(self):
+        """Нужна ли пересборка (True), синхронизация (False) или ничего (None)"""
+        now = time.monotonic()
+        if self._rebuild or now - self._built_at > REBUILD_SECONDS:
+            return True
+        if self._stale or now - self._synced_at > SYNC_SECONDS:
+            return False
+        return None
+
+    def _ensure_fresh(self):
+        if not self._built_at:
+            # Первые запросы ждут построения: отвечать пока не по чему
+            with self._refresh_lock:
+                if not self._built_at:
+                    self._refresh(full=True)
+            return
+
+        with self._lock:
+            full = self._due()
+            if full is None or (self._thread is not None and self._thread.is_alive()):
+                return
+            app = current_app._get_current_object()
+            self._thread = threading.Thread(target=self._refresh_in_background, args=(app, full),
+                                            name='suggestions-refresh', daemon=True)
+            self._thread.start()
+
+    def _refresh_in_background(self, app, full):
+        try:
+            with self._refresh_lock, app.app_context():
+                self._refresh(full)
+        except Exception as e:
+            logger.warning('Не удалось обновить индекс подсказок', extra={'error': str(e)})
+
+    def invalidate(self):
+        """Полная пересборка (в фоне) при следующем запросе"""
+        with self._lock:
+            self._rebuild = True
+
+    # --- Изменения из backend.changes ---
+
+    def apply_changes(self, change_list):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(change_list)
+            if self._built_at and self._data.apply_changes(change_list):
+                self._stale = True
+
+    # --- Поиск ---
+
+    def lookup(self, query, limits=None, limit=10):
+        """Подсказки для строки query с лимитами по типам"""
+        limits = {**DEFAULT_LIMITS, **(limits or {})}
+        words = _words(query)
+        if not words:
+            return []
+
+        self._ensure_fresh()
+        with self._lock:
+            data = self._data
+
+            # Совпадения по префиксам слов, короткие тексты выше
+            found = {}
+            missing = {}
+            for kind in TYPE_ORDER:
+                wanted = max(limits.get(kind, 0), 0)
+                keys = set()
+                if wanted:
+                    prefixes = data._prefixes[kind]
+                    keys = None
+                    for word in words:
+                        bucket = prefixes.get(word[:MAX_PREFIX], set())
+                        if len(word) > MAX_PREFIX:
+                            bucket = {key for key in bucket
+                                      if any(w.startswith(word) for w in _words(data._entries[key][0]))}
+                        keys = bucket if keys is None else keys & bucket
+                found[kind] = heapq.nsmallest(wanted, keys, key=data._lengths.__getitem__)
+                missing[kind] = wanted - len(found[kind])
+
+            # Опечатки: добираем записи со словами, похожими по триграммам на последнее слово
+            last = words[-1]
+            if len(last) >= FUZZY_MIN_LENGTH and any(count > 0 for count in missing.values()):
+                query_trigrams = _trigrams(last)
+                scores = Counter()
+                for trigram in query_trigrams:
+                    scores.update(data._trigram_index.get(trigram, ()))
+                required = FUZZY_THRESHOLD * len(query_trigrams)
+                similar = sorted((-shared, word) for word, shared in scores.items() if shared >= required)
+
+                seen = {key for keys in found.values() for key in keys}
+                for _, word in similar:
+                    wanted = sum(count for count in missing.values() if count > 0) + len(seen)
+                    for key in heapq.nsmallest(wanted, data._word_entries[word], key=data._lengths.__getitem__):
+                        kind = key[0]
+                        if missing[kind] > 0 and key not in seen:
+                            seen.add(key)
+                            missing[kind] -= 1
+                            found[kind].append(key)
+                    if not any(count > 0 for count in missing.values()):
+                        break
+
+            suggestions = []
+            for kind in TYPE_ORDER:
+                for key in found[kind]:
+                    text, payload = data._entries[key]
+                    suggestions.append({'text': text, 'type': kind, **payload})
+
+        return suggestions[:limit]
+
+
+index = SuggestionIndex()
+changes.subscribe(index.apply_changes)
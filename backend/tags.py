@@ -0,0 +1,154 @@
+"""
+Нормализованный индекс тегов статей.
+
+Article.tags остается JSON-массивом для отдачи клиенту, а для списка тегов
+и фильтрации по тегу ведутся таблицы tag (с количеством одобренных статей)
+и article_tag. Роуты вызывают article_tags_changed() в той же транзакции,
+что и изменение статьи, - так же, как агрегаты в backend.aggregates.
+"""
+
+import json
+
+from sqlalchemy import delete, func, insert, select, update
+from backend.models import db, Article, Tag, article_tag
+
+MAX_TAG_LENGTH = 100
+
+
+def parse_tags(raw):
+    """Теги из JSON Article.tags без пустых значений и повторов"""
+    if not raw:
+        return []
+    try:
+        values = json.loads(raw) if isinstance(raw, str) else raw
+    except ValueError:
+        return []
+    if not isinstance(values, list):
+        return []
+
+    names = []
+    for value in values:
+        name = str(value).strip()[:MAX_TAG_LENGTH] if value is not None else ''
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def insert_ignore(table, rows, index_elements):
+    """INSERT, пропускающий строки, которые нарушают уникальность"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        db.session.execute(insert(table), rows)
+        return
+    db.session.execute(dialect_insert(table).on_conflict_do_nothing(index_elements=index_elements), rows)
+
+
+def _tag_ids(names, create=True):
+    """Словарь имя -> id тега; недостающие теги создаются"""
+    names = set(names)
+    if not names:
+        return {}
+
+    ids = dict(db.session.query(Tag.name, Tag.id).filter(Tag.name.in_(names)).all())
+    missing = names - set(ids)
+    if missing and create:
+        # Параллельная транзакция могла создать тот же тег - конфликт пропускаем
+        insert_ignore(Tag.__table__, [{'name': name, 'article_count': 0} for name in missing], ['name'])
+        ids.update(db.session.query(Tag.name, Tag.id).filter(Tag.name.in_(missing)).all())
+    return ids
+
+
+def _shift_counts(tag_ids, delta):
+    if not tag_ids:
+        return
+    db.session.execute(
+        update(Tag)
+        .where(Tag.id.in_(tag_ids))
+        .values(article_count=func.coalesce(Tag.article_count, 0) + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def article_tags_changed(article_id, old_tags=None, old_status=None, new_tags=None, new_status=None):
+    """Синхронизирует связи и счетчики тегов при изменении статьи.
+
+    old_*/new_* - значения Article.tags и Article.status до и после; для
+    новой статьи old_* не передаются, для удаленной - new_*.
+    """
+    old_names = set(parse_tags(old_tags))
+    new_names = set(parse_tags(new_tags))
+    ids = _tag_ids(old_names | new_names)
+
+    removed = [ids[name] for name in old_names - new_names if name in ids]
+    if removed:
+        db.session.execute(
+            delete(article_tag).where(article_tag.c.article_id == article_id, article_tag.c.tag_id.in_(removed))
+        )
+    added = [ids[name] for name in new_names - old_names]
+    if added:
+        insert_ignore(article_tag, [{'article_id': article_id, 'tag_id': tag_id} for tag_id in added],
+                       ['article_id', 'tag_id'])
+
+    # Счетчики учитывают только одобренные статьи
+    old_counted = old_names if old_status == 'approved' else set()
+    new_counted = new_names if new_status == 'approved' else set()
+    _shift_counts([ids[name] for name in new_counted - old_counted], 1)
+    _shift_counts([ids[name] for name in old_counted - new_counted if name in ids], -1)
+
+
+def articles_with_tag(name):
+    """Подзапрос id статей с тегом name (для Article.id.in_(...))"""
+    return (
+        select(article_tag.c.article_id)
+        .join(Tag, Tag.id == article_tag.c.tag_id)
+        .where(Tag.name == name)
+    )
+
+
+def rebuild_tag_index(batch_size=500):
+    """Заново заполняет article_tag по Article.tags пачками и пересчитывает счетчики.
+
+    Возвращает число обработанных статей.
+    """
+    processed = 0
+    last_id = 0
+
+    while True:
+        rows = (db.session.query(Article.id, Article.tags)
+                .filter(Article.id > last_id)
+                .order_by(Article.id)
+                .limit(batch_size)
+                .all())
+        if not rows:
+            break
+
+        names = {article_id: parse_tags(raw) for article_id, raw in rows}
+        ids = _tag_ids(name for article_names in names.values() for name in article_names)
+
+        db.session.execute(delete(article_tag).where(article_tag.c.article_id.in_(list(names))))
+        links = [{'article_id': article_id, 'tag_id': ids[name]}
+                 for article_id, article_names in names.items() for name in article_names]
+        if links:
+            db.session.execute(insert(article_tag), links)
+        db.session.commit()
+
+        processed += len(rows)
+        last_id = rows[-1][0]
+
+    # Связи удаленных статей
+    db.session.execute(delete(article_tag).where(article_tag.c.article_id.not_in(select(Article.id))))
+
+    approved_count = (
+        select(func.count())
+        .select_from(article_tag.join(Article, Article.id == article_tag.c.article_id))
+        .where(article_tag.c.tag_id == Tag.id, Article.status == 'approved')
+        .scalar_subquery()
+    )
+    db.session.execute(update(Tag).values(article_count=approved_count).execution_options(synchronize_session=False))
+    db.session.commit()
+
+    return processed
@@ -0,0 +1,379 @@
+"""
+Реестр загруженных файлов (таблица upload) и сборка мусора.
+
+При загрузке файл записывается в реестр с размером, хэшем и размерами
+изображения. Ссылки на файлы хранятся в Review.photos, Comment.photos,
+Article.cover_image и User.avatar; при каждом flush, который добавляет,
+меняет или удаляет эти поля, upload.ref_count сдвигается на разницу в той
+же транзакции. Файл без ссылок получает orphaned_at, и через
+UPLOAD_GC_GRACE_HOURS (по умолчанию 24 часа - время на то, чтобы
+прикрепить только что загруженное фото) сборщик мусора удаляет его вместе
+с копиями. Сборщик работает пачками: flask --app backend.app gc-uploads.
+
+Файл по хэшу может загрузить снова другой пользователь, пока сборщик его
+удаляет. Поэтому сборщик сначала переносит файл и копии в .tmp, затем
+удаляет строку реестра с повторной проверкой условий, и только для
+удаленных строк стирает перенесенные файлы; остальные возвращает на место.
+Повторная загрузка обновляет время изменения файла (store_upload), и файл,
+тронутый за последние REUSE_LEASE, сборщик не трогает; если же файл уже
+перенесен, загрузка записывает его заново.
+"""
+
+import json
+import os
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from PIL import Image
+from sqlalchemy import case, delete, event, func, inspect, select, update
+from sqlalchemy.orm import Session
+from backend.models import db, Upload, Review, Comment, Article, User
+from backend.tags import insert_ignore
+from backend.images import VARIANTS, variant_name, original_name
+from backend.uploads import iter_files, TMP_DIR
+from backend.log import get_logger
+
+logger = get_logger(__name__)
+
+GRACE_PERIOD = timedelta(hours=float(os.environ.get('UPLOAD_GC_GRACE_HOURS', 24)))
+# Сколько после повторной загрузки файл считается занятым: с запасом больше
+# времени запроса от store_upload до коммита register
+REUSE_LEASE = timedelta(minutes=10)
+
+# Колонки, которые ссылаются на загруженные файлы
+REFERENCE_COLUMNS = {
+    Review: 'photos',
+    Comment: 'photos',
+    Article: 'cover_image',
+    User: 'avatar'
+}
+
+URL_PREFIXES = ('/static/uploads/', '/uploads/')
+
+
+def upload_name(reference):
+    """Имя файла в хранилище по ссылке (имя или адрес) или None для внешних адресов"""
+    if not isinstance(reference, str) or not reference:
+        return None
+    for prefix in URL_PREFIXES:
+        if reference.startswith(prefix):
+            return reference[len(prefix):]
+    if reference.startswith('/') or '://' in reference:
+        return None
+    return reference
+
+
+def referenced_files(model, value):
+    """Множество файлов, на которые ссылается значение колонки"""
+    if not value:
+        return set()
+    if model in (Review, Comment):
+        try:
+            references = json.loads(value)
+        except (TypeError, ValueError):
+            return set()
+        if not isinstance(references, list):
+            return set()
+    else:
+        references = [value]
+    return {name for name in map(upload_name, references) if name}
+
+
+# --- Регистрация загрузок ---
+
+def _image_size(path):
+    # Читается только заголовок файла
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except Exception:
+        return None, None
+
+
+def _content_hash(filename):
+    # В хранилище по хэшу (ab/cd/<sha256>.jpg) имя файла и есть SHA-256 содержимого
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return stem if '/' in filename and len(stem) == 64 else None
+
+
+def register(folder, filename):
+    """Записывает файл в реестр (без коммита). Повторная загрузка продлевает срок сироты"""
+    path = os.path.join(folder, filename)
+    width, height = _image_size(path)
+    now = datetime.utcnow()
+    # Сначала UPDATE: он ждет DELETE сборщика над той же строкой, и после
+    # его коммита INSERT ниже создает строку заново, а не теряет загрузку
+    db.session.execute(
+        update(Upload)
+        .where(Upload.filename == filename, Upload.ref_count <= 0)
+        .values(orphaned_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    insert_ignore(Upload.__table__, [{
+        'filename': filename,
+        'sha256': _content_hash(filename),
+        'size': os.path.getsize(path),
+        'width': width,
+        'height': height,
+        'ref_count': 0,
+        'orphaned_at': now,
+        'created_at': now
+    }], ['filename'])
+
+
+# --- Счетчики ссылок ---
+
+def _shift_refs(connection, deltas):
+    """Сдвигает ref_count файлов; одна команда на каждое значение дельты"""
+    by_delta = {}
+    for filename, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(filename)
+
+    now = datetime.utcnow()
+    for delta, filenames in by_delta.items():
+        new_count = Upload.ref_count + delta
+        connection.execute(
+            update(Upload.__table__)
+            .where(Upload.filename.in_(filenames))
+            .values(
+                ref_count=new_count,
+                orphaned_at=case((new_count > 0, None), else_=func.coalesce(Upload.orphaned_at, now))
+            )
+        )
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_references(session, flush_context):
+    deltas = Counter()
+    for objects, sign in ((session.new, 1), (session.deleted, -1), (session.dirty, 0)):
+        for obj in objects:
+            key = REFERENCE_COLUMNS.get(type(obj))
+            if key is None:
+                continue
+            state = inspect(obj)
+            if sign:
+                for filename in referenced_files(type(obj), state.dict.get(key)):
+                    deltas[filename] += sign
+                continue
+            history = state.attrs[key].history
+            if not history.has_changes():
+                continue
+            old = referenced_files(type(obj), history.deleted[0] if history.deleted else None)
+            new = referenced_files(type(obj), history.added[0] if history.added else None)
+            for filename in new - old:
+                deltas[filename] += 1
+            for filename in old - new:
+                deltas[filename] -= 1
+
+    if any(deltas.values()):
+        _shift_refs(session.connection(), deltas)
+
+
+def release(model, query):
+    """Снимает ссылки записей перед массовым удалением (query.delete() минует flush)"""
+    key = REFERENCE_COLUMNS[model]
+    column = getattr(model, key)
+    deltas = Counter()
+    for (value,) in query.filter(column.isnot(None)).with_entities(column):
+        for filename in referenced_files(model, value):
+            deltas[filename] -= 1
+    if deltas:
+        _shift_refs(db.session.connection(), deltas)
+
+
+# --- Сборка мусора ---
+
+def _file_names(filename):
+    return [filename] + [variant_name(filename, size, webp=webp) for size in VARIANTS for webp in (False, True)]
+
+
+def _bury(folder, filename, leased_since):
+    """Переносит файл и копии в .tmp. Возвращает [(путь, перенесенный путь)]
+    или None, если файл недавно загружали снова - тогда он остается на месте"""
+    tmp_dir = os.path.join(folder, TMP_DIR)
+    os.makedirs(tmp_dir, exist_ok=True)
+    buried = []
+    for name in _file_names(filename):
+        path = os.path.join(folder, name)
+        tombstone = os.path.join(tmp_dir, f'gc-{uuid.uuid4().hex}')
+        try:
+            os.rename(path, tombstone)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            logger.warning('Не удалось удалить файл', extra={'upload': name, 'error': str(e)})
+            continue
+        buried.append((path, tombstone))
+        # Время изменения проверяется после переноса: загрузка, успевшая
+        # тронуть файл до него, здесь видна, а после него - файла не найдет
+        if name == filename and os.stat(tombstone).st_mtime >= leased_since:
+            _restore(buried)
+            return None
+    return buried
+
+
+def _restore(buried):
+    for path, tombstone in buried:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tombstone, path)
+        except OSError as e:
+            logger.warning('Не удалось вернуть файл', extra={'upload': path, 'error': str(e)})
+
+
+def _purge(folder, filename, buried):
+    removed = 0
+    for _, tombstone in buried:
+        try:
+            removed += os.path.getsize(tombstone)
+            os.remove(tombstone)
+        except OSError as e:
+            logger.warning('Не удалось удалить файл', extra={'upload': tombstone, 'error': str(e)})
+
+    # Пустые каталоги шардов (ab/cd) больше не нужны
+    directory = os.path.dirname(os.path.join(folder, filename))
+    while os.path.abspath(directory) != os.path.abspath(folder):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        directory = os.path.dirname(directory)
+    return removed
+
+
+def collect_garbage(folder, batch_size=100, max_batches=None, grace_period=GRACE_PERIOD):
+    """Удаляет файлы-сироты пачками. Возвращает (количество файлов, освобождено байт)"""
+    cutoff = datetime.utcnow() - grace_period
+    removed_files = 0
+    removed_bytes = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        rows = db.session.execute(
+            select(Upload.id, Upload.filename)
+            .where(Upload.ref_count <= 0, Upload.orphaned_at < cutoff)
+            .order_by(Upload.orphaned_at)
+            .limit(batch_size)
+        ).all()
+        db.session.commit()
+        if not rows:
+            break
+
+        leased_since = time.time() - REUSE_LEASE.total_seconds()
+        buried = {}
+        for upload_id, filename in rows:
+            files = _bury(folder, filename, leased_since)
+            if files is not None:
+                buried[upload_id] = (filename, files)
+
+        deleted = set()
+        try:
+            if buried:
+                # Условие повторяется: за это время на файл могли сослаться или загрузить его снова
+                deleted = set(db.session.scalars(
+                    delete(Upload)
+                    .where(Upload.id.in_(buried), Upload.ref_count <= 0, Upload.orphaned_at < cutoff)
+                    .returning(Upload.id)
+                    .execution_options(synchronize_session=False)
+                ))
+                db.session.commit()
+        finally:
+            for upload_id, (filename, files) in buried.items():
+                if upload_id in deleted:
+                    removed_bytes += _purge(folder, filename, files)
+                else:
+                    _restore(files)
+
+        removed_files += len(deleted)
+        batches += 1
+        if len(rows) < batch_size:
+            break
+
+    return removed_files, removed_bytes
+
+
+def summary():
+    """Итоги по реестру одним запросом"""
+    orphan = Upload.ref_count <= 0
+    row = db.session.execute(select(
+        func.count(Upload.id),
+        func.coalesce(func.sum(Upload.size), 0),
+        func.coalesce(func.sum(case((orphan, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((orphan, Upload.size), else_=0)), 0)
+    )).one()
+    return {
+        'file_count': row[0],
+        'total_size': int(row[1]),
+        'orphan_count': int(row[2]),
+        'orphan_size': int(row[3])
+    }
+
+
+# --- Пересборка реестра ---
+
+def rebuild_registry(folder, batch_size=500):
+    """Регистрирует файлы с диска, которых нет в реестре, и пересчитывает ссылки.
+
+    Возвращает (добавлено файлов, исправлено счетчиков).
+    """
+    known = set(db.session.scalars(select(Upload.filename)))
+    added = 0
+    batch = []
+    for filename in iter_files(folder):
+        if filename in known or original_name(filename) or filename.endswith('.tmp'):
+            continue
+        batch.append(filename)
+        if len(batch) >= batch_size:
+            added += _register_batch(folder, batch)
+            batch = []
+    if batch:
+        added += _register_batch(folder, batch)
+
+    counts = Counter()
+    for model, key in REFERENCE_COLUMNS.items():
+        column = getattr(model, key)
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(model.id, column)
+                .where(model.id > last_id, column.isnot(None))
+                .order_by(model.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            for _, value in rows:
+                counts.update(referenced_files(model, value))
+            last_id = rows[-1][0]
+
+    fixed = 0
+    now = datetime.utcnow()
+    last_id = 0
+    while True:
+        uploads = db.session.scalars(
+            select(Upload).where(Upload.id > last_id).order_by(Upload.id).limit(batch_size)
+        ).all()
+        if not uploads:
+            break
+        for upload in uploads:
+            expected = counts.get(upload.filename, 0)
+            if upload.ref_count != expected:
+                upload.ref_count = expected
+                fixed += 1
+            if expected > 0:
+                upload.orphaned_at = None
+            elif upload.orphaned_at is None:
+                upload.orphaned_at = now
+        last_id = uploads[-1].id
+        db.session.commit()
+    return added, fixed
+
+
+def _register_batch(folder, filenames):
+    for filename in filenames:
+        register(folder, filename)
+    db.session.commit()
+    return len(filenames)
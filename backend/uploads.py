@@ -0,0 +1,152 @@
+"""
+Прием загруженных файлов.
+
+Werkzeug разбирает multipart-форму до кода роута и складывает каждый файл
+во временный (до SPOOL_SIZE - в памяти). Роут с лимитом на файл задает
+request.max_file_size (UploadRequest), и разбор обрывается на первом
+слишком большом файле, а не после чтения всего тела. Затем store_upload
+читает файл кусками по CHUNK_SIZE: каждый кусок сразу пишется во временный
+файл хранилища и добавляется в SHA-256, а лимит размера проверяется еще раз. Если задан transform (для изображений -
+images.strip_metadata), куски проходят через него, и хэш считается уже по
+итоговым байтам: файл по адресу из хэша никогда не перезаписывается.
+Готовый файл переносится (os.replace) по адресу из хэша содержимого:
+ab/cd/abcd....jpg. Одинаковые файлы хранятся один раз, повторная загрузка
+только возвращает имя уже сохраненного.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+
+from flask import Request
+
+CHUNK_SIZE = 64 * 1024
+TMP_DIR = '.tmp'
+# Файл формы до этого размера Werkzeug держит в памяти, дальше - на диске
+SPOOL_SIZE = 500 * 1024
+
+# Имя файла из хранилища по хэшу: ab/cd/<sha256>.<расширение>
+CONTENT_ADDRESSED = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.')
+
+
+class UploadTooLarge(Exception):
+    """Файл больше допустимого размера"""
+
+
+class _LimitedFile:
+    """Файл формы, который обрывает разбор запроса, как только превысит лимит"""
+
+    def __init__(self, max_size):
+        self._file = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE, mode='rb+')
+        self._max_size = max_size
+        self._size = 0
+
+    def write(self, data):
+        self._size += len(data)
+        if self._size > self._max_size:
+            raise UploadTooLarge(f'File size too large (max {self._max_size // (1024 * 1024)}MB)')
+        return self._file.write(data)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    """Запрос, у которого роут может ограничить размер каждого файла формы.
+
+    Werkzeug сохраняет файлы формы целиком еще до кода роута; с
+    max_file_size разбор прерывается UploadTooLarge на первом слишком
+    большом файле, не дочитывая тело запроса.
+    """
+
+    max_file_size = None
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.max_file_size is None:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        if content_length is not None and content_length > self.max_file_size:
+            raise UploadTooLarge(f'File size too large (max {self.max_file_size // (1024 * 1024)}MB)')
+        return _LimitedFile(self.max_file_size)
+
+
+def content_path(digest, extension):
+    """Имя файла в хранилище: два уровня каталогов по началу хэша"""
+    return f'{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest
+
+
+def store_upload(file, folder, max_size, transform=None):
+    """Сохраняет FileStorage в хранилище.
+
+    transform(read, расширение) возвращает куски итогового файла; правки
+    из его атрибута patches вносятся в записанный файл перед вычислением хэша.
+    Возвращает (имя файла относительно folder, создан ли новый файл).
+    """
+    extension = os.path.splitext(file.filename or '')[1].lower()
+    tmp_dir = os.path.join(folder, TMP_DIR)
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    received = 0
+
+    def read(size):
+        nonlocal received
+        chunk = file.stream.read(size)
+        received += len(chunk)
+        if received > max_size:
+            raise UploadTooLarge(f'File size too large (max {max_size // (1024 * 1024)}MB)')
+        return chunk
+
+    chunks = iter(lambda: read(CHUNK_SIZE), b'') if transform is None else transform(read, extension)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            for chunk in chunks:
+                digest.update(chunk)
+                tmp.write(chunk)
+            patches = getattr(chunks, 'patches', None)
+            for offset, data in patches or ():
+                tmp.seek(offset)
+                tmp.write(data)
+        if patches:
+            digest = _file_digest(tmp_path)
+
+        filename = content_path(digest.hexdigest(), extension)
+        path = os.path.join(folder, filename)
+        try:
+            # Продлеваем аренду: сборщик мусора не удаляет недавно загруженные снова файлы
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        else:
+            os.remove(tmp_path)
+            return filename, False
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+        return filename, True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def iter_files(folder):
+    """Имена всех файлов хранилища относительно folder (старые плоские и новые)"""
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if d != TMP_DIR)
+        relative = os.path.relpath(root, folder)
+        for name in sorted(files):
+            yield name if relative == '.' else f'{relative}/{name}'.replace(os.sep, '/')
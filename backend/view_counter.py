@@ -0,0 +1,140 @@
+"""
+Отложенная запись просмотров статей.
+
+GET статьи не пишет в базу: просмотр добавляется в счетчик в памяти
+процесса, а фоновый поток раз в VIEW_FLUSH_SECONDS (или раньше, когда
+накопилось VIEW_MAX_PENDING просмотров) записывает все накопленное одним
+UPDATE с CASE по id статьи. Каждый воркер gunicorn копит свои просмотры,
+но UPDATE прибавляет дельту (views = views + n), поэтому воркеры друг
+другу не мешают. При остановке процесса буфер сбрасывается через atexit;
+при аварийном падении теряется не больше одного интервала.
+"""
+
+import atexit
+import os
+import threading
+from collections import Counter
+
+from sqlalchemy import case, func, update
+from backend.models import db, Article
+from backend.log import get_logger
+
+logger = get_logger(__name__)
+
+FLUSH_SECONDS = float(os.environ.get('VIEW_FLUSH_SECONDS', 10))
+MAX_PENDING = int(os.environ.get('VIEW_MAX_PENDING', 1000))
+BATCH_SIZE = 500
+
+
+class ViewCounter:
+    def __init__(self, flush_seconds=FLUSH_SECONDS, max_pending=MAX_PENDING):
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = Counter()
+        self._total = 0
+        self._app = None
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        self._app = app
+        app.extensions['view_counter'] = self
+        atexit.register(self._flush_on_exit)
+
+    def record(self, article_id, count=1):
+        """Учитывает просмотр статьи (без обращения к базе)"""
+        with self._lock:
+            self._pending[article_id] += count
+            self._total += count
+            overflow = self._total >= self.max_pending
+        self._ensure_thread()
+        if overflow:
+            self._wake.set()
+
+    def pending(self, article_id):
+        """Просмотры статьи, еще не записанные в базу"""
+        with self._lock:
+            return self._pending.get(article_id, 0)
+
+    def status(self):
+        """Состояние фонового потока и буфера (для /api/health/ready)"""
+        if self._thread is None or self._pid != os.getpid():
+            # Поток запускается при первом просмотре
+            thread = 'idle'
+        else:
+            thread = 'running' if self._thread.is_alive() else 'dead'
+        with self._lock:
+            return {'thread': thread, 'pending': self._total}
+
+    def _ensure_thread(self):
+        # После fork (воркеры gunicorn) поток родителя не наследуется
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='view-counter', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning('Не удалось записать просмотры статей', extra={'error': str(e)})
+
+    def _flush_on_exit(self):
+        try:
+            flushed = self.flush()
+            if flushed:
+                logger.info('Просмотры статей записаны при остановке', extra={'views': flushed})
+        except Exception as e:
+            logger.warning('Просмотры статей при остановке не записаны', extra={'error': str(e)})
+
+    def flush(self):
+        """Записывает накопленные просмотры в базу, возвращает их количество"""
+        if self._app is None:
+            return 0
+
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, Counter()
+                self._total = 0
+            if not batch:
+                return 0
+
+            try:
+                with self._app.app_context():
+                    ids = list(batch)
+                    for start in range(0, len(ids), BATCH_SIZE):
+                        chunk = ids[start:start + BATCH_SIZE]
+                        db.session.execute(
+                            update(Article)
+                            .where(Article.id.in_(chunk))
+                            .values(
+                                views=func.coalesce(Article.views, 0)
+                                + case({article_id: batch[article_id] for article_id in chunk},
+                                       value=Article.id, else_=0),
+                                # Просмотр не меняет статью - updated_at не трогаем
+                                updated_at=Article.updated_at
+                            )
+                            .execution_options(synchronize_session=False)
+                        )
+                    db.session.commit()
+            except Exception:
+                # Возвращаем просмотры в буфер до следующей попытки
+                with self._lock:
+                    self._pending.update(batch)
+                    self._total += sum(batch.values())
+                raise
+
+            return sum(batch.values())
+
+
+counter = ViewCounter()
@@ -20,6 +20,37 @@ class API {
         this.token = null;
         localStorage.removeItem('token');
         localStorage.removeItem('user');
+        this.clearResponseCache();
+    }
+
+    // Кэш GET-ответов с ETag: при повторном запросе отправляем If-None-Match
+    // и на ответ 304 берем тело из sessionStorage
+    getCachedResponse(url) {
+        try {
+            const entry = sessionStorage.getItem(`apiCache:${url}`);
+            return entry ? JSON.parse(entry) : null;
+        } catch (e) {
+            return null;
+        }
+    }
+
+    storeCachedResponse(url, etag, data) {
+        try {
+            sessionStorage.setItem(`apiCache:${url}`, JSON.stringify({ etag, data }));
+        } catch (e) {
+            // Хранилище переполнено - начинаем заново
+            this.clearResponseCache();
+        }
+    }
+
+    clearResponseCache() {
+        try {
+            Object.keys(sessionStorage)
+                .filter(key => key.startsWith('apiCache:'))
+                .forEach(key => sessionStorage.removeItem(key));
+        } catch (e) {
+            // sessionStorage недоступен
+        }
     }
 
     // Базовый метод для запросово
@@ -33,6 +64,12 @@ class API {
             ...options
         };
 
+        const method = (config.method || 'GET').toUpperCase();
+        const cached = method === 'GET' ? this.getCachedResponse(url) : null;
+        if (cached) {
+            config.headers['If-None-Match'] = cached.etag;
+        }
+
         if (this.token) {
             config.headers['Authorization'] = `Bearer ${this.token}`;
             console.log('Adding Authorization header:', `Bearer ${this.token}`);
@@ -44,6 +81,11 @@ class API {
             console.log('Making request to:', url, 'with config:', config);
             const response = await fetch(url, config);
             
+            // Данные не изменились - отдаем сохраненное тело
+            if (response.status === 304 && cached) {
+                return cached.data;
+            }
+            
             // Проверяем, что ответ получен
             if (!response.ok) {
                 let errorMessage = 'Ошибка сервера';
@@ -58,6 +100,11 @@ class API {
             }
 
             const data = await response.json();
+            
+            const etag = response.headers.get('ETag');
+            if (method === 'GET' && etag) {
+                this.storeCachedResponse(url, etag, data);
+            }
             return data;
         } catch (error) {
             console.error('API Error:', error);
@@ -132,6 +179,14 @@ class API {
         return this.request('/catalog/cities');
     }
 
+    async getFacets(filters = {}) {
+        const params = new URLSearchParams();
+        ['category', 'city', 'rating'].forEach(key => {
+            if (filters[key]) params.append(key, filters[key]);
+        });
+        return this.request(`/catalog/facets?${params}`);
+    }
+
     // Отзывы
     async createReview(data) {
         return this.request('/reviews', {
@@ -356,3 +411,28 @@ class API {
 
 // Создаем глобальный экземпляр API
 const api = new API();
+
+// Адрес уменьшенной копии загруженного изображения (thumb, medium, large).
+// photo - имя файла (ab/cd/<хэш>.jpg) или адрес /static/uploads/<имя>; внешние адреса не меняются.
+const UPLOADS_PREFIX = '/static/uploads/';
+
+function photoUrl(photo, size = 'medium', webp = false) {
+    if (!photo) return photo;
+    let filename = photo;
+    if (photo.startsWith(UPLOADS_PREFIX)) {
+        filename = photo.slice(UPLOADS_PREFIX.length);
+    } else if (photo.startsWith('/') || photo.includes('://')) {
+        return photo;
+    }
+    const extension = webp ? '.webp' : filename.slice(filename.lastIndexOf('.')).toLowerCase();
+    return `${UPLOADS_PREFIX}${filename}.${size}${extension}`;
+}
+
+// <picture> с WebP-копией и запасной копией в исходном формате
+function photoPicture(photo, size, attributes = '') {
+    const fallback = photoUrl(photo, size);
+    if (fallback === photo) {
+        return `<img src="${photo}" ${attributes}>`;
+    }
+    return `<picture><source srcset="${photoUrl(photo, size, true)}" type="image/webp"><img src="${fallback}" loading="lazy" ${attributes}></picture>`;
+}
@@ -69,7 +69,7 @@ function displayArticle(article) {
     const coverContainer = document.getElementById('articleCover');
     if (article.cover_image) {
         coverContainer.innerHTML = `
-            <img src="${article.cover_image}" class="img-fluid rounded" alt="${article.title}">
+            ${photoPicture(article.cover_image, 'large', `class="img-fluid rounded" alt="${article.title}"`)}
         `;
     } else {
         coverContainer.innerHTML = '';
@@ -156,7 +156,7 @@ function displayComments(comments) {
             ${comment.photos && comment.photos.length > 0 ? `
                 <div class="comment-photos mt-2">
                     ${comment.photos.map(photo => `
-                        <img src="/static/uploads/${photo}" alt="Фото комментария" class="comment-photo me-2 mb-2" style="max-width: 150px; max-height: 150px; object-fit: cover; border-radius: 8px; cursor: pointer;" onclick="openPhotoModal('/static/uploads/${photo}')">
+                        ${photoPicture(photo, 'thumb', `alt="Фото комментария" class="comment-photo me-2 mb-2" style="max-width: 150px; max-height: 150px; object-fit: cover; border-radius: 8px; cursor: pointer;" onclick="openPhotoModal('${photoUrl(photo, 'large')}')"`)}
                     `).join('')}
                 </div>
             ` : ''}
@@ -6,6 +6,7 @@ document.addEventListener('DOMContentLoaded', function() {
     loadCategories();
     loadCities();
     setupFilters();
+    loadFacets();
     loadCompanies();
     setupRatingInput();
 });
@@ -15,17 +16,11 @@ async function loadCategories() {
     try {
         const categories = await api.getCategories();
         const categorySelect = document.getElementById('categorySelect');
-        const categoryFilter = document.getElementById('categoryFilter');
         
         if (categorySelect) {
             categorySelect.innerHTML = '<option value="">Все категории</option>' + 
                 categories.map(cat => `<option value="${cat}">${cat}</option>`).join('');
         }
-        
-        if (categoryFilter) {
-            categoryFilter.innerHTML = '<option value="">Все категории</option>' + 
-                categories.map(cat => `<option value="${cat}">${cat}</option>`).join('');
-        }
     } catch (error) {
         console.error('Ошибка загрузки категорий:', error);
     }
@@ -36,19 +31,43 @@ async function loadCities() {
     try {
         const cities = await api.getCities();
         const citySelect = document.getElementById('citySelect');
-        const cityFilter = document.getElementById('cityFilter');
         
         if (citySelect) {
             citySelect.innerHTML = '<option value="">Все города</option>' + 
                 cities.map(city => `<option value="${city}">${city}</option>`).join('');
         }
+    } catch (error) {
+        console.error('Ошибка загрузки городов:', error);
+    }
+}
+
+// Загрузка фасетов: варианты фильтров с количеством компаний
+async function loadFacets() {
+    try {
+        const facets = await api.getFacets(currentFilters);
+        const categoryFilter = document.getElementById('categoryFilter');
+        const cityFilter = document.getElementById('cityFilter');
+        const ratingFilter = document.getElementById('ratingFilter');
+        
+        if (categoryFilter) {
+            categoryFilter.innerHTML = '<option value="">Все категории</option>' + 
+                facets.categories.map(cat => `<option value="${cat.value}">${cat.value} (${cat.count})</option>`).join('');
+            categoryFilter.value = currentFilters.category || '';
+        }
         
         if (cityFilter) {
             cityFilter.innerHTML = '<option value="">Все города</option>' + 
-                cities.map(city => `<option value="${city}">${city}</option>`).join('');
+                facets.cities.map(city => `<option value="${city.value}">${city.value} (${city.count})</option>`).join('');
+            cityFilter.value = currentFilters.city || '';
+        }
+        
+        if (ratingFilter) {
+            ratingFilter.innerHTML = '<option value="">Любой</option>' + 
+                facets.ratings.map(bucket => `<option value="${bucket.min}">${bucket.min}+ звезд (${bucket.count})</option>`).join('');
+            ratingFilter.value = currentFilters.rating || '';
         }
     } catch (error) {
-        console.error('Ошибка загрузки городов:', error);
+        console.error('Ошибка загрузки фасетов:', error);
     }
 }
 
@@ -92,6 +111,7 @@ function applyFilters() {
     };
     
     currentPage = 1;
+    loadFacets();
     loadCompanies();
     updateUrl(currentFilters);
 }
@@ -105,6 +125,7 @@ function clearFilters() {
     
     currentFilters = {};
     currentPage = 1;
+    loadFacets();
     loadCompanies();
     updateUrl({});
 }
@@ -307,7 +328,7 @@ function showCompanyModal(company) {
                             ${review.photos.length > 0 ? `
                                 <div class="review-photos">
                                     ${review.photos.map(photo => `
-                                        <img src="${photo}" class="review-photo" alt="Фото отзыва">
+                                        ${photoPicture(photo, 'thumb', 'class="review-photo" alt="Фото отзыва"')}
                                     `).join('')}
                                 </div>
                             ` : ''}
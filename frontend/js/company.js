@@ -158,7 +158,7 @@ function displayReviews(reviews) {
             ${review.photos && review.photos.length > 0 ? `
                 <div class="review-photos">
                     ${review.photos.map(photo => `
-                        <img src="/static/uploads/${photo}" class="review-photo" alt="Фото отзыва" onclick="openPhotoModal('/static/uploads/${photo}')">
+                        ${photoPicture(photo, 'thumb', `class="review-photo" alt="Фото отзыва" onclick="openPhotoModal('${photoUrl(photo, 'large')}')"`)}
                     `).join('')}
                 </div>
             ` : ''}
@@ -138,7 +138,7 @@ function displayArticles(articles) {
         <div class="col-md-6 col-lg-4 mb-4">
             <div class="card article-card h-100">
                 ${article.cover_image ? `
-                    <img src="${article.cover_image}" class="card-img-top article-cover" alt="${article.title}">
+                    ${photoPicture(article.cover_image, 'medium', `class="card-img-top article-cover" alt="${article.title}"`)}
                 ` : ''}
                 <div class="card-body">
                     <h5 class="card-title">${article.title}</h5>
@@ -255,7 +255,7 @@ function showArticleModal(article) {
         <div class="row">
             <div class="col-12">
                 ${article.cover_image ? `
-                    <img src="${article.cover_image}" class="img-fluid rounded mb-4" alt="${article.title}">
+                    ${photoPicture(article.cover_image, 'large', `class="img-fluid rounded mb-4" alt="${article.title}"`)}
                 ` : ''}
                 
                 <div class="d-flex justify-content-between align-items-center mb-4">
@@ -310,7 +310,7 @@ function showArticleModal(article) {
                             ${comment.photos && comment.photos.length > 0 ? `
                                 <div class="comment-photos mt-2">
                                     ${comment.photos.map(photo => `
-                                        <img src="/static/uploads/${photo}" alt="Фото комментария" class="comment-photo me-2 mb-2" style="max-width: 150px; max-height: 150px; object-fit: cover; border-radius: 8px; cursor: pointer;" onclick="openPhotoModal('/static/uploads/${photo}')">
+                                        ${photoPicture(photo, 'thumb', `alt="Фото комментария" class="comment-photo me-2 mb-2" style="max-width: 150px; max-height: 150px; object-fit: cover; border-radius: 8px; cursor: pointer;" onclick="openPhotoModal('${photoUrl(photo, 'large')}')"`)}
                                     `).join('')}
                                 </div>
                             ` : ''}
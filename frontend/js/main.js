@@ -125,7 +125,7 @@ function displayLatestArticles(articles) {
         <div class="col-md-4 mb-4">
             <div class="card article-card h-100">
                 ${article.cover_image ? `
-                    <img src="${article.cover_image}" class="card-img-top article-cover" alt="${article.title}">
+                    ${photoPicture(article.cover_image, 'medium', `class="card-img-top article-cover" alt="${article.title}"`)}
                 ` : ''}
                 <div class="card-body">
                     <h5 class="card-title">${article.title}</h5>
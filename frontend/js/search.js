@@ -218,7 +218,7 @@ function displaySearchResults(response) {
                     ${response.articles.map(article => `
                         <div class="col-md-6 col-lg-4 mb-3">
                             <div class="card h-100">
-                                ${article.cover_image ? `<img src="${article.cover_image}" class="card-img-top" style="height: 200px; object-fit: cover;">` : ''}
+                                ${article.cover_image ? `${photoPicture(article.cover_image, 'medium', 'class="card-img-top" style="height: 200px; object-fit: cover;"')}` : ''}
                                 <div class="card-body">
                                     <h6 class="card-title">${article.title}</h6>
                                     <p class="card-text">${article.excerpt}</p>
@@ -0,0 +1,69 @@
+"""
+Настройки gunicorn: gunicorn -c gunicorn.conf.py backend.app:app
+
+Модель конкурентности - GUNICORN_WORKER_CLASS:
+- gthread (по умолчанию) - GUNICORN_THREADS (4) потоков на процесс: пока
+  один запрос ждет базу или диск, остальные обрабатываются;
+- gevent - до GUNICORN_WORKER_CONNECTIONS (100) запросов на процесс в
+  гринлетах, ожидание сокетов psycopg кооперативное;
+- sync - один запрос на процесс.
+
+WEB_CONCURRENCY - число процессов (2). GUNICORN_TIMEOUT (30),
+GUNICORN_GRACEFUL_TIMEOUT (30), GUNICORN_KEEPALIVE (5),
+GUNICORN_MAX_REQUESTS (0 - не перезапускать) и GUNICORN_MAX_REQUESTS_JITTER (0),
+GUNICORN_PRELOAD=1 - импортировать приложение в мастере до fork.
+Адрес - GUNICORN_BIND или 0.0.0.0:$PORT.
+
+Пул соединений с базой по умолчанию подстраивается под модель: потоков
+gthread или DB_GEVENT_POOL_SIZE (10) для gevent; DB_POOL_SIZE в окружении
+имеет приоритет. Всего соединений: WEB_CONCURRENCY x (DB_POOL_SIZE + DB_MAX_OVERFLOW).
+"""
+
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+
+if worker_class == 'gevent':
+    # Патчим до импорта приложения: psycopg выбирает способ ожидания сокета
+    # при импорте и с непропатченным select блокировал бы все гринлеты
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = os.environ.get('GUNICORN_BIND') or f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4)) if worker_class == 'gthread' else 1
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0').lower() in ('1', 'true', 'yes')
+
+# Соединений в пуле столько, сколько запросов процесс обрабатывает одновременно;
+# запас DB_MAX_OVERFLOW остается фоновым потокам (просмотры, пробы, реплика)
+if worker_class == 'gthread':
+    os.environ.setdefault('DB_POOL_SIZE', str(threads))
+elif worker_class == 'gevent':
+    os.environ.setdefault('DB_POOL_SIZE', os.environ.get('DB_GEVENT_POOL_SIZE', '10'))
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    # Движки созданы в мастере: соединения (если были) остаются родителю,
+    # воркер открывает свои
+    from backend.app import app
+    from backend.models import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # Проверка готовности начинается вместе с воркером: первая проба после
+    # деплоя или перезапуска воркера не должна получать 503 starting
+    from backend.health import monitor
+
+    monitor.start()
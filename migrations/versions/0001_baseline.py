@@ -0,0 +1,118 @@
+"""Исходная схема базы данных
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18 10:00:00
+
+Таблицы создаются только если их еще нет: базы, созданные раньше через
+db.create_all(), проходят эту ревизию без изменений.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_baseline'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'user' not in existing:
+        op.create_table(
+            'user',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('password', sa.String(length=200), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('role', sa.String(length=20), nullable=True),
+            sa.Column('avatar', sa.String(length=200), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('email')
+        )
+
+    if 'company' not in existing:
+        op.create_table(
+            'company',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('category', sa.String(length=50), nullable=False),
+            sa.Column('city', sa.String(length=50), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('address', sa.String(length=200), nullable=True),
+            sa.Column('phone', sa.String(length=20), nullable=True),
+            sa.Column('website', sa.String(length=200), nullable=True),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('logo', sa.String(length=200), nullable=True),
+            sa.Column('rating', sa.Float(), nullable=True),
+            sa.Column('review_count', sa.Integer(), nullable=True),
+            sa.Column('owner_id', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['owner_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'review' not in existing:
+        op.create_table(
+            'review',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('company_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('anonymous_name', sa.String(length=100), nullable=True),
+            sa.Column('rating', sa.Integer(), nullable=False),
+            sa.Column('text', sa.Text(), nullable=True),
+            sa.Column('photos', sa.Text(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['company_id'], ['company.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'article' not in existing:
+        op.create_table(
+            'article',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=200), nullable=False),
+            sa.Column('content', sa.Text(), nullable=False),
+            sa.Column('excerpt', sa.Text(), nullable=True),
+            sa.Column('cover_image', sa.String(length=200), nullable=True),
+            sa.Column('tags', sa.Text(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('author_id', sa.Integer(), nullable=True),
+            sa.Column('anonymous_author', sa.String(length=100), nullable=True),
+            sa.Column('views', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['author_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'comment' not in existing:
+        op.create_table(
+            'comment',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('article_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('anonymous_name', sa.String(length=100), nullable=True),
+            sa.Column('text', sa.Text(), nullable=False),
+            sa.Column('photos', sa.Text(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['article_id'], ['article.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('comment')
+    op.drop_table('article')
+    op.drop_table('review')
+    op.drop_table('company')
+    op.drop_table('user')
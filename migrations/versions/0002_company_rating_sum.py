@@ -0,0 +1,40 @@
+"""Поле company.rating_sum и пересчет агрегатов рейтинга
+
+Revision ID: 0002_company_rating_sum
+Revises: 0001_baseline
+Create Date: 2026-10-18 10:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_company_rating_sum'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = [column['name'] for column in sa.inspect(op.get_bind()).get_columns('company')]
+    if 'rating_sum' not in columns:
+        with op.batch_alter_table('company') as batch_op:
+            batch_op.add_column(sa.Column('rating_sum', sa.Integer(), nullable=True, server_default='0'))
+
+    op.execute("""
+        UPDATE company SET
+            review_count = (SELECT COUNT(*) FROM review
+                            WHERE review.company_id = company.id AND review.status = 'approved'),
+            rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM review
+                          WHERE review.company_id = company.id AND review.status = 'approved')
+    """)
+    op.execute("""
+        UPDATE company SET
+            rating = CASE WHEN review_count > 0 THEN rating_sum * 1.0 / review_count ELSE 0.0 END
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('company') as batch_op:
+        batch_op.drop_column('rating_sum')
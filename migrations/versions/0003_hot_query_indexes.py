@@ -0,0 +1,44 @@
+"""Составные индексы под фильтры и сортировки роутов
+
+Revision ID: 0003_hot_query_indexes
+Revises: 0002_company_rating_sum
+Create Date: 2026-10-18 10:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_hot_query_indexes'
+down_revision = '0002_company_rating_sum'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_company_status_rating', 'company', ['status', 'rating']),
+    ('ix_company_status_category_city', 'company', ['status', 'category', 'city']),
+    ('ix_company_status_created_at', 'company', ['status', 'created_at']),
+    ('ix_company_owner_id', 'company', ['owner_id']),
+    ('ix_review_company_status_created_at', 'review', ['company_id', 'status', 'created_at']),
+    ('ix_review_user_created_at', 'review', ['user_id', 'created_at']),
+    ('ix_review_status_created_at', 'review', ['status', 'created_at']),
+    ('ix_article_status_created_at', 'article', ['status', 'created_at']),
+    ('ix_article_author_id', 'article', ['author_id']),
+    ('ix_comment_article_status_created_at', 'comment', ['article_id', 'status', 'created_at']),
+    ('ix_comment_status_created_at', 'comment', ['status', 'created_at']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        existing = {index['name'] for index in inspector.get_indexes(table)}
+        if name not in existing:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
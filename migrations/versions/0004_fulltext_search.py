@@ -0,0 +1,130 @@
+"""Полнотекстовый поиск: tsvector + GIN в PostgreSQL, FTS5 в SQLite
+
+Revision ID: 0004_fulltext_search
+Revises: 0003_hot_query_indexes
+Create Date: 2026-10-18 10:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_fulltext_search'
+down_revision = '0003_hot_query_indexes'
+branch_labels = None
+depends_on = None
+
+
+# Индексируемые поля и их веса в PostgreSQL (A - самый высокий)
+SEARCH_FIELDS = {
+    'company': [('name', 'A'), ('category', 'B'), ('city', 'B'), ('description', 'C')],
+    'article': [('title', 'A'), ('tags', 'B'), ('excerpt', 'B'), ('content', 'C')],
+    'review': [('text', 'A')],
+}
+
+# Теги хранятся JSON-массивом с экранированным юникодом, индексируем их значения.
+# Старые значения не в JSON индексируются как есть - как json_valid в SQLite:
+# голое ::json сорвало бы ALTER TABLE, а потом каждый INSERT/UPDATE такой строки
+PG_EXPRESSIONS = {
+    'tags': "search_tags_json(tags)",
+}
+PG_FUNCTIONS = """
+    CREATE OR REPLACE FUNCTION search_tags_json(value text) RETURNS json
+    LANGUAGE plpgsql IMMUTABLE AS $$
+    BEGIN
+        RETURN coalesce(nullif(value, ''), '[]')::json;
+    EXCEPTION WHEN invalid_text_representation THEN
+        RETURN to_json(value);
+    END
+    $$
+"""
+SQLITE_EXPRESSIONS = {
+    'tags': "CASE WHEN json_valid({row}tags) "
+            "THEN (SELECT group_concat(value, ' ') FROM json_each({row}tags)) ELSE {row}tags END",
+}
+
+
+def _pg_field(field):
+    return PG_EXPRESSIONS.get(field, f"coalesce({field}, '')")
+
+
+def _sqlite_field(field, row=''):
+    return SQLITE_EXPRESSIONS[field].format(row=row) if field in SQLITE_EXPRESSIONS else f'{row}{field}'
+
+
+def _pg_upgrade():
+    op.execute(PG_FUNCTIONS)
+    for table, fields in SEARCH_FIELDS.items():
+        vector = ' || '.join(
+            f"setweight(to_tsvector('russian', {_pg_field(field)}), '{weight}')"
+            for field, weight in fields
+        )
+        # Генерируемая колонка сама пересчитывается при INSERT/UPDATE
+        op.execute(f"""
+            ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS ({vector}) STORED
+        """)
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING GIN (search_vector)")
+
+
+def sqlite_fts(table):
+    """FTS5-таблица, триггеры и заполнение индекса (0008 повторяет их после пересоздания article)"""
+    fields = SEARCH_FIELDS[table]
+    fts = f'{table}_fts'
+    columns = ', '.join(field for field, _ in fields)
+    new_values = ', '.join(_sqlite_field(field, 'new.') for field, _ in fields)
+    values = ', '.join(_sqlite_field(field) for field, _ in fields)
+
+    op.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts}
+        USING fts5({columns}, tokenize = 'unicode61 remove_diacritics 2')
+    """)
+    op.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts} (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    """)
+    op.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {columns} ON {table} BEGIN
+            DELETE FROM {fts} WHERE rowid = old.id;
+            INSERT INTO {fts} (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    """)
+    op.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+            DELETE FROM {fts} WHERE rowid = old.id;
+        END
+    """)
+
+    # Заполняем индекс существующими записями
+    op.execute(f"DELETE FROM {fts}")
+    op.execute(f"INSERT INTO {fts} (rowid, {columns}) SELECT id, {values} FROM {table}")
+
+
+def _sqlite_upgrade():
+    for table in SEARCH_FIELDS:
+        sqlite_fts(table)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        _pg_upgrade()
+    elif dialect == 'sqlite':
+        _sqlite_upgrade()
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table in SEARCH_FIELDS:
+        if dialect == 'postgresql':
+            op.execute(f"DROP INDEX IF EXISTS ix_{table}_search_vector")
+            op.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
+        elif dialect == 'sqlite':
+            fts = f'{table}_fts'
+            for suffix in ('insert', 'update', 'delete'):
+                op.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+            op.execute(f"DROP TABLE IF EXISTS {fts}")
+    if dialect == 'postgresql':
+        op.execute("DROP FUNCTION IF EXISTS search_tags_json(text)")
@@ -0,0 +1,33 @@
+"""Поле article.comment_count со счетчиком одобренных комментариев
+
+Revision ID: 0005_article_comment_count
+Revises: 0004_fulltext_search
+Create Date: 2026-10-18 11:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_article_comment_count'
+down_revision = '0004_fulltext_search'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = [column['name'] for column in sa.inspect(op.get_bind()).get_columns('article')]
+    if 'comment_count' not in columns:
+        # Без batch_alter_table: пересоздание таблицы в SQLite удалило бы триггеры FTS5
+        op.add_column('article', sa.Column('comment_count', sa.Integer(), nullable=True, server_default='0'))
+
+    op.execute("""
+        UPDATE article SET
+            comment_count = (SELECT COUNT(*) FROM comment
+                             WHERE comment.article_id = article.id AND comment.status = 'approved')
+    """)
+
+
+def downgrade():
+    op.drop_column('article', 'comment_count')
@@ -0,0 +1,50 @@
+"""Таблицы tag и article_tag для индекса тегов статей
+
+Revision ID: 0006_article_tags
+Revises: 0005_article_comment_count
+Create Date: 2026-10-18 11:30:00
+
+Связи и счетчики заполняются командой
+flask --app backend.app backfill-tags
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_article_tags'
+down_revision = '0005_article_comment_count'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    existing = set(inspector.get_table_names())
+
+    if 'tag' not in existing:
+        op.create_table(
+            'tag',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('article_count', sa.Integer(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('name')
+        )
+        op.create_index('ix_tag_article_count', 'tag', ['article_count'])
+
+    if 'article_tag' not in existing:
+        op.create_table(
+            'article_tag',
+            sa.Column('article_id', sa.Integer(), nullable=False),
+            sa.Column('tag_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['article_id'], ['article.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['tag_id'], ['tag.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('article_id', 'tag_id')
+        )
+        op.create_index('ix_article_tag_tag_id', 'article_tag', ['tag_id', 'article_id'])
+
+
+def downgrade():
+    op.drop_table('article_tag')
+    op.drop_table('tag')
@@ -0,0 +1,45 @@
+"""Таблица upload - реестр загруженных файлов со счетчиками ссылок
+
+Revision ID: 0007_upload_registry
+Revises: 0006_article_tags
+Create Date: 2026-10-18 15:00:00
+
+Существующие файлы и ссылки на них заносятся командой
+flask --app backend.app rebuild-uploads
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_upload_registry'
+down_revision = '0006_article_tags'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'upload' in inspector.get_table_names():
+        return
+
+    op.create_table(
+        'upload',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=True),
+        sa.Column('size', sa.Integer(), nullable=True),
+        sa.Column('width', sa.Integer(), nullable=True),
+        sa.Column('height', sa.Integer(), nullable=True),
+        sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('orphaned_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('filename')
+    )
+    op.create_index('ix_upload_ref_count_orphaned_at', 'upload', ['ref_count', 'orphaned_at'])
+    op.create_index('ix_upload_sha256', 'upload', ['sha256'])
+
+
+def downgrade():
+    op.drop_table('upload')
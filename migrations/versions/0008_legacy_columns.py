@@ -0,0 +1,72 @@
+"""Приводит старые базы к схеме моделей вместо разовых скриптов и /api/update-db
+
+Revision ID: 0008_legacy_columns
+Revises: 0007_upload_registry
+Create Date: 2026-10-18 18:00:00
+
+Раньше эти изменения вносили fix_*/update_*.py и эндпоинты /api/update-db,
+/api/update-comment-photos. Базы, созданные 0001_baseline, уже им
+соответствуют - тогда миграция ничего не делает:
+- user.password расширяется до VARCHAR(200);
+- article.author_id допускает NULL, добавляется article.anonymous_author
+  (в SQLite таблица при этом пересоздается, и триггеры FTS5 из 0004 создаются
+  заново);
+- comment.user_id допускает NULL, добавляются comment.anonymous_name и comment.photos.
+"""
+import importlib.util
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_legacy_columns'
+down_revision = '0007_upload_registry'
+branch_labels = None
+depends_on = None
+
+
+def _fulltext_search():
+    # DDL триггеров FTS5 берем из 0004, чтобы не расходился с исходным
+    path = os.path.join(os.path.dirname(__file__), '0004_fulltext_search.py')
+    spec = importlib.util.spec_from_file_location('fulltext_search_0004', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    columns = {column['name']: column for column in inspector.get_columns('user')}
+    length = getattr(columns['password']['type'], 'length', None)
+    if length is not None and length < 200:
+        with op.batch_alter_table('user') as batch_op:
+            batch_op.alter_column('password', type_=sa.String(length=200), existing_nullable=False)
+
+    columns = {column['name']: column for column in inspector.get_columns('article')}
+    recreate_article = not columns['author_id']['nullable']
+    with op.batch_alter_table('article') as batch_op:
+        if recreate_article:
+            batch_op.alter_column('author_id', existing_type=sa.Integer(), nullable=True)
+        if 'anonymous_author' not in columns:
+            batch_op.add_column(sa.Column('anonymous_author', sa.String(length=100), nullable=True))
+    if recreate_article and op.get_bind().dialect.name == 'sqlite':
+        # Пересоздание таблицы удалило триггеры article_fts_*: без них поиск
+        # не видел бы новые и измененные статьи
+        _fulltext_search().sqlite_fts('article')
+
+    columns = {column['name']: column for column in inspector.get_columns('comment')}
+    with op.batch_alter_table('comment') as batch_op:
+        if not columns['user_id']['nullable']:
+            batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=True)
+        if 'anonymous_name' not in columns:
+            batch_op.add_column(sa.Column('anonymous_name', sa.String(length=100), nullable=True))
+        if 'photos' not in columns:
+            batch_op.add_column(sa.Column('photos', sa.Text(), nullable=True))
+
+
+def downgrade():
+    # Возврат к старой схеме сломал бы анонимные статьи и комментарии
+    pass
@@ -0,0 +1,38 @@
+"""Индексы по updated_at для синхронизации индекса подсказок
+
+Revision ID: 0009_updated_at_indexes
+Revises: 0008_legacy_columns
+Create Date: 2026-10-18 20:00:00
+
+backend.suggestions раз в SYNC_SECONDS выбирает компании и статьи с
+updated_at >= отметки последней синхронизации; без индекса это полный
+проход по таблицам в каждом воркере.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_updated_at_indexes'
+down_revision = '0008_legacy_columns'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_company_updated_at', 'company', ['updated_at']),
+    ('ix_article_updated_at', 'article', ['updated_at']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        existing = {index['name'] for index in inspector.get_indexes(table)}
+        if name not in existing:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)